@@ -0,0 +1,80 @@
+"""
+Benchmark csv masking engines on wide csv data
+
+Compare rows/sec of the csv.DictReader/csv.DictWriter implementation
+obfuscate_csv used before, against the current obfuscate_csv,
+the byte level fast path obfuscate_csv_bytes and
+the multithreaded pyarrow.csv engine obfuscate_csv_arrow.
+
+Run from the repository root:
+    python benchmark/benchmark_csv.py [rows] [columns]
+"""
+from io import StringIO
+import csv
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from src.gdpr_obfuscator import obfuscate_csv, \
+    obfuscate_csv_bytes, obfuscate_csv_arrow  # noqa: E402
+
+
+def dict_obfuscate_csv(data: str, pii_fields: list) -> str:
+    """obfuscate_csv as implemented with csv.DictReader/DictWriter"""
+    dict_reader = csv.DictReader(StringIO(data))
+    if dict_reader.fieldnames is None:
+        return str()
+
+    masked = []
+    for row in dict_reader:
+        for field in pii_fields:
+            if field in dict_reader.fieldnames:
+                row[field] = '***'
+        masked.append(row)
+
+    masked_bufer = StringIO()
+    writer = csv.DictWriter(masked_bufer, dict_reader.fieldnames)
+    writer.writeheader()
+    writer.writerows(masked)
+    return masked_bufer.getvalue()
+
+
+def make_csv(rows: int, columns: int) -> str:
+    """Create csv data with rows x columns values"""
+    writer = csv.writer(csv_buffer := StringIO())
+    writer.writerow([f'column_{i}' for i in range(columns)])
+    for r in range(rows):
+        writer.writerow([f'value_{r}_{i}' for i in range(columns)])
+    return csv_buffer.getvalue()
+
+
+def bench(name: str, function, data: str, pii_fields: list, rows: int):
+    """Run function on data, print and return rows/sec"""
+    start = time.perf_counter()
+    result = function(data, pii_fields)
+    elapsed = time.perf_counter() - start
+    print(f'{name:<24}{rows / elapsed:>14,.0f} rows/sec{elapsed:>10.2f}s')
+    return result
+
+
+if __name__ == '__main__':
+    logging.disable(logging.WARNING)
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    columns = int(sys.argv[2]) if len(sys.argv) > 2 else 250
+    data = make_csv(rows, columns)
+    pii_fields = ['column_1', 'column_17', f'column_{columns - 1}']
+    print(f'{rows} rows x {columns} columns, {len(data) / 2 ** 20:.1f} MiB')
+
+    expected = bench('DictReader/DictWriter', dict_obfuscate_csv,
+                     data, pii_fields, rows)
+    masked = bench('obfuscate_csv', obfuscate_csv, data, pii_fields, rows)
+    assert masked == expected, 'outputs differ'
+    masked = bench('obfuscate_csv_bytes', obfuscate_csv_bytes,
+                   data.encode(), pii_fields, rows)
+    assert masked == expected.encode(), 'outputs differ'
+    masked = bench('obfuscate_csv_arrow', obfuscate_csv_arrow,
+                   data.encode(), pii_fields, rows)
+    assert list(csv.reader(StringIO(masked.decode()))) == \
+        list(csv.reader(StringIO(expected))), 'outputs differ'
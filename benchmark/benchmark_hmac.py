@@ -0,0 +1,60 @@
+"""
+Benchmark hmac pseudonymisation against '***' masking
+
+Compare wall time of the '***' mask and the hmac strategy on an email
+column of csv (byte level engine and pyarrow.csv engine) and parquet
+data, for a column of all distinct values and a column that repeats
+distinct / 10 values. Every run uses its own hmac key, so runs do not
+share the memo of the compiled mask.
+
+Run from the repository root:
+    python benchmark/benchmark_hmac.py [rows]
+"""
+from io import BytesIO
+from itertools import count
+import logging
+import os
+import sys
+import time
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from src.gdpr_obfuscator import obfuscate_csv_bytes, \
+    obfuscate_csv_arrow, obfuscate_parquet  # noqa: E402
+
+RUNS = count()
+
+
+def make_data(rows: int, distinct: int) -> tuple:
+    """Create csv and parquet data with id and email columns"""
+    emails = [f'name_{i % distinct}@email.com' for i in range(rows)]
+    csv_data = 'id,email\n' + ''.join(
+        f'{i},{email}\n' for i, email in enumerate(emails))
+    table = pa.table({'id': pa.array(range(rows)), 'email': emails})
+    pq.write_table(table, parquet_buffer := BytesIO())
+    return csv_data.encode(), parquet_buffer.getvalue()
+
+
+def bench(name: str, function, data: bytes) -> float:
+    """Run function on data with '***' and hmac masking, print times"""
+    times = []
+    for masking in (None, {'strategy': 'hmac', 'key': f'run{next(RUNS)}'}):
+        start = time.perf_counter()
+        function(data, ['email'], masking)
+        times.append(time.perf_counter() - start)
+    print(f'{name:<24}{times[0]:>10.2f}s{times[1]:>10.2f}s'
+          f'{times[1] / times[0]:>10.1f}x')
+    return times[1] / times[0]
+
+
+if __name__ == '__main__':
+    logging.disable(logging.WARNING)
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    for distinct in (rows, rows // 10):
+        csv_data, parquet_data = make_data(rows, distinct)
+        print(f'{rows} rows, {distinct} distinct emails'
+              f'{"***":>12}{"hmac":>11}{"factor":>11}')
+        bench('csv bytes', obfuscate_csv_bytes, csv_data)
+        bench('csv arrow', obfuscate_csv_arrow, csv_data)
+        bench('parquet', obfuscate_parquet, parquet_data)
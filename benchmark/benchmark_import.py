@@ -0,0 +1,58 @@
+"""
+Benchmark import time of gdpr_obfuscator (cold start)
+
+Import the module in fresh interpreters, print median import time
+and heavy dependencies (boto3, botocore, pyarrow) loaded by import
+alone and by csv and json masking, which should load none of them.
+Exit with status 1 when median import time exceeds limit
+(milliseconds) or heavy dependency is loaded, to catch regressions.
+
+Run from the repository root:
+    python benchmark/benchmark_import.py [runs] [limit]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('boto3', 'botocore', 'pyarrow')
+SCRIPT = '''
+import json, logging, sys, time
+logging.disable(logging.WARNING)
+start = time.perf_counter()
+import src.gdpr_obfuscator as gdpr
+elapsed = time.perf_counter() - start
+loaded = [m for m in {modules} if m in sys.modules]
+gdpr.obfuscate_csv('name,id\\n1,2\\n', ['name'])
+gdpr.obfuscate_json('[{{"name": 1}}]', ['name'])
+masked = [m for m in {modules} if m in sys.modules]
+print(json.dumps([elapsed, loaded, masked]))
+'''.format(modules=HEAVY_MODULES)
+
+
+def measure() -> tuple[float, list, list]:
+    """
+    Import module in fresh interpreter
+
+    :return: tuple(import time in seconds, heavy modules loaded by import,
+        heavy modules loaded after csv and json masking)
+    """
+    output = subprocess.run(
+        [sys.executable, '-c', SCRIPT],
+        cwd=ROOT, capture_output=True, check=True, text=True
+    ).stdout
+    return tuple(json.loads(output))
+
+
+if __name__ == '__main__':
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    limit = float(sys.argv[2]) if len(sys.argv) > 2 else 150
+    results = [measure() for _ in range(runs)]
+    median = statistics.median(r[0] for r in results) * 1000
+    _, loaded, masked = results[-1]
+    print(f'import gdpr_obfuscator{median:>10.1f} ms (median of {runs})')
+    print(f'loaded by import        {", ".join(loaded) or "none"}')
+    print(f'loaded by csv, json     {", ".join(masked) or "none"}')
+    sys.exit(int(median > limit or bool(masked)))
@@ -0,0 +1,61 @@
+"""
+Benchmark json masking backends on record heavy json data
+
+Compare wall time of obfuscate_json with the standard library json
+backend and the orjson backend (when orjson is installed),
+for json array and newline delimited json input.
+
+Run from the repository root:
+    python benchmark/benchmark_json.py [records]
+"""
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from src.gdpr_obfuscator import obfuscate_json, orjson  # noqa: E402
+
+
+def make_records(records: int) -> list:
+    """Create list of records with string and number fields"""
+    return [
+        {
+            'student_id': i,
+            'name': f'name_{i}',
+            'course': 'Software',
+            'cohort': '2024-03-31',
+            'graduation_date': '2024-03-31',
+            'email_address': f'name_{i}@email.com',
+            'score': i / 7
+        }
+        for i in range(records)
+    ]
+
+
+def bench(name: str, data: bytes, pii_fields: list, backend: str) -> str:
+    """Run obfuscate_json on data with backend, print and return result"""
+    start = time.perf_counter()
+    result = obfuscate_json(data, pii_fields, backend)
+    elapsed = time.perf_counter() - start
+    print(f'{name:<24}{backend:<8}{elapsed:>10.2f}s'
+          f'{len(result) / 2 ** 20:>10.1f} MiB')
+    return result
+
+
+if __name__ == '__main__':
+    logging.disable(logging.WARNING)
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    pii_fields = ['name', 'email_address']
+    backends = ['json', 'orjson'] if orjson else ['json']
+    data = make_records(records)
+    inputs = {
+        'json array': json.dumps(data).encode(),
+        'newline delimited json':
+            '\n'.join(map(json.dumps, data)).encode() + b'\n'
+    }
+    for name, data in inputs.items():
+        print(f'{name}: {records} records, {len(data) / 2 ** 20:.1f} MiB')
+        for backend in backends:
+            bench(name, data, pii_fields, backend)
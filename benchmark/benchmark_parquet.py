@@ -0,0 +1,73 @@
+"""
+Benchmark parquet masking on wide parquet data
+
+Compare CPU time of the pyarrow.parquet.read_table/write_table
+implementation obfuscate_parquet used before, against the current
+obfuscate_parquet, which masks row group by row group and decodes
+only the columns that are not masked.
+
+Run from the repository root:
+    python benchmark/benchmark_parquet.py [rows] [columns] [masked]
+"""
+from io import BytesIO
+import logging
+import os
+import sys
+import time
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from src.gdpr_obfuscator import obfuscate_parquet  # noqa: E402
+
+
+def table_obfuscate_parquet(data: bytes, pii_fields: list) -> bytes:
+    """obfuscate_parquet as implemented with read_table/write_table"""
+    table = pq.read_table(pa.BufferReader(data))
+    num_rows = table.num_rows
+    column_names = table.column_names
+    for pii_field in pii_fields:
+        table = table.drop_columns(pii_field)
+        table = table.add_column(
+            column_names.index(pii_field),
+            pii_field,
+            [['***' for _ in range(num_rows)]]
+        )
+    pq.write_table(table, parquet_bufer := BytesIO())
+    return parquet_bufer.getvalue()
+
+
+def make_parquet(rows: int, columns: int) -> bytes:
+    """Create parquet data with rows x columns string values"""
+    table = pa.table({
+        f'column_{i}': pa.array([f'value_{r}_{i}' for r in range(rows)])
+        for i in range(columns)
+    })
+    pq.write_table(table, parquet_buffer := BytesIO())
+    return parquet_buffer.getvalue()
+
+
+def bench(name: str, function, data: bytes, pii_fields: list) -> bytes:
+    """Run function on data, print and return process time"""
+    start = time.process_time()
+    result = function(data, pii_fields)
+    elapsed = time.process_time() - start
+    print(f'{name:<24}{elapsed:>10.2f}s cpu{len(result) / 2 ** 20:>10.1f} MiB')
+    return result
+
+
+if __name__ == '__main__':
+    logging.disable(logging.WARNING)
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    columns = int(sys.argv[2]) if len(sys.argv) > 2 else 150
+    masked = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+    data = make_parquet(rows, columns)
+    pii_fields = [f'column_{i}' for i in range(0, columns, columns // masked)]
+    print(f'{rows} rows x {columns} columns, {len(pii_fields)} masked, '
+          f'{len(data) / 2 ** 20:.1f} MiB')
+
+    expected = bench('read_table/write_table', table_obfuscate_parquet,
+                     data, pii_fields)
+    masked = bench('obfuscate_parquet', obfuscate_parquet, data, pii_fields)
+    assert pq.read_table(BytesIO(masked)).to_pylist() == \
+        pq.read_table(BytesIO(expected)).to_pylist(), 'outputs differ'
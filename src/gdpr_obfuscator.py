@@ -1,14 +1,127 @@
+from __future__ import annotations
 from urllib.parse import urlparse
-from botocore.exceptions import ClientError
-from io import StringIO, BytesIO
-import boto3
+from concurrent.futures import Executor, ProcessPoolExecutor, \
+    ThreadPoolExecutor
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from functools import cache, lru_cache, partial
+from io import StringIO, BytesIO, BufferedReader, RawIOBase
+from itertools import accumulate, chain
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from shutil import copyfileobj
+from tempfile import TemporaryFile
+from typing import Iterable, Iterator
+import codecs
 import csv
+import hmac
+import importlib
 import json
-import botocore
+import re
+import struct
 import sys
-import pyarrow as pa
-import pyarrow.parquet as pq
+import traceback
 import logging
+import math
+
+
+class _LazyModule:
+    """
+    Module imported on first attribute access.
+    Heavy dependencies (boto3, botocore, pyarrow) are imported only
+    when a code path uses them, e.g. csv and json masking never
+    import pyarrow, which cuts cold start of AWS Lambda.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr: str):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+asyncio = _LazyModule('asyncio')
+boto3 = _LazyModule('boto3')
+botocore = _LazyModule('botocore')
+botocore_config = _LazyModule('botocore.config')
+botocore_exceptions = _LazyModule('botocore.exceptions')
+bz2 = _LazyModule('bz2')
+gzip = _LazyModule('gzip')
+pa = _LazyModule('pyarrow')
+pacsv = _LazyModule('pyarrow.csv')
+pc = _LazyModule('pyarrow.compute')
+pq = _LazyModule('pyarrow.parquet')
+zlib = _LazyModule('zlib')
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+BATCH_WORKERS = 16
+CHUNK_SIZE = 1024 * 1024
+CSV_ENGINES = ('python', 'bytes', 'arrow')
+CSV_RANGE_SIZE = 64 * 1024 * 1024
+CSV_RANGE_WINDOW = 64 * 1024
+PARQUET_FOOTER_WINDOW = 64 * 1024
+JSON_BACKENDS = ('json', 'orjson', 'auto')
+JSON_BATCH_RECORDS = 1000
+JSON_LONG_NUMBER = re.compile(r'[0-9]{19}')
+JSON_DELIMITER = re.compile(r'[ \t\n\r]*([,\]])[ \t\n\r]*')
+PART_SIZE = 8 * 1024 * 1024
+MAX_PARTS = 10000
+PLAN_CACHE_SIZE = 1024
+MASKING_STRATEGIES = (
+    'mask', 'fixed', 'null', 'keep_last', 'email_domain', 'hmac')
+HMAC_LENGTH = 16
+HMAC_CACHE_SIZE = 256 * 1024
+HMAC_BYPASS_WINDOWS = 8
+UPLOAD_THREADS = 4
+DETECT_SAMPLE_ROWS = 10000
+DETECT_SAMPLE_BYTES = 4 * 1024 * 1024
+DETECT_THRESHOLD = 0.5
+PII_PATTERNS = {
+    'email': r'[A-Za-z0-9._%+-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*'
+             r'\.[A-Za-z]{2,}',
+    'phone': r'\+[1-9](?:[ ()-]{0,2}[0-9]){6,14}'
+             r'|\(?0[1-9](?:[ )-]{0,2}[0-9]){8,9}',
+    'uk_ni_number': r'(?i:[A-CEGHJ-PR-TW-Z][A-CEGHJ-NPR-TW-Z]'
+                    r' ?[0-9]{2} ?[0-9]{2} ?[0-9]{2} ?[A-D])',
+    'iban': r'[A-Z]{2}[0-9]{2}(?: ?[A-Z0-9]){11,30}'
+}
+COMPRESSIONS = {
+    'gz': 'gzip',
+    'gzip': 'gzip',
+    'bz2': 'bz2',
+    'zst': 'zstd',
+    'zstd': 'zstd'
+}
+COMPRESSION_MAGIC = {
+    'gzip': re.compile(rb'\x1f\x8b\x08'),
+    'bz2': re.compile(rb'BZh[1-9](?:1AY&SY|\x17rE8P\x90)'),
+    'zstd': re.compile(rb'\x28\xb5\x2f\xfd')
+}
+MAGIC_LENGTH = 10
+PARQUET_CODECS = {
+    'UNCOMPRESSED': 'none',
+    'SNAPPY': 'snappy',
+    'GZIP': 'gzip',
+    'BROTLI': 'brotli',
+    'LZ4': 'lz4',
+    'LZ4_RAW': 'lz4',
+    'ZSTD': 'zstd'
+}
+PARQUET_VERSIONS = ('1.0', '2.4', '2.6')
+DICTIONARY_ENCODINGS = {'PLAIN_DICTIONARY', 'RLE_DICTIONARY'}
+COLUMN_ENCODINGS = {
+    'DELTA_BINARY_PACKED',
+    'DELTA_LENGTH_BYTE_ARRAY',
+    'DELTA_BYTE_ARRAY',
+    'BYTE_STREAM_SPLIT'
+}
 
 
 def gdpr_obfuscator(JSON: str) -> bytes:
@@ -21,6 +134,15 @@ def gdpr_obfuscator(JSON: str) -> bytes:
 
     Exept csv, json or parquet data file format
         JSON data format = [{data1}, {data2}...]
+        or newline delimited json {data1}\\n{data2}\\n...
+
+    When none of pii_fields is in csv header or parquet schema,
+    read with ranged GETs, file is returned (or copied to
+    "output_file" with S3 copy) unchanged without parsing it.
+
+    Files compressed with gzip, bz2 or zstd (file.csv.gz, file.json.zst,
+    or found by magic bytes) are decompressed as they are read and
+    masked file is compressed with the same codec.
 
     Behaviour:
         csv data:
@@ -34,9 +156,8 @@ def gdpr_obfuscator(JSON: str) -> bytes:
             function will log with warning level,and disregard that pii_fild.
 
         parquet data:
-            :PyArrow Parquete engine write parquet file with default params.
-            as per pyarrow.parquet.write_table function.Use kwargs to modify
-            default behaviour.
+            :PyArrow Parquete engine write parquet file with compression,
+            encoding, statistics, metadata and row groups of the input file.
             :When detect pii_fild that is not present in table function
             will log with warning level,and disregard that pii_fild.
 
@@ -45,201 +166,3614 @@ def gdpr_obfuscator(JSON: str) -> bytes:
         the S3 location of the required file for obfuscation
     "pii_fields" key:
         the list with names of the fields that are required to be obfuscated
+        or map of field names to their masking strategy, e.g.
+        {"name": "mask", "phone": {"strategy": "keep_last", "length": 4}},
+        see compile_mask
+    "csv_engine" key (optional):
+        'python' (default) csv module,
+        'bytes' byte level masking for csv data without quotes,
+        'arrow' multithreaded pyarrow.csv engine,
+        see obfuscate_csv_stream
+    "json_backend" key (optional):
+        'auto' (default), 'orjson' or 'json', orjson is used when it is
+        installed, 'json' keeps output byte exact with json module,
+        json arrays are parsed with json module by every backend,
+        see obfuscate_json_stream
+    "masking" key (optional):
+        masking strategy of pii_fields without their own strategy,
+        default replace values with '***',
+        {"strategy": "hmac", "key": "secret"} replace values with
+        keyed deterministic pseudonyms, see compile_mask
+    "processes" key (optional):
+        number of processes masking csv object larger than "range_size"
+        in parallel, object is split in byte ranges aligned to records,
+        ranges are downloaded with ranged GET and masked output
+        is written in order, identical to masking by one process
+    "range_size" key (optional):
+        size in bytes of csv byte ranges, default 64 MiB
+    "newlines_in_values" key (optional):
+        true (default) when quoted csv values may hold newlines, ranges
+        are aligned by counting quotes from the start of the object,
+        which reads the object twice, false aligns ranges to the next
+        newline, for csv without newlines in values, range found
+        to split quoted value raises ValueError
+    "output_file" key (optional):
+        the S3 location masked file is uploaded to with multipart upload
+        while the input is still read, see upload_stream,
+        function then return empty bytes
+    "detect_pii" key (optional):
+        true to also mask fields detected as pii in a sample of the
+        first rows of the file, read with ranged GETs, see detect_pii
 
     example:
     {
         "file_to_obfuscate": "s3://my_ingestion_bucket/new_data/file1.csv",
         "pii_fields": ["name", "email_address"]
     }
+    :raise: ValueError when "output_file" is "file_to_obfuscate"
     :return: bytestream representation of a file with obfuscated data fields
     """
+    return Obfuscator().obfuscate(**json.loads(JSON))
+
+
+def gdpr_obfuscator_stream(
+    JSON: str,
+    chunk_size: int = CHUNK_SIZE
+) -> Iterator[bytes]:
+    """
+    Streaming counterpart of gdpr_obfuscator.
+    Yield the obfuscated file as a sequence of byte chunks,
+    so caller can write them to a sink (file, socket, upload)
+    without holding the whole result in memory.
+
+    Behaviour:
+        csv data:
+            :S3 object is read chunk_size bytes at a time, decoded
+            incrementally and masked row by row, peak memory depends
+            on chunk_size not on the size of the file.
+
+        json data:
+            :S3 object is read chunk_size bytes at a time, json array or
+            newline delimited json records are parsed, masked and
+            serialized one at a time.
+
+        parquet data:
+            :S3 object footer is read first, column chunks that are
+            not masked are read with ranged GETs, masked and yielded
+            row group by row group, peak memory is about one row group.
+
+    :param: JSON (string) request, see gdpr_obfuscator
+    :param: chunk_size (int) number of bytes read from S3 per chunk
+        and approximate size of yielded chunks
+    :return: iterator of bytes chunks of the file with obfuscated fields
+    """
+    yield from Obfuscator(chunk_size=chunk_size).stream(**json.loads(JSON))
+
+
+def gdpr_obfuscator_batch(
+    JSON: str,
+    max_workers: int = BATCH_WORKERS,
+    chunk_size: int = CHUNK_SIZE,
+    processes: int = 0
+) -> list[dict]:
+    """
+    Obfuscate many S3 objects concurrently.
+    Objects are downloaded, masked and uploaded by a pool of
+    max_workers threads sharing one S3 client, the client connection
+    pool holds max_workers connections.
+    With processes, masking, which is CPU bound and holds the GIL,
+    runs in a pool of processes worker processes, threads only
+    download and upload. Object data and masked data are handed over
+    through shared memory, only its name is sent to the process.
+    Processes are spawned, forking a process with running S3 threads
+    can deadlock.
+    Failure of one object does not stop the batch, error is
+    logged and returned in the result of that object.
+
+    :param: JSON (string) containing:
+    "files_to_obfuscate" key:
+        the list of S3 locations of files for obfuscation
+    or "prefix_to_obfuscate" key:
+        S3 location prefix, every object under it is obfuscated
+    "pii_fields" key:
+        the list with names of the fields that are required to be obfuscated
+    "output_prefix" key (optional):
+        S3 location prefix the masked objects are uploaded to,
+        under their key (relative to "prefix_to_obfuscate" if given),
+        without it masked data is returned in results
+    "csv_engine", "json_backend" keys (optional) see gdpr_obfuscator
+
+    example:
+    {
+        "prefix_to_obfuscate": "s3://my_ingestion_bucket/new_data/",
+        "pii_fields": ["name", "email_address"],
+        "output_prefix": "s3://my_masked_bucket/new_data/"
+    }
+    :param: max_workers (int) number of objects processed concurrently
+    :param: chunk_size (int) number of bytes read from S3 per chunk
+    :param: processes (int) number of masking processes,
+        0 mask in threads
+    :return: list of dicts, one per object in order of files, with keys
+        "file_to_obfuscate" S3 location of the object,
+        "output_file" S3 location of uploaded masked object or None,
+        "data" (bytes) masked object when there is no "output_prefix",
+        "error" exception raised while processing object or None
+    """
+    return Obfuscator(
+        max_workers=max_workers,
+        chunk_size=chunk_size
+    ).batch(pool_processes=processes, **json.loads(JSON))
+
+
+class Obfuscator:
+    """
+    Reusable obfuscator for warm processes (e.g. AWS Lambda),
+    built once with S3 client and default request options.
+    Logger and S3 client, which is costly to create, are set up
+    on construction, calls only fetch and mask objects.
+    Requests are passed as keyword arguments instead of JSON string,
+    arguments of a call override default options.
+
+    example:
+        obfuscator = Obfuscator(pii_fields=['name', 'email_address'])
+
+        def lambda_handler(event, context):
+            return obfuscator.obfuscate(event['file_to_obfuscate'])
+    """
+
+    def __init__(
+        self,
+        pii_fields: list | None = None,
+        client: botocore.client = None,
+        max_workers: int = BATCH_WORKERS,
+        chunk_size: int = CHUNK_SIZE,
+        **options
+    ):
+        """
+        :param: pii_fields (list) default names of the fields
+            that are required to be obfuscated
+        :param: client s3 boto client, None to create one with
+            connection pool of max_workers connections
+        :param: max_workers (int) number of objects batch
+            process concurrently
+        :param: chunk_size (int) number of bytes read from S3 per chunk
+        :param: options default request options, e.g. csv_engine,
+            json_backend, processes, see gdpr_obfuscator
+        """
+        setup_logger() if not logging.getLogger().hasHandlers() else None
+        if client is None:
+            client = boto3.client('s3', config=botocore_config.Config(
+                max_pool_connections=max_workers))
+        self.client = client
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.options = {'pii_fields': pii_fields or [], **options}
+
+    def obfuscate(self, file_to_obfuscate: str, **options) -> bytes:
+        """
+        Obfuscate S3 object, see gdpr_obfuscator
+
+        :param: file_to_obfuscate (str) the S3 location of the file
+        :param: options request options overriding default options,
+            e.g. pii_fields, output_file
+        :raise: ValueError when output_file is file_to_obfuscate
+        :return: bytestream representation of a file with obfuscated
+            data fields, empty bytes when uploaded to output_file
+        """
+        request = {**self.options, **options}
+        if request.get('output_file') is None:
+            return b''.join(self.stream(file_to_obfuscate, **options))
+
+        _write_s3_object(
+            self.client,
+            file_to_obfuscate,
+            request['output_file'],
+            request,
+            self.chunk_size
+        )
+        return b''
+
+    def stream(self, file_to_obfuscate: str, **options) -> Iterator[bytes]:
+        """
+        Obfuscate S3 object in chunks, see gdpr_obfuscator_stream
+
+        :param: file_to_obfuscate (str) the S3 location of the file
+        :param: options request options overriding default options
+        :return: iterator of bytes chunks of the file with obfuscated fields
+        """
+        return _obfuscate_s3_object(
+            self.client,
+            file_to_obfuscate,
+            {**self.options, **options},
+            self.chunk_size
+        )
+
+    def batch(
+        self,
+        files_to_obfuscate: list | None = None,
+        pool_processes: int = 0,
+        **options
+    ) -> list[dict]:
+        """
+        Obfuscate many S3 objects concurrently by max_workers threads,
+        see gdpr_obfuscator_batch
+
+        :param: files_to_obfuscate (list) S3 locations of the files,
+            None to obfuscate objects under prefix_to_obfuscate option
+        :param: pool_processes (int) number of masking processes,
+            0 mask in threads
+        :param: options request options overriding default options,
+            e.g. prefix_to_obfuscate, output_prefix
+        :return: list of dicts, one per object, see gdpr_obfuscator_batch
+        """
+        request = {**self.options, **options}
+        if files_to_obfuscate is None:
+            files_to_obfuscate = get_files(
+                self.client, request['prefix_to_obfuscate'])
+
+        with ProcessPoolExecutor(pool_processes, get_context('spawn')) \
+                if pool_processes else nullcontext() \
+                as pool, ThreadPoolExecutor(self.max_workers) as executor:
+            return list(executor.map(
+                partial(
+                    _obfuscate_batch_object,
+                    self.client, request, self.chunk_size, pool
+                ),
+                files_to_obfuscate
+            ))
+
+
+def _obfuscate_batch_object(
+    client: botocore.client,
+    options: dict,
+    chunk_size: int,
+    pool: Executor | None,
+    s3_file_path: str
+) -> dict:
+    """
+    Obfuscate one object of gdpr_obfuscator_batch,
+    upload it when options has "output_prefix".
+
+    :param: client s3 boto client
+    :param: options (dict) batch request
+    :param: chunk_size (int) number of bytes read from S3 per chunk
+    :param: pool (Executor) process pool that mask the object
+        or None to mask it in this thread
+    :param: s3_file_path (str) S3 location of the object
+    :return: (dict) result of the object, see gdpr_obfuscator_batch
+    """
+    result = {
+        'file_to_obfuscate': s3_file_path,
+        'output_file': None,
+        'data': None,
+        'error': None
+    }
+    try:
+        if 'output_prefix' not in options:
+            result['data'] = b''.join(_obfuscate_s3_object(
+                client, s3_file_path, options, chunk_size, pool))
+            return result
+
+        output_file = _batch_output_file(s3_file_path, options)
+        _write_s3_object(
+            client, s3_file_path, output_file, options, chunk_size, pool)
+        result['output_file'] = output_file
+    except Exception as error:
+        logger = logging.getLogger(__name__)
+        logger.setLevel('WARNING')
+        logger.error(f'{s3_file_path}...{type(error).__name__}: {error}')
+        result['error'] = error
+    return result
+
+
+def _batch_output_file(s3_file_path: str, options: dict) -> str:
+    """
+    S3 location of masked object, "output_prefix" followed by the key
+    of the object relative to "prefix_to_obfuscate" when given.
+
+    :param: s3_file_path (str) S3 location of the object
+    :param: options (dict) batch request
+    :return: (str) S3 location of masked object
+    """
+    _, key = get_bucket_and_key(s3_file_path)
+    if 'prefix_to_obfuscate' in options:
+        _, prefix = get_bucket_and_key(options['prefix_to_obfuscate'])
+        key = key[len(prefix):].lstrip('/')
+    output_bucket, output_prefix = get_bucket_and_key(
+        options['output_prefix'])
+    if output_prefix and not output_prefix.endswith('/'):
+        output_prefix += '/'
+    return f's3://{output_bucket}/{output_prefix}{key}'
+
+
+async def async_gdpr_obfuscator(
+    JSON: str,
+    executor: Executor | None = None,
+    client: botocore.client = None
+) -> bytes:
+    """
+    Asyncio counterpart of gdpr_obfuscator for async services.
+    Blocking S3 requests run in threads (asyncio.to_thread) and
+    masking, which is CPU bound, runs in executor, so event loop
+    is free while object is downloaded, masked and uploaded.
+    Object is held in memory, for large files use gdpr_obfuscator_stream
+    in a thread.
+
+    :param: JSON (string) request, see gdpr_obfuscator,
+        "file_to_obfuscate", "pii_fields" and optional "csv_engine",
+        "json_backend" and "output_file" keys are used
+    :param: executor (Executor) executor that mask the object,
+        e.g. ProcessPoolExecutor, None for default executor of the loop
+    :param: client s3 boto client, None to create one
+    :raise: ValueError when "output_file" is "file_to_obfuscate"
+    :return: bytestream representation of a file with obfuscated data
+        fields, empty bytes when masked file is uploaded to "output_file"
+    """
+    setup_logger() if not logging.getLogger().hasHandlers() else None
+
+    pydict = json.loads(JSON)
+    if client is None:
+        client = await asyncio.to_thread(boto3.client, 's3')
+    return await _async_obfuscate_object(
+        client, pydict, executor,
+        pydict['file_to_obfuscate'], pydict.get('output_file'))
+
+
+async def async_gdpr_obfuscator_batch(
+    JSON: str,
+    max_concurrency: int = BATCH_WORKERS,
+    executor: Executor | None = None
+) -> list[dict]:
+    """
+    Asyncio counterpart of gdpr_obfuscator_batch.
+    Objects are processed by tasks sharing one S3 client, at most
+    max_concurrency objects are in flight at once, the client
+    connection pool holds max_concurrency connections.
+    Failure of one object does not stop the batch, error is
+    logged and returned in the result of that object.
+
+    :param: JSON (string) request, see gdpr_obfuscator_batch
+    :param: max_concurrency (int) number of objects processed concurrently
+    :param: executor (Executor) executor that mask the objects,
+        e.g. ProcessPoolExecutor, None for default executor of the loop
+    :return: list of dicts, one per object in order of files,
+        see gdpr_obfuscator_batch
+    """
     setup_logger() if not logging.getLogger().hasHandlers() else None
 
     pydict = json.loads(JSON)
-    bucket, key = get_bucket_and_key(pydict['file_to_obfuscate'])
+    s3 = await asyncio.to_thread(
+        boto3.client, 's3',
+        config=botocore_config.Config(
+            max_pool_connections=max_concurrency))
+    if 'files_to_obfuscate' in pydict:
+        files = pydict['files_to_obfuscate']
+    else:
+        files = await asyncio.to_thread(
+            get_files, s3, pydict['prefix_to_obfuscate'])
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def obfuscate(s3_file_path: str) -> dict:
+        result = {
+            'file_to_obfuscate': s3_file_path,
+            'output_file': None,
+            'data': None,
+            'error': None
+        }
+        async with semaphore:
+            try:
+                if 'output_prefix' not in pydict:
+                    result['data'] = await _async_obfuscate_object(
+                        s3, pydict, executor, s3_file_path)
+                    return result
+
+                output_file = _batch_output_file(s3_file_path, pydict)
+                await _async_obfuscate_object(
+                    s3, pydict, executor, s3_file_path, output_file)
+                result['output_file'] = output_file
+            except Exception as error:
+                logger = logging.getLogger(__name__)
+                logger.setLevel('WARNING')
+                logger.error(
+                    f'{s3_file_path}...{type(error).__name__}: {error}')
+                result['error'] = error
+        return result
+
+    return list(await asyncio.gather(*map(obfuscate, files)))
+
+
+async def _async_obfuscate_object(
+    client: botocore.client,
+    options: dict,
+    executor: Executor | None,
+    s3_file_path: str,
+    output_file: str | None = None
+) -> bytes:
+    """
+    Download S3 object in a thread, mask it in executor and
+    upload it to output_file in a thread when given.
+
+    :param: client s3 boto client
+    :param: options (dict) request, see gdpr_obfuscator
+    :param: executor (Executor) executor that mask the object
+        or None for default executor of the loop
+    :param: s3_file_path (str) S3 location of the object
+    :param: output_file (str) S3 location of masked object or None
+    :raise: ValueError when output_file is s3_file_path
+    :raise: UnsupportedData when object is not csv, json or parquet
+    :return: bytestream of masked object, empty bytes when it is uploaded
+    """
+    if output_file == s3_file_path:
+        raise ValueError('output_file would overwrite file_to_obfuscate.')
+    bucket, key = get_bucket_and_key(s3_file_path)
     data_type = get_data_type(key)
+    data = await asyncio.to_thread(get_data, client, bucket, key)
+    masked = await asyncio.get_running_loop().run_in_executor(
+        executor, _obfuscate_data, data, data_type, options)
+    if output_file is None:
+        return masked
 
-    s3 = boto3.client('s3')
-    data: bytes = get_data(s3, bucket, key)
+    output_bucket, output_key = get_bucket_and_key(output_file)
+    await asyncio.to_thread(
+        upload_stream, client, [masked], output_bucket, output_key)
+    return b''
 
-    if data_type == 'csv':
-        masked = obfuscate_csv(data.decode(), pydict['pii_fields']).encode()
-    elif data_type == 'json':
-        masked = obfuscate_json(data, pydict['pii_fields']).encode()
-    elif data_type == 'parquet':
-        masked = obfuscate_parquet(data, pydict['pii_fields'])
 
-    return masked
+def _obfuscate_data(data: bytes, data_type: str, options: dict) -> bytes:
+    """
+    Mask options["pii_fields"] in data, see _obfuscate_stream
+
+    :param: data (bytes) csv, json or parquet file
+    :param: data_type (str) csv, json or parquet
+    :param: options (dict) request, see gdpr_obfuscator
+    :return: bytestream of the data with obfuscated fields
+    """
+    if options.get('detect_pii'):
+        options = _with_detected_pii(options, detect_pii(data, data_type))
+    return b''.join(_obfuscate_stream(BytesIO(data), data_type, options))
 
 
-def get_bucket_and_key(s3_file_path: str) -> tuple[str, str]:
+def _write_s3_object(
+    client: botocore.client,
+    s3_file_path: str,
+    output_file: str,
+    options: dict,
+    chunk_size: int = CHUNK_SIZE,
+    pool: Executor | None = None
+) -> None:
     """
-    Extract S3 bucket name and key of the object from s3 file path
-    expect file path like:
-        's3://backet_name/folder1/../file.txt'
+    Mask S3 object and upload it to output_file, object without
+    pii_fields is copied to output_file by S3.
 
-    :param: s3_file_path (str) path to data on AWS s3
-    :return: Tuple[str, str] Bucket, Key
+    :param: client s3 boto client
+    :param: s3_file_path (str) S3 location of the object
+    :param: output_file (str) S3 location of masked object
+    :param: options (dict) request, see gdpr_obfuscator
+    :param: chunk_size (int) number of bytes read from S3 per chunk
+    :param: pool (Executor) process pool that mask the object
+        or None to mask it in this thread
+    :raise: ValueError when output_file is s3_file_path
+    :raise: UnsupportedData when object is not csv, json or parquet
     """
-    o = urlparse(s3_file_path, allow_fragments=False)
-    return o.netloc, o.path.lstrip('/')
+    if output_file == s3_file_path:
+        raise ValueError('output_file would overwrite file_to_obfuscate.')
+    bucket, key = get_bucket_and_key(s3_file_path)
+    output_bucket, output_key = get_bucket_and_key(output_file)
+    parquet_file = _open_parquet_object(client, bucket, key)
+    options = _detect_s3_pii(client, bucket, key, options, parquet_file)
+    if not _needs_masking(
+        client, bucket, key, get_data_type(key), options['pii_fields'],
+        parquet_file
+    ):
+        client.copy({'Bucket': bucket, 'Key': key}, output_bucket, output_key)
+        return
+    upload_stream(
+        client,
+        _obfuscate_s3_object(
+            client, s3_file_path, options, chunk_size, pool,
+            probe=False, parquet_file=parquet_file
+        ),
+        output_bucket,
+        output_key
+    )
 
 
-class UnsupportedData(Exception):
-    """Traps error where data is not supported"""
-    pass
+def _open_parquet_object(
+    client: botocore.client,
+    bucket: str,
+    key: str
+) -> pq.ParquetFile | None:
+    """
+    Open parquet s3 object once, so its footer read by one ranged GET
+    is shared by pii detection, probe and masking, see open_parquet
+
+    :param: client s3 boto client
+    :param: bucket (string) s3 bucket name
+    :param: key (string) s3 data key
+    :return: (pyarrow.parquet.ParquetFile) or None when object
+        is not parquet or is compressed, see get_object_compression
+    """
+    if get_data_type(key) != 'parquet' or get_object_compression(
+            client, bucket, key):
+        return None
+    return open_parquet(client, bucket, key)
 
 
-def get_data_type(key: str) -> str:
+def _needs_masking(
+    client: botocore.client,
+    bucket: str,
+    key: str,
+    data_type: str,
+    pii_fields: list,
+    parquet_file: pq.ParquetFile | None = None
+) -> bool:
     """
-    Extract data type from s3 object key
-    Valid data type: csv, json, parquet
+    Check if any of pii_fields is in csv header or parquet schema
+    of S3 object, read with ranged GETs without downloading the object.
+    When none is, missing pii_fields are logged with warning level.
+    Json fields are known only after records are parsed,
+    json object always needs masking, as compressed parquet object does.
 
-    :param: key (string) s3 object key
-    :raise: UnsupportedData Exeption
-        when data not csv, json or parquet
-    :return: (string) indicating data type
+    :param: client s3 boto client
+    :param: bucket (string) s3 bucket name
+    :param: key (string) s3 data key
+    :param: data_type (str) csv, json or parquet
+    :param: pii_fields (list) of the names of the fields that to be obfuscated
+    :param: parquet_file (pyarrow.parquet.ParquetFile) parquet object
+        already opened, see _open_parquet_object, None to open it
+    :return: (bool) False when object has nothing to mask
     """
-    allowed_types = ['csv', 'json', 'parquet']
-    data_type = key.split('.')[-1]
-    if data_type not in allowed_types:
-        raise UnsupportedData(
-            f'Function supports only {", ".join(allowed_types)} types.')
-    return data_type
+    if data_type == 'csv':
+        header = get_csv_header(client, bucket, key)
+        if header is None:
+            return False
+        if any(field in header for field in pii_fields):
+            return True
+        _csv_mask_indices(header, pii_fields)
+        return False
 
+    if data_type == 'parquet':
+        if parquet_file is None:
+            parquet_file = _open_parquet_object(client, bucket, key)
+        if parquet_file is None:
+            return True
+        names = parquet_file.schema_arrow.names
+        if any(field in names or _split_path(field)[0] in names
+               for field in pii_fields):
+            return True
+        _parquet_mask_fields(names, pii_fields)
+        return False
 
-def get_data(client: botocore.client, bucket: str, key: str) -> bytes:
+    return True
+
+
+def _detect_s3_pii(
+    client: botocore.client,
+    bucket: str,
+    key: str,
+    options: dict,
+    parquet_file: pq.ParquetFile | None = None
+) -> dict:
     """
-    Retrieve data from s3
+    Add pii fields detected in sample of S3 object to options
+    when options["detect_pii"], csv and json sample is the first
+    DETECT_SAMPLE_BYTES of the object, parquet sample the first rows
+    of its text columns, both read with ranged GETs, see detect_pii
 
     :param: client s3 boto client
     :param: bucket (string) s3 bucket name
     :param: key (string) s3 data key
-    :return: bytestream representation of a data
+    :param: options (dict) request, see gdpr_obfuscator
+    :param: parquet_file (pyarrow.parquet.ParquetFile) parquet object
+        already opened, see _open_parquet_object, None to open it
+    :return: (dict) request with detected pii_fields
+    """
+    if not options.get('detect_pii'):
+        return options
+    data_type = get_data_type(key)
+    if data_type == 'parquet':
+        sample = parquet_file or _open_parquet_object(client, bucket, key)
+        if sample is None:
+            body = get_stream(client, bucket, key)
+            try:
+                stream, compression = _open_compressed(body)
+                with _decompressed_file(stream, compression) as sample:
+                    return _with_detected_pii(
+                        options, detect_pii(sample, data_type))
+            finally:
+                body.close()
+    else:
+        try:
+            sample = get_object(
+                client, bucket, key,
+                Range=f'bytes=0-{DETECT_SAMPLE_BYTES - 1}'
+            )['Body'].read()
+            if len(sample) == DETECT_SAMPLE_BYTES:
+                sample = sample[:sample.rfind(b'\n') + 1] or sample
+        except botocore_exceptions.ClientError as error:
+            if error.response['Error']['Code'] != 'InvalidRange':
+                raise
+            sample = b''
+    return _with_detected_pii(options, detect_pii(sample, data_type))
+
+
+def _with_detected_pii(options: dict, detected: dict) -> dict:
+    """
+    Add detected fields to options["pii_fields"], masked with
+    options["masking"], detected fields are logged with warning level.
+
+    :param: options (dict) request, see gdpr_obfuscator
+    :param: detected (dict) pii fields detected, see detect_pii
+    :return: (dict) request with detected pii_fields
     """
     logger = logging.getLogger(__name__)
-    logger.setLevel('CRITICAL')
+    logger.setLevel('WARNING')
+    pii_fields = options.get('pii_fields') or []
+    fields = [field for field in detected if field not in pii_fields]
+    for field in fields:
+        logger.warning(
+            f"WARNING pii_field:'{field}' detected as "
+            f"{detected[field]['pii']}...masking..."
+        )
+    if isinstance(pii_fields, dict):
+        pii_fields = {**pii_fields, **dict.fromkeys(fields)}
+    else:
+        pii_fields = [*pii_fields, *fields]
+    return {**options, 'pii_fields': pii_fields, 'detect_pii': False}
+
+
+def _obfuscate_s3_object(
+    client: botocore.client,
+    s3_file_path: str,
+    options: dict,
+    chunk_size: int = CHUNK_SIZE,
+    pool: Executor | None = None,
+    probe: bool = True,
+    parquet_file: pq.ParquetFile | None = None
+) -> Iterator[bytes]:
+    """
+    Stream S3 object and yield it with options["pii_fields"] masked.
+
+    :param: client s3 boto client
+    :param: s3_file_path (str) S3 location of the object
+    :param: options (dict) request, see gdpr_obfuscator
+    :param: chunk_size (int) number of bytes read from S3 per chunk
+    :param: pool (Executor) process pool that mask the object
+        or None to mask it in this thread
+    :param: probe (bool) check header or footer first and yield
+        object unchanged when it has no pii_fields, see _needs_masking
+    :param: parquet_file (pyarrow.parquet.ParquetFile) parquet object
+        already opened, see _open_parquet_object, None to open it
+    :raise: UnsupportedData when object is not csv, json or parquet
+    :return: iterator of bytes chunks of the file with obfuscated fields
+    """
+    bucket, key = get_bucket_and_key(s3_file_path)
+    data_type = get_data_type(key)
+    if parquet_file is None:
+        parquet_file = _open_parquet_object(client, bucket, key)
+    options = _detect_s3_pii(client, bucket, key, options, parquet_file)
+    if probe and not _needs_masking(
+        client, bucket, key, data_type, options['pii_fields'], parquet_file
+    ):
+        yield from _iter_chunks(get_stream(client, bucket, key), chunk_size)
+        return
+    if pool is not None:
+        yield from _obfuscate_s3_object_in_pool(
+            client, pool, s3_file_path, options, chunk_size)
+        return
+    if data_type == 'parquet' and parquet_file is not None:
+        yield from obfuscate_parquet_stream(
+            parquet_file,
+            options['pii_fields'],
+            options.get('masking')
+        )
+        return
+    if data_type == 'csv' and options.get('processes') and not (
+            get_object_compression(client, bucket, key)):
+        yield from _obfuscate_csv_ranges(
+            client, bucket, key, options, chunk_size)
+        return
+    yield from _obfuscate_stream(
+        get_stream(client, bucket, key),
+        data_type,
+        options,
+        chunk_size
+    )
+
+
+def _obfuscate_s3_object_in_pool(
+    client: botocore.client,
+    pool: Executor,
+    s3_file_path: str,
+    options: dict,
+    chunk_size: int = CHUNK_SIZE
+) -> Iterator[bytes]:
+    """
+    Download S3 object to shared memory, mask it in pool process
+    and yield masked data from shared memory the process wrote.
+
+    :param: client s3 boto client
+    :param: pool (Executor) process pool
+    :param: s3_file_path (str) S3 location of the object
+    :param: options (dict) request, see gdpr_obfuscator
+    :param: chunk_size (int) number of bytes read from S3 per chunk
+    :raise: UnsupportedData when object is not csv, json or parquet
+    :return: iterator of bytes chunks of the file with obfuscated fields
+    """
+    bucket, key = get_bucket_and_key(s3_file_path)
+    data_type = get_data_type(key)
+    name, size = _mask_in_pool(
+        client, pool, bucket, key, data_type, options, chunk_size)
+    yield from _iter_shared_memory(name, size, chunk_size)
+
+
+def _mask_in_pool(
+    client: botocore.client,
+    pool: Executor,
+    bucket: str,
+    key: str,
+    data_type: str,
+    options: dict,
+    chunk_size: int = CHUNK_SIZE,
+    header: list | None = None,
+    **kwargs
+) -> tuple[str, int]:
+    """
+    Download S3 object (or byte range of it) to shared memory
+    and mask it in pool process.
+
+    :param: client s3 boto client
+    :param: pool (Executor) process pool
+    :param: bucket (string) s3 bucket name
+    :param: key (string) s3 data key
+    :param: data_type (str) csv, json or parquet
+    :param: options (dict) request, see gdpr_obfuscator
+    :param: chunk_size (int) number of bytes read from S3 per chunk
+    :param: header (list) csv header when data is byte range of records
+    :param: kwargs extra GetObject arguments, e.g. Range
+    :return: tuple(name, size) of shared memory holding masked data,
+        see _iter_shared_memory
+    """
+    response = get_object(client, bucket, key, **kwargs)
+    data = _to_shared_memory(
+        _iter_chunks(response['Body'], chunk_size),
+        response['ContentLength']
+    )
     try:
-        response = client.get_object(
-            Bucket=bucket,
-            Key=key)
-        return response['Body'].read()
-    except ClientError as error:
-        if error.response['Error']['Code'] == 'NoSuchKey':
-            logger.critical('NoSuchKey')
-            pass
-        elif error.response['Error']['Code'] == 'NoSuchBucket':
-            logger.critical('NoSuchBucket')
-            pass
+        return pool.submit(
+            _obfuscate_shared_memory,
+            data.name, response['ContentLength'],
+            data_type, options, chunk_size, header
+        ).result()
+    finally:
+        data.close()
+        data.unlink()
+
+
+def _to_shared_memory(chunks: Iterable[bytes], size: int) -> SharedMemory:
+    """
+    Copy bytes chunks of size bytes in total to new shared memory.
+
+    :param: chunks (Iterable[bytes]) data
+    :param: size (int) number of bytes of the data
+    :return: (SharedMemory) holding the data, caller has to unlink it
+    """
+    memory = SharedMemory(create=True, size=max(size, 1))
+    try:
+        position = 0
+        for chunk in chunks:
+            memory.buf[position:position + len(chunk)] = chunk
+            position += len(chunk)
+    except BaseException:
+        memory.close()
+        memory.unlink()
         raise
+    return memory
 
 
-def obfuscate_csv(data: str, pii_fields: list) -> str:
+def _grow_shared_memory(
+    chunks: Iterable[bytes],
+    capacity: int
+) -> tuple[SharedMemory, int]:
     """
-    Pure function that mask pii_fields in data
-    Behaviour:
-        :Will return empty str if receives empty data string
-        :When detect pii_fild that is not present in csv fieldnames
-            function will log with warning level,and disregard that pii_fild.
+    Copy bytes chunks of unknown total size to new shared memory
+    as they are produced, so only one chunk is held on the heap.
+    Shared memory of capacity bytes is replaced by one twice as large
+    when chunks outgrow it.
 
-    :param: data (string) csv data
-    :param: pii_fields (list) of the names of the fields that to be obfuscated
-    :return: (str) csv file with pii masked
+    :param: chunks (Iterable[bytes]) data
+    :param: capacity (int) expected number of bytes of the data
+    :return: tuple(shared memory holding the data, caller has to
+        unlink it, number of bytes of the data)
     """
-    logger = logging.getLogger(__name__)
-    logger.setLevel('WARNING')
-    dict_reader = csv.DictReader(StringIO(data))
-    if dict_reader.fieldnames is None:
-        return str()
+    memory = SharedMemory(create=True, size=max(capacity, 1))
+    position = 0
+    try:
+        for chunk in chunks:
+            end = position + len(chunk)
+            if end > memory.size:
+                grown = SharedMemory(
+                    create=True, size=max(2 * memory.size, end))
+                grown.buf[:position] = memory.buf[:position]
+                memory.close()
+                memory.unlink()
+                memory = grown
+            memory.buf[position:end] = chunk
+            position = end
+    except BaseException:
+        memory.close()
+        memory.unlink()
+        raise
+    return memory, position
 
-    masked = []
-    for row in dict_reader:
-        for field in pii_fields:
-            if field in dict_reader.fieldnames:
-                row[field] = '***'
-            else:
-                logger.warning(
-                    f'WARNING pii_field:\'{field}\' not in data...skipping...'
-                )
-        masked.append(row)
 
-    masked_bufer = StringIO()
-    writer = csv.DictWriter(masked_bufer, dict_reader.fieldnames)
-    writer.writeheader()
-    writer.writerows(masked)
-    return masked_bufer.getvalue()
+def _iter_shared_memory(
+    name: str,
+    size: int,
+    chunk_size: int = CHUNK_SIZE
+) -> Iterator[bytes]:
+    """
+    Yield data of shared memory chunk_size bytes at a time,
+    shared memory is unlinked when iterator is done or closed.
+
+    :param: name (str) name of shared memory
+    :param: size (int) number of bytes of the data
+    :param: chunk_size (int) size of yielded chunks
+    :return: iterator of bytes chunks
+    """
+    memory = SharedMemory(name)
+    try:
+        for start in range(0, size, chunk_size):
+            yield bytes(memory.buf[start:min(start + chunk_size, size)])
+    finally:
+        memory.close()
+        memory.unlink()
 
 
-def obfuscate_json(data: bytes, pii_fields: list) -> str:
+def _obfuscate_shared_memory(
+    name: str,
+    size: int,
+    data_type: str,
+    options: dict,
+    chunk_size: int = CHUNK_SIZE,
+    header: list | None = None
+) -> tuple[str, int]:
     """
-    Pure function that mask pii_fields in data
-    Behaviour:
-        :Will return empty serilized list if data is empty or wrong format
-            expect bytes data in format [{data1}, {data2} ...]
-        :When detect pii_fild that is not present in fieldnames
-            function will log with warning level,and disregard that pii_fild.
+    Mask data held in shared memory, runs in pool process.
+    Data is read in place, masked data is written chunk by chunk
+    to new shared memory that caller has to unlink.
 
-    :param: data (bytes) representation of json data
-    :param: pii_fields (list) of the names of the fields that to be obfuscated
-    :return: parsed object with pii masked
+    :param: name (str) name of shared memory holding the data
+    :param: size (int) number of bytes of the data
+    :param: data_type (str) csv, json or parquet
+    :param: options (dict) request, see gdpr_obfuscator
+    :param: chunk_size (int) approximate size of masked chunks
+    :param: header (list) csv header when data is byte range of records
+    :raise: ValueError when csv byte range has odd number of quotes,
+        it starts or ends in quoted value
+    :return: tuple(name, size) of shared memory holding masked data
     """
-    logger = logging.getLogger(__name__)
-    logger.setLevel('WARNING')
+    data = SharedMemory(name)
     try:
-        data_list = json.loads(data)
-        keys = list(data_list[0].keys())
-    except json.decoder.JSONDecodeError:
-        data_list = []
-    for x in data_list:
-        for y in pii_fields:
-            if y in keys:
-                x[y] = '***'
-            else:
-                logger.warning(
-                    f'WARNING pii_field:\'{y}\' not in data...skipping...'
-                )
-    return json.dumps(data_list)
-
-
-def obfuscate_parquet(data: bytes, pii_fields: list, **kwargs) -> bytes:
+        buffer = pa.py_buffer(data.buf[:size])
+        if header is not None and _count_quotes_in_buffer(buffer) % 2:
+            raise ValueError(
+                'csv byte range splits quoted value, '
+                'set newlines_in_values to true.')
+        masked, masked_size = _grow_shared_memory(
+            _obfuscate_stream(
+                pa.BufferReader(buffer),
+                data_type,
+                options,
+                chunk_size,
+                header
+            ),
+            size
+        )
+        masked.close()
+    except BaseException as error:
+        # frames of masking generators hold views of data
+        traceback.clear_frames(error.__traceback__)
+        raise
+    finally:
+        buffer = None
+        data.close()
+    return masked.name, masked_size
+
+
+def _count_quotes_in_buffer(buffer: pa.Buffer) -> int:
     """
-    Pure function that mask pii_fields in parquet data,
-    function “delete” columns from a Parquet file by
-    reading the data into memory, filter out the PII columns,
-    and create a new Parquet file, while keeping column order.
+    Count quote characters of buffer in place, with arrow kernel
+    on one element binary array over the buffer, without copying it.
 
-    Default Behaviour:
-        :PyArrow Parquete engine write parquet file with default params.
-        as per pyarrow.parquet.write_table function.
-        Use kwargs to modify default behaviour.
+    :param: buffer (pyarrow.Buffer) data
+    :return: (int) number of quote characters
+    """
+    offsets = pa.array([0, buffer.size], pa.int64()).buffers()[1]
+    array = pa.Array.from_buffers(
+        pa.large_binary(), 1, [None, offsets, buffer])
+    return pc.count_substring(array, '"')[0].as_py()
 
-        :When detect pii_fild that is not present in table function
-        will log with warning level,and disregard that pii_fild.
 
-    :param: data (bytes) parquet data
-    :param: pii_fields (list) of the names of the fields to be obfuscated
-    :return: parquet data with pii masked
+def _obfuscate_csv_ranges(
+    client: botocore.client,
+    bucket: str,
+    key: str,
+    options: dict,
+    chunk_size: int = CHUNK_SIZE
+) -> Iterator[bytes]:
     """
-    logger = logging.getLogger(__name__)
-    logger.setLevel('WARNING')
-    table = pq.read_table(pa.BufferReader(data))
-    num_rows = table.num_rows
-    column_names = table.column_names
-    for pii_field in pii_fields:
-        try:
-            table = table.drop_columns(pii_field)
-            table = table.add_column(
-                column_names.index(pii_field),
-                pii_field,
-                [['***' for _ in range(num_rows)]]
-            )
-        except KeyError:
-            logger.warning(
-                f'WARNING pii_field:\'{pii_field}\' not in data...skipping...'
+    Mask csv object in parallel byte ranges.
+    Object is split every options["range_size"] bytes, each split is
+    moved to the end of the record it falls in, found with ranged GET
+    of a small window. Header is read and written once, ranges are
+    downloaded by threads to shared memory, masked by
+    options["processes"] processes and yielded in order.
+    Unless options["newlines_in_values"] is false, quotes of every
+    range are counted first, split falls in quoted value when number
+    of quotes before it is odd. Range with odd number of quotes
+    raises ValueError instead of being masked misaligned.
+
+    :param: client s3 boto client
+    :param: bucket (string) s3 bucket name
+    :param: key (string) s3 data key
+    :param: options (dict) request, see gdpr_obfuscator
+    :param: chunk_size (int) number of bytes read from S3 per chunk
+    :return: iterator of utf-8 encoded csv chunks with pii masked
+    """
+    size = client.head_object(Bucket=bucket, Key=key)['ContentLength']
+    range_size = options.get('range_size', CSV_RANGE_SIZE)
+    if size <= range_size:
+        yield from _obfuscate_stream(
+            get_stream(client, bucket, key), 'csv', options, chunk_size)
+        return
+
+    processes = options['processes']
+    offsets = list(range(0, size, range_size))
+    with ThreadPoolExecutor(processes) as threads:
+        if options.get('newlines_in_values', True):
+            counts = threads.map(
+                lambda start: _count_quotes(
+                    client, bucket, key, start,
+                    min(start + range_size, size), chunk_size),
+                offsets
             )
-            pass
-    pq.write_table(table, parquet_bufer := BytesIO(), **kwargs)
-    return parquet_bufer.getvalue()
+            parities = [count % 2 for count in accumulate(counts, initial=0)]
+        else:
+            parities = [None] * len(offsets)
+        boundaries = sorted({size, *threads.map(
+            lambda offset, parity: _find_record_end(
+                client, bucket, key, offset, parity, size),
+            offsets, parities
+        )})
+
+        header_data = get_object(
+            client, bucket, key,
+            Range=f'bytes=0-{boundaries[0] - 1}'
+        )['Body'].read()
+        header = next(csv.reader(_iter_lines([header_data])), None)
+        engine = options.get('csv_engine', 'python')
+        yield from obfuscate_csv_stream(
+            BytesIO(header_data), options['pii_fields'], chunk_size, engine)
+        if header is None:
+            return
+        pii_fields = options['pii_fields']
+        present = [field for field in pii_fields if field in header]
+        options = {
+            **options,
+            'pii_fields': {field: pii_fields[field] for field in present}
+            if isinstance(pii_fields, dict) else present
+        }
+
+        pending = deque()
+        with ProcessPoolExecutor(processes, get_context('spawn')) as pool:
+            try:
+                for start, end in zip(boundaries, boundaries[1:]):
+                    pending.append(threads.submit(
+                        _mask_in_pool, client, pool, bucket, key, 'csv',
+                        options, chunk_size, header,
+                        Range=f'bytes={start}-{end - 1}'
+                    ))
+                    if len(pending) > 2 * processes:
+                        yield from _iter_shared_memory(
+                            *pending.popleft().result(), chunk_size)
+                while pending:
+                    yield from _iter_shared_memory(
+                        *pending.popleft().result(), chunk_size)
+            finally:
+                for future in pending:
+                    if not future.cancel() and not future.exception():
+                        masked = SharedMemory(future.result()[0])
+                        masked.close()
+                        masked.unlink()
+
+
+def _count_quotes(
+    client: botocore.client,
+    bucket: str,
+    key: str,
+    start: int,
+    end: int,
+    chunk_size: int = CHUNK_SIZE
+) -> int:
+    """
+    Count quote characters in byte range [start, end) of S3 object
+
+    :param: client s3 boto client
+    :param: bucket (string) s3 bucket name
+    :param: key (string) s3 data key
+    :param: start (int) first byte of the range
+    :param: end (int) byte after the range
+    :param: chunk_size (int) number of bytes read from S3 per chunk
+    :return: (int) number of quote characters
+    """
+    stream = get_object(
+        client, bucket, key, Range=f'bytes={start}-{end - 1}')['Body']
+    return sum(chunk.count(b'"') for chunk in _iter_chunks(stream, chunk_size))
+
+
+def _find_record_end(
+    client: botocore.client,
+    bucket: str,
+    key: str,
+    offset: int,
+    parity: int | None,
+    size: int,
+    window: int = CSV_RANGE_WINDOW
+) -> int:
+    """
+    Find end of csv record holding byte at offset of S3 object,
+    object is read in windows of window bytes from offset.
+
+    :param: client s3 boto client
+    :param: bucket (string) s3 bucket name
+    :param: key (string) s3 data key
+    :param: offset (int) position in the object
+    :param: parity (int) number of quotes before offset modulo 2,
+        None when values have no newlines
+    :param: size (int) size of the object
+    :param: window (int) number of bytes read per ranged GET
+    :return: (int) position after the first newline at or after offset
+        that is not in quoted value, size when there is none
+    """
+    while offset < size:
+        end = min(offset + window, size)
+        block = get_object(
+            client, bucket, key, Range=f'bytes={offset}-{end - 1}'
+        )['Body'].read()
+        record_end, parity = _scan_record_end(block, parity)
+        if record_end is not None:
+            return offset + record_end
+        offset = end
+    return size
+
+
+def _scan_record_end(
+    block: bytes,
+    parity: int | None
+) -> tuple[int | None, int | None]:
+    """
+    Find end of csv record holding the first byte of block
+
+    :param: block (bytes) csv data
+    :param: parity (int) number of quotes before block modulo 2,
+        None when values have no newlines
+    :return: tuple(position after the first newline that is not
+        in quoted value or None when there is none,
+        number of quotes before the end of block modulo 2)
+    """
+    position = 0
+    while (newline := block.find(b'\n', position)) >= 0:
+        if parity is not None:
+            parity ^= block.count(b'"', position, newline) & 1
+        if not parity:
+            return newline + 1, parity
+        position = newline + 1
+    if parity is not None:
+        parity ^= block.count(b'"', position) & 1
+    return None, parity
+
+
+def _obfuscate_stream(
+    stream,
+    data_type: str,
+    options: dict,
+    chunk_size: int = CHUNK_SIZE,
+    header: list | None = None
+) -> Iterator[bytes]:
+    """
+    Mask options["pii_fields"] in data read from binary stream.
+    Stream that is not seekable is spooled to a temporary file
+    for parquet data.
+    Data compressed with gzip, bz2 or zstd, found by its magic bytes,
+    is decompressed as it is read and masked data is compressed
+    with the same codec as it is yielded, compressed parquet data
+    is decompressed to a temporary file.
+
+    :param: stream binary file like object with read(size)
+    :param: data_type (str) csv, json or parquet
+    :param: options (dict) request, see gdpr_obfuscator
+    :param: chunk_size (int) number of bytes read per chunk
+    :param: header (list) csv header when data is byte range of records
+    :return: iterator of bytes chunks of the data with obfuscated fields
+    """
+    if header is not None:
+        yield from _mask_stream(stream, data_type, options, chunk_size, header)
+        return
+    stream, compression = _open_compressed(stream)
+    if compression is None:
+        yield from _mask_stream(stream, data_type, options, chunk_size)
+        return
+    if data_type != 'parquet':
+        yield from _compress_chunks(
+            _mask_stream(
+                _decompress_stream(stream, compression),
+                data_type, options, chunk_size
+            ),
+            compression
+        )
+        return
+    with _decompressed_file(stream, compression, chunk_size) as parquet_file:
+        yield from _compress_chunks(
+            _mask_stream(parquet_file, data_type, options, chunk_size),
+            compression
+        )
+
+
+def _mask_stream(
+    stream,
+    data_type: str,
+    options: dict,
+    chunk_size: int = CHUNK_SIZE,
+    header: list | None = None
+) -> Iterator[bytes]:
+    """
+    Mask options["pii_fields"] in uncompressed data read from
+    binary stream, see _obfuscate_stream
+
+    :param: stream binary file like object with read(size)
+    :param: data_type (str) csv, json or parquet
+    :param: options (dict) request, see gdpr_obfuscator
+    :param: chunk_size (int) number of bytes read per chunk
+    :param: header (list) csv header when data is byte range of records
+    :return: iterator of bytes chunks of the data with obfuscated fields
+    """
+    if data_type == 'csv':
+        yield from obfuscate_csv_stream(
+            stream,
+            options['pii_fields'],
+            chunk_size,
+            options.get('csv_engine', 'python'),
+            header,
+            options.get('masking')
+        )
+        return
+
+    if data_type == 'parquet':
+        if stream.seekable():
+            yield from obfuscate_parquet_stream(
+                stream, options['pii_fields'], options.get('masking'))
+            return
+        with TemporaryFile() as parquet_file:
+            copyfileobj(stream, parquet_file, chunk_size)
+            parquet_file.seek(0)
+            yield from obfuscate_parquet_stream(
+                parquet_file,
+                options['pii_fields'],
+                options.get('masking')
+            )
+        return
+
+    if data_type == 'json':
+        yield from obfuscate_json_stream(
+            stream,
+            options['pii_fields'],
+            chunk_size,
+            options.get('json_backend', 'auto'),
+            options.get('masking')
+        )
+
+
+def get_bucket_and_key(s3_file_path: str) -> tuple[str, str]:
+    """
+    Extract S3 bucket name and key of the object from s3 file path
+    expect file path like:
+        's3://backet_name/folder1/../file.txt'
+
+    :param: s3_file_path (str) path to data on AWS s3
+    :return: Tuple[str, str] Bucket, Key
+    """
+    o = urlparse(s3_file_path, allow_fragments=False)
+    return o.netloc, o.path.lstrip('/')
+
+
+class UnsupportedData(Exception):
+    """Traps error where data is not supported"""
+    pass
+
+
+def get_data_type(key: str) -> str:
+    """
+    Extract data type from s3 object key
+    Valid data type: csv, json, parquet
+    Compression extension is skipped, e.g. file.csv.gz is csv
+
+    :param: key (string) s3 object key
+    :raise: UnsupportedData Exeption
+        when data not csv, json or parquet
+    :return: (string) indicating data type
+    """
+    allowed_types = ['csv', 'json', 'parquet']
+    if get_compression(key):
+        key = key.rsplit('.', 1)[0]
+    data_type = key.split('.')[-1]
+    if data_type not in allowed_types:
+        raise UnsupportedData(
+            f'Function supports only {", ".join(allowed_types)} types.')
+    return data_type
+
+
+def get_compression(key: str, head: bytes = b'') -> str | None:
+    """
+    Extract compression codec from s3 object key extension,
+    e.g. file.csv.gz, or from magic bytes of the start of the data
+
+    :param: key (string) s3 object key
+    :param: head (bytes) first MAGIC_LENGTH bytes of the data
+    :return: (string) gzip, bz2, zstd or None when not compressed
+    """
+    extension = key.split('.')[-1]
+    if '.' in key and extension in COMPRESSIONS:
+        return COMPRESSIONS[extension]
+    for compression, magic in COMPRESSION_MAGIC.items():
+        if magic.match(head):
+            return compression
+    return None
+
+
+def _open_compressed(stream) -> tuple:
+    """
+    Read magic bytes of binary stream, seekable stream is moved back,
+    other is wrapped to be read from the start again.
+
+    :param: stream binary file like object with read(size)
+    :return: tuple(stream, compression codec or None), see get_compression
+    """
+    if stream.seekable():
+        position = stream.tell()
+        head = stream.read(MAGIC_LENGTH)
+        stream.seek(position)
+    else:
+        head = stream.read(MAGIC_LENGTH)
+        stream = BufferedReader(
+            _ChunkReader(chain([head], _iter_chunks(stream))))
+    return stream, get_compression('', head)
+
+
+def _decompress_stream(stream, compression: str):
+    """
+    :param: stream binary file like object with read(size)
+    :param: compression (str) gzip, bz2 or zstd
+    :raise: UnsupportedData when zstandard is not installed for zstd
+    :return: binary file like object reading decompressed stream
+        as it is read, without inflating it in memory
+    """
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=stream, mode='rb')
+    if compression == 'bz2':
+        return bz2.BZ2File(stream)
+    return BufferedReader(_zstandard().ZstdDecompressor().stream_reader(
+        stream, read_across_frames=True))
+
+
+@contextmanager
+def _decompressed_file(
+    stream,
+    compression: str,
+    chunk_size: int = CHUNK_SIZE
+):
+    """
+    Decompress stream to temporary file, for parquet data read
+    with seeks, without inflating it in memory
+
+    :param: stream binary file like object with read(size)
+    :param: compression (str) gzip, bz2 or zstd
+    :param: chunk_size (int) number of bytes copied per chunk
+    :return: context manager of temporary binary file at its start
+    """
+    with TemporaryFile() as file:
+        copyfileobj(_decompress_stream(stream, compression), file, chunk_size)
+        file.seek(0)
+        yield file
+
+
+def _decompress_sample(data: bytes, compression: str) -> bytes:
+    """
+    Decompress start of compressed data, data may be truncated,
+    e.g. ranged GET, output is cut after its last complete line
+    unless the end of compressed data was reached. Output is bounded
+    for every codec, zstd data shorter than DETECT_SAMPLE_BYTES
+    is taken as complete.
+
+    :param: data (bytes) compressed data
+    :param: compression (str) gzip, bz2 or zstd
+    :return: (bytes) up to DETECT_SAMPLE_BYTES of decompressed data
+    """
+    data = data[:DETECT_SAMPLE_BYTES]
+    if compression == 'gzip':
+        decompressor = zlib.decompressobj(31)
+        sample = decompressor.decompress(data, DETECT_SAMPLE_BYTES)
+        eof = decompressor.eof
+    elif compression == 'bz2':
+        decompressor = bz2.BZ2Decompressor()
+        sample = decompressor.decompress(data, DETECT_SAMPLE_BYTES)
+        eof = decompressor.eof
+    else:
+        sample = _decompress_stream(BytesIO(data), compression).read(
+            DETECT_SAMPLE_BYTES)
+        eof = len(data) < DETECT_SAMPLE_BYTES \
+            and len(sample) < DETECT_SAMPLE_BYTES
+    if eof:
+        return sample
+    return sample[:sample.rfind(b'\n') + 1]
+
+
+def _compress_chunks(
+    chunks: Iterable[bytes],
+    compression: str
+) -> Iterator[bytes]:
+    """
+    Compress bytes chunks as they are yielded
+
+    :param: chunks (Iterable[bytes]) data
+    :param: compression (str) gzip, bz2 or zstd
+    :raise: UnsupportedData when zstandard is not installed for zstd
+    :return: iterator of compressed chunks
+    """
+    if compression == 'gzip':
+        compressor = zlib.compressobj(wbits=31)
+    elif compression == 'bz2':
+        compressor = bz2.BZ2Compressor()
+    else:
+        compressor = _zstandard().ZstdCompressor().compressobj()
+    for chunk in chunks:
+        if compressed := compressor.compress(chunk):
+            yield compressed
+    yield compressor.flush()
+
+
+def _zstandard():
+    """
+    :raise: UnsupportedData when zstandard is not installed
+    :return: zstandard module
+    """
+    try:
+        return importlib.import_module('zstandard')
+    except ImportError:
+        raise UnsupportedData(
+            'zstd compression needs zstandard, pip install zstandard.'
+        ) from None
+
+
+def get_data(client: botocore.client, bucket: str, key: str) -> bytes:
+    """
+    Retrieve data from s3
+
+    :param: client s3 boto client
+    :param: bucket (string) s3 bucket name
+    :param: key (string) s3 data key
+    :return: bytestream representation of a data
+    """
+    return get_stream(client, bucket, key).read()
+
+
+def get_stream(client: botocore.client, bucket: str, key: str):
+    """
+    Open s3 object for reading without downloading it
+
+    :param: client s3 boto client
+    :param: bucket (string) s3 bucket name
+    :param: key (string) s3 data key
+    :return: botocore StreamingBody, file like object with read(size)
+    """
+    return get_object(client, bucket, key)['Body']
+
+
+def get_object(
+    client: botocore.client,
+    bucket: str,
+    key: str,
+    **kwargs
+) -> dict:
+    """
+    Send GetObject request for s3 object
+
+    :param: client s3 boto client
+    :param: bucket (string) s3 bucket name
+    :param: key (string) s3 data key
+    :param: kwargs extra GetObject arguments, e.g. Range='bytes=0-99'
+    :return: (dict) GetObject response, "Body" is botocore StreamingBody
+        and "ContentLength" its size in bytes
+    """
+    logger = logging.getLogger(__name__)
+    logger.setLevel('CRITICAL')
+    try:
+        return client.get_object(
+            Bucket=bucket,
+            Key=key,
+            **kwargs)
+    except botocore_exceptions.ClientError as error:
+        if error.response['Error']['Code'] == 'NoSuchKey':
+            logger.critical('NoSuchKey')
+            pass
+        elif error.response['Error']['Code'] == 'NoSuchBucket':
+            logger.critical('NoSuchBucket')
+            pass
+        raise
+
+
+def get_files(client: botocore.client, s3_prefix: str) -> list[str]:
+    """
+    List S3 locations of objects under s3 prefix
+
+    :param: client s3 boto client
+    :param: s3_prefix (str) S3 location prefix like 's3://bucket/folder/'
+    :return: list of S3 locations of the objects, ordered by key
+    """
+    bucket, prefix = get_bucket_and_key(s3_prefix)
+    paginator = client.get_paginator('list_objects_v2')
+    return [
+        f's3://{bucket}/{obj["Key"]}'
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix)
+        for obj in page.get('Contents', [])
+        if not obj['Key'].endswith('/')
+    ]
+
+
+def get_object_compression(
+    client: botocore.client,
+    bucket: str,
+    key: str
+) -> str | None:
+    """
+    Compression codec of s3 object from its key extension, object
+    without one is sniffed from its first MAGIC_LENGTH bytes read
+    with ranged GET, see get_compression
+
+    :param: client s3 boto client
+    :param: bucket (string) s3 bucket name
+    :param: key (string) s3 data key
+    :return: (string) gzip, bz2, zstd or None when not compressed
+    """
+    if compression := get_compression(key):
+        return compression
+    try:
+        head = get_object(
+            client, bucket, key, Range=f'bytes=0-{MAGIC_LENGTH - 1}'
+        )['Body'].read()
+    except botocore_exceptions.ClientError as error:
+        if error.response['Error']['Code'] != 'InvalidRange':
+            raise
+        return None
+    return get_compression(key, head)
+
+
+def _content_range_size(response: dict) -> int:
+    """
+    :param: response (dict) ranged GetObject response
+    :return: (int) size of the whole s3 object, from "ContentRange"
+        like 'bytes 0-99/1234'
+    """
+    return int(response['ContentRange'].rpartition('/')[2])
+
+
+def get_csv_header(
+    client: botocore.client,
+    bucket: str,
+    key: str
+) -> list | None:
+    """
+    Read header of csv s3 object with ranged GETs, header is parsed
+    from the first CSV_RANGE_WINDOW bytes of the object, later windows
+    are read only when header is longer. Header of compressed object
+    is decompressed from the start of the object and the rest of
+    the body is left unread and closed
+
+    :param: client s3 boto client
+    :param: bucket (string) s3 bucket name
+    :param: key (string) s3 data key
+    :return: (list) csv column names, None when object is empty
+    """
+    if not (compression := get_compression(key)):
+        try:
+            response = get_object(
+                client, bucket, key, Range=f'bytes=0-{CSV_RANGE_WINDOW - 1}')
+        except botocore_exceptions.ClientError as error:
+            if error.response['Error']['Code'] != 'InvalidRange':
+                raise
+            return None
+        header = response['Body'].read()
+        if not (compression := get_compression(key, header)):
+            end, parity = _scan_record_end(header, 0)
+            size = _content_range_size(response)
+            if end is None and len(header) < size:
+                end = _find_record_end(
+                    client, bucket, key, len(header), parity, size)
+                header += get_object(
+                    client, bucket, key, Range=f'bytes={len(header)}-{end - 1}'
+                )['Body'].read()
+            return next(csv.reader(_iter_lines([header[:end]])), None)
+    body = get_stream(client, bucket, key)
+    try:
+        with _decompress_stream(body, compression) as stream:
+            return next(csv.reader(
+                _iter_lines(_iter_chunks(stream, CSV_RANGE_WINDOW))), None)
+    finally:
+        body.close()
+
+
+def get_parquet_metadata(
+    client: botocore.client,
+    bucket: str,
+    key: str
+) -> pq.FileMetaData:
+    """
+    Read metadata of parquet s3 object from its footer with
+    ranged GETs of the end of the object only
+
+    :param: client s3 boto client
+    :param: bucket (string) s3 bucket name
+    :param: key (string) s3 data key
+    :return: (pyarrow.parquet.FileMetaData) schema, row groups
+        and column chunks of the object
+    """
+    return _get_parquet_footer(client, bucket, key)[0]
+
+
+def _get_parquet_footer(
+    client: botocore.client,
+    bucket: str,
+    key: str
+) -> tuple[pq.FileMetaData, int]:
+    """
+    Read metadata of parquet s3 object with suffix GET of its last
+    PARQUET_FOOTER_WINDOW bytes, longer footer is read with second GET,
+    size of the object is taken from "ContentRange" of the response
+
+    :param: client s3 boto client
+    :param: bucket (string) s3 bucket name
+    :param: key (string) s3 data key
+    :return: tuple(metadata, size in bytes of the object)
+    """
+    response = get_object(
+        client, bucket, key, Range=f'bytes=-{PARQUET_FOOTER_WINDOW}')
+    footer = response['Body'].read()
+    length = struct.unpack('<I', footer[-8:-4])[0] + 8
+    if length > len(footer):
+        footer = get_object(
+            client, bucket, key, Range=f'bytes=-{length}')['Body'].read()
+    metadata = pq.read_metadata(pa.BufferReader(b'PAR1' + footer[-length:]))
+    return metadata, _content_range_size(response)
+
+
+def probe_parquet(client: botocore.client, bucket: str, key: str) -> dict:
+    """
+    Describe parquet s3 object from its footer only, see
+    get_parquet_metadata, to plan which column chunks to download.
+
+    :param: client s3 boto client
+    :param: bucket (string) s3 bucket name
+    :param: key (string) s3 data key
+    :return: (dict) with keys
+        "columns" list of column names,
+        "num_rows" number of rows,
+        "row_groups" list of row groups, dict with keys "num_rows" and
+        "columns" mapping column path to dict of "offset" and "size"
+        in bytes of the column chunk in the object
+    """
+    metadata = get_parquet_metadata(client, bucket, key)
+    row_groups = []
+    for i in range(metadata.num_row_groups):
+        row_group = metadata.row_group(i)
+        columns = {}
+        for j in range(row_group.num_columns):
+            column = row_group.column(j)
+            offset = column.data_page_offset
+            if column.has_dictionary_page and column.dictionary_page_offset:
+                offset = min(offset, column.dictionary_page_offset)
+            columns[column.path_in_schema] = {
+                'offset': offset,
+                'size': column.total_compressed_size
+            }
+        row_groups.append({'num_rows': row_group.num_rows, 'columns': columns})
+    return {
+        'columns': metadata.schema.to_arrow_schema().names,
+        'num_rows': metadata.num_rows,
+        'row_groups': row_groups
+    }
+
+
+def open_parquet(
+    client: botocore.client,
+    bucket: str,
+    key: str
+) -> pq.ParquetFile:
+    """
+    Open parquet s3 object without downloading it.
+    Metadata is read from the footer, column chunks are read with
+    ranged GETs when row group columns are read, ranges of the columns
+    read together are coalesced (pre_buffer), so columns that
+    are not read are not downloaded.
+
+    :param: client s3 boto client
+    :param: bucket (string) s3 bucket name
+    :param: key (string) s3 data key
+    :return: (pyarrow.parquet.ParquetFile)
+    """
+    metadata, size = _get_parquet_footer(client, bucket, key)
+    return pq.ParquetFile(
+        _S3RangeFile(client, bucket, key, size),
+        metadata=metadata,
+        pre_buffer=True
+    )
+
+
+class _S3RangeFile(RawIOBase):
+    """Read only seekable binary file object over s3 object"""
+
+    def __init__(self, client: botocore.client, bucket: str, key: str,
+                 size: int):
+        self._client = client
+        self._bucket = bucket
+        self._key = key
+        self._size = size
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        start = (0, self._position, self._size)[whence]
+        self._position = max(start + offset, 0)
+        return self._position
+
+    def read(self, size: int = -1) -> bytes:
+        end = self._size if size < 0 else self._position + size
+        end = min(end, self._size)
+        if end <= self._position:
+            return b''
+        data = get_object(
+            self._client, self._bucket, self._key,
+            Range=f'bytes={self._position}-{end - 1}'
+        )['Body'].read()
+        self._position += len(data)
+        return data
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def upload_stream(
+    client: botocore.client,
+    chunks: Iterable[bytes],
+    bucket: str,
+    key: str,
+    part_size: int = PART_SIZE
+) -> None:
+    """
+    Upload bytes chunks to s3 object as they are produced.
+    Chunks are gathered in parts of part_size bytes, parts are uploaded
+    with multipart upload by background threads while next part is
+    produced, at most UPLOAD_THREADS parts are held in memory.
+    Size of the data is not known up front, part size grows with
+    part number so upload fits in MAX_PARTS parts, see _part_size.
+    Data smaller than part_size is uploaded with one PutObject.
+    Multipart upload is aborted when producing or uploading data fails.
+
+    :param: client s3 boto client
+    :param: chunks (Iterable[bytes]) data, e.g. masked file chunks
+    :param: bucket (string) s3 bucket name
+    :param: key (string) s3 data key
+    :param: part_size (int) size of the parts, S3 minimum is 5 MiB
+    :raise: exception raised by chunks or S3 upload
+    """
+    chunks = iter(chunks)
+    part = bytearray()
+    for chunk in chunks:
+        part += chunk
+        if len(part) >= part_size:
+            break
+    else:
+        client.put_object(Bucket=bucket, Key=key, Body=bytes(part))
+        return
+
+    upload_id = client.create_multipart_upload(
+        Bucket=bucket, Key=key)['UploadId']
+    pending, parts, number = deque(), [], 1
+    try:
+        with ThreadPoolExecutor(UPLOAD_THREADS) as uploader:
+            for chunk in chain(chunks, [None]):
+                if chunk is not None:
+                    part += chunk
+                    if len(part) < _part_size(part_size, number):
+                        continue
+                if part:
+                    pending.append((number, uploader.submit(
+                        client.upload_part,
+                        Bucket=bucket,
+                        Key=key,
+                        UploadId=upload_id,
+                        PartNumber=number,
+                        Body=bytes(part)
+                    )))
+                    part, number = bytearray(), number + 1
+                while pending and (
+                    len(pending) >= UPLOAD_THREADS or chunk is None
+                ):
+                    number, future = pending.popleft()
+                    parts.append({
+                        'ETag': future.result()['ETag'],
+                        'PartNumber': number
+                    })
+        client.complete_multipart_upload(
+            Bucket=bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': parts}
+        )
+    except BaseException:
+        client.abort_multipart_upload(
+            Bucket=bucket, Key=key, UploadId=upload_id)
+        raise
+
+
+def _part_size(part_size: int, number: int) -> int:
+    """
+    Size of part number of multipart upload, part_size is doubled
+    every MAX_PARTS // 10 parts, with 8 MiB part_size MAX_PARTS parts
+    hold about 8 TiB, more than S3 object limit of 5 TiB, in parts of at
+    most 4 GiB, below S3 part limit of 5 GiB.
+
+    :param: part_size (int) size of the first parts
+    :param: number (int) part number, from 1
+    :return: (int) size of the part in bytes
+    """
+    return part_size << (number - 1) * 10 // MAX_PARTS
+
+
+def compile_mask(masking: dict | str | None = None):
+    """
+    Compile masking strategy once, masks are cached by strategy,
+    so memo of hmac values is shared by files and calls.
+
+    Strategies, given as dict or as name when it has no parameters:
+        {"strategy": "mask"} (default) replace values with '***'
+        {"strategy": "fixed", "length": 8} replace values with
+            length '*' characters
+        {"strategy": "null"} replace values with null
+            (empty value in csv)
+        {"strategy": "keep_last", "length": 4} keep last length
+            characters, replace the others with '*'
+        {"strategy": "email_domain"} keep domain of email address,
+            'john@mail.com' is masked '***@mail.com', values without
+            '@' are masked '***'
+        {"strategy": "hmac", "key": "secret", "length": 16}
+            keyed deterministic pseudonym, first length hex characters
+            of HMAC-SHA256 of the value with key, same value gives
+            same pseudonym in csv, json and parquet files, so masked
+            fields still join.
+    Value strategies (keep_last, email_domain, hmac) keep null values,
+    json values other than string are masked as json text, e.g. 1, true.
+
+    :param: masking (dict or str) masking strategy, None for default
+    :raise: ValueError when strategy is unknown or hmac has no key
+    :return: compiled mask, see _ConstantMask and _ValueMask
+    """
+    if isinstance(masking, str):
+        masking = {'strategy': masking}
+    return _compile_mask(json.dumps(masking or {}, sort_keys=True))
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def _compile_mask(masking: str):
+    """
+    :param: masking (str) json serialized masking strategy
+    :return: compiled mask, see compile_mask
+    """
+    masking = json.loads(masking)
+    strategy = masking.get('strategy', 'mask')
+    if strategy not in MASKING_STRATEGIES:
+        raise ValueError(
+            'masking strategy must be one of '
+            f'{", ".join(MASKING_STRATEGIES)}.')
+    if strategy == 'mask':
+        return _ConstantMask('***')
+    if strategy == 'fixed':
+        return _ConstantMask('*' * masking.get('length', 8))
+    if strategy == 'null':
+        return _ConstantMask(None)
+    if strategy == 'keep_last':
+        return _KeepLastMask(masking.get('length', 4))
+    if strategy == 'email_domain':
+        return _EmailDomainMask()
+    if not masking.get('key'):
+        raise ValueError('hmac masking requires key.')
+    return _HMACMask(
+        masking['key'].encode(), masking.get('length', HMAC_LENGTH))
+
+
+def _compile_masks(pii_fields: list | dict, masking=None) -> dict:
+    """
+    Compile mask of every pii field, see compile_mask
+
+    :param: pii_fields (list) of the names of the fields masked
+        with masking strategy, or (dict) mapping field name to its
+        masking strategy, None for masking strategy
+    :param: masking (dict or str) default masking strategy, its key is
+        used by hmac strategies of pii_fields without key
+    :raise: ValueError when strategy is not supported
+    :return: (dict) mapping field name to compiled mask
+    """
+    if not isinstance(pii_fields, dict):
+        return dict.fromkeys(pii_fields, compile_mask(masking))
+    if isinstance(masking, str):
+        masking = {'strategy': masking}
+    masking = masking or {}
+    masks = {}
+    for field, strategy in pii_fields.items():
+        if isinstance(strategy, str):
+            strategy = {'strategy': strategy}
+        strategy = dict(strategy or masking)
+        if strategy.get('strategy') == 'hmac' and 'key' not in strategy:
+            strategy['key'] = masking.get('key')
+        masks[field] = compile_mask(strategy)
+    return masks
+
+
+class _ConstantMask:
+    """
+    Replace every value with constant string, or null when constant
+    is None. Masked arrow columns are built from row count only.
+    """
+
+    is_constant = True
+
+    def __init__(self, constant: str | None = '***'):
+        self.constant = constant
+        self.constant_bytes = b'' if constant is None else constant.encode()
+
+    def value(self, value) -> str | None:
+        return self.constant
+
+    def value_bytes(self, value: bytes) -> bytes:
+        return self.constant_bytes
+
+    def arrow_type(self) -> pa.DataType:
+        return _mask_type()
+
+    def array(self, array: pa.Array) -> pa.DictionaryArray:
+        return self.constant_array(len(array))
+
+    def constant_array(self, length: int) -> pa.DictionaryArray:
+        if self.constant is None:
+            return pa.nulls(length, _mask_type())
+        return _mask_array(length, self.constant)
+
+
+class _ValueMask:
+    """
+    Mask computed from each value, subclasses implement mask(str)
+    for python values and array(pyarrow.Array) with arrow compute
+    kernels on whole columns.
+    """
+
+    is_constant = False
+    constant = None
+
+    def mask(self, value: str) -> str:
+        raise NotImplementedError
+
+    def value(self, value):
+        """
+        :param: value csv string or json value
+        :return: masked string, None for None
+        """
+        if value is None:
+            return None
+        if isinstance(value, list):
+            return [self.value(item) for item in value]
+        if not isinstance(value, str):
+            value = json.dumps(value)
+        return self.mask(value)
+
+    def value_bytes(self, value: bytes) -> bytes:
+        return self.mask(value.decode()).encode()
+
+    def arrow_type(self) -> pa.DataType:
+        return pa.string()
+
+
+class _KeepLastMask(_ValueMask):
+    """Keep last length characters, replace the others with '*'"""
+
+    def __init__(self, length: int = 4):
+        self._length = length
+
+    def mask(self, value: str) -> str:
+        cut = max(len(value) - self._length, 0)
+        return '*' * cut + value[cut:]
+
+    def array(self, array: pa.Array) -> pa.Array:
+        array = array.cast(pa.string())
+        stars = pc.binary_repeat('*', pc.max_element_wise(
+            pc.subtract(pc.utf8_length(array), self._length),
+            0,
+            skip_nulls=False
+        ))
+        if self._length:
+            kept = pc.utf8_slice_codeunits(array, start=-self._length)
+        else:
+            kept = pc.utf8_slice_codeunits(array, start=0, stop=0)
+        return pc.binary_join_element_wise(stars, kept, '')
+
+
+class _EmailDomainMask(_ValueMask):
+    """Keep domain of email address, '***@domain' or '***'"""
+
+    def mask(self, value: str) -> str:
+        local, at, domain = value.rpartition('@')
+        return f'***@{domain}' if at else '***'
+
+    def array(self, array: pa.Array) -> pa.Array:
+        array = array.cast(pa.string())
+        return pc.if_else(
+            pc.match_substring(array, '@'),
+            pc.replace_substring_regex(array, '(?s)^.*@', '***@'),
+            '***'
+        )
+
+
+class _HMACMask(_ValueMask):
+    """
+    Replace values with truncated hex HMAC-SHA256 of the value.
+    Keyed hmac object is built once and copied per value.
+    Values are hashed through bounded LRU memo, columns that repeat
+    values (e.g. emails) hit it, memo is bypassed for
+    HMAC_BYPASS_WINDOWS * HMAC_CACHE_SIZE values at a time
+    when it is hit by less than a third of values.
+    Arrow arrays are dictionary encoded and only unique values hashed,
+    dictionaries that would overflow the memo are hashed with no memo.
+    """
+
+    def __init__(self, key: bytes, length: int = HMAC_LENGTH):
+        self._hmac = hmac.new(key, digestmod='sha256')
+        self._length = length
+        self._memo = lru_cache(maxsize=HMAC_CACHE_SIZE)(self._miss)
+        self._window = HMAC_CACHE_SIZE
+        self._hits = 0
+        self.mask = self._memo
+
+    def _digest(self, value: str) -> str:
+        digest = self._hmac.copy()
+        digest.update(value.encode())
+        return digest.hexdigest()[:self._length]
+
+    def _miss(self, value: str) -> str:
+        """Hash value missed by memo, or bypassing it, see _check_memo"""
+        self._window -= 1
+        if not self._window:
+            self._check_memo()
+        return self._digest(value)
+
+    def _check_memo(self):
+        """
+        After HMAC_CACHE_SIZE misses bypass memo, when less than a third
+        of values hit it, use memo again after bypass window
+        """
+        self._window = HMAC_CACHE_SIZE
+        if self.mask is not self._memo:
+            self.mask = self._memo
+            return
+        hits = self._memo.cache_info().hits
+        if (hits - self._hits) * 2 < HMAC_CACHE_SIZE:
+            self._memo.cache_clear()
+            self._window *= HMAC_BYPASS_WINDOWS
+            self.mask = self._miss
+        self._hits = self._memo.cache_info().hits
+
+    def arrow_type(self) -> pa.DataType:
+        return pa.dictionary(pa.int32(), pa.string())
+
+    def array(self, array: pa.Array) -> pa.DictionaryArray:
+        """
+        :param: array (pyarrow.Array or ChunkedArray) values cast to string
+        :return: dictionary array of pseudonyms, nulls kept
+        """
+        if isinstance(array, pa.ChunkedArray):
+            return pa.chunked_array(
+                [self.array(chunk) for chunk in array.chunks],
+                self.arrow_type()
+            )
+        if not pa.types.is_dictionary(array.type):
+            array = array.cast(pa.string()).dictionary_encode()
+        dictionary = array.dictionary.cast(pa.string()).to_pylist()
+        mask = self._digest if len(dictionary) >= HMAC_CACHE_SIZE \
+            else self.mask
+        return pa.DictionaryArray.from_arrays(
+            array.indices.cast(pa.int32()),
+            pa.array(
+                [None if value is None else mask(value)
+                 for value in dictionary],
+                pa.string()
+            )
+        )
+
+
+def obfuscate_csv(
+    data: str,
+    pii_fields: list,
+    masking: dict | None = None
+) -> str:
+    """
+    Pure function that mask pii_fields in data
+    Behaviour:
+        :Will return empty str if receives empty data string
+        :When detect pii_fild that is not present in csv fieldnames
+            function will log with warning level,and disregard that pii_fild.
+
+    :param: data (string) csv data
+    :param: pii_fields (list) of the names of the fields that to be obfuscated
+    :param: masking (dict) masking strategy, see compile_mask,
+        None to replace values with '***'
+    :return: (str) csv file with pii masked
+    """
+    return ''.join(_obfuscate_csv_lines(
+        StringIO(data), pii_fields, masking=masking))
+
+
+def obfuscate_csv_bytes(
+    data: bytes,
+    pii_fields: list,
+    masking: dict | None = None
+) -> bytes:
+    """
+    Pure function that mask pii_fields in utf-8 encoded csv data
+    Fast path for csv without quoting: when data has no quote characters
+    fields are masked by splitting bytes on delimiter and newlines,
+    with no decode/encode round trip. Data with quotes is handled by
+    the csv module as per obfuscate_csv.
+    Behaviour:
+        :Output is identical to obfuscate_csv(data.decode()).encode()
+        :Fast path does not validate utf-8 encoding of the data
+
+    :param: data (bytes) csv data
+    :param: pii_fields (list) of the names of the fields that to be obfuscated
+    :param: masking (dict) masking strategy, see compile_mask
+    :return: (bytes) csv data with pii masked
+    """
+    return b''.join(_obfuscate_csv_chunks(
+        [data], pii_fields, engine='bytes', masking=masking))
+
+
+def obfuscate_csv_arrow(
+    data: bytes,
+    pii_fields: list,
+    masking: dict | None = None
+) -> bytes:
+    """
+    Pure function that mask pii_fields in csv data with pyarrow.csv,
+    data is parsed in blocks by multiple threads and pii columns
+    are replaced with constant arrays.
+    Behaviour:
+        :All columns are read as strings, values are written unchanged
+        :Output is csv equivalent to obfuscate_csv, but pyarrow writer
+            quote every value and header, and end lines with \\n
+        :Rows with number of values other than header raise
+            pyarrow.ArrowInvalid
+        :Will return empty bytes if receives empty data
+
+    :param: data (bytes) csv data
+    :param: pii_fields (list) of the names of the fields that to be obfuscated
+    :param: masking (dict) masking strategy, see compile_mask
+    :return: (bytes) csv data with pii masked
+    """
+    return b''.join(_obfuscate_csv_arrow_chunks(
+        [data], pii_fields, masking=masking))
+
+
+def obfuscate_csv_stream(
+    stream,
+    pii_fields: list,
+    chunk_size: int = CHUNK_SIZE,
+    engine: str = 'python',
+    header: list | None = None,
+    masking: dict | None = None
+) -> Iterator[bytes]:
+    """
+    Generator that mask pii_fields in csv data read from a binary stream
+    Stream is read chunk_size bytes at a time and decoded incrementally,
+    rows are masked one by one, so memory does not grow with data size.
+    Behaviour:
+        :Output is identical to obfuscate_csv for the same data
+        :Yield nothing if stream is empty
+
+    :param: stream binary file like object with read(size),
+        e.g. botocore StreamingBody
+    :param: pii_fields (list) of the names of the fields that to be obfuscated
+    :param: chunk_size (int) number of bytes read per chunk and
+        approximate size of yielded chunks
+    :param: engine (string) csv engine:
+        'python' csv module,
+        'bytes' byte level masking while data has no quotes,
+            csv module from the first chunk with quotes onwards
+        'arrow' pyarrow.csv engine, see obfuscate_csv_arrow
+    :param: header (list) csv header when stream holds records only,
+        e.g. byte range of csv file, header is not written
+    :param: masking (dict) masking strategy, see compile_mask
+    :raise: ValueError when engine or masking is not supported
+    :return: iterator of utf-8 encoded csv chunks with pii masked
+    """
+    if engine not in CSV_ENGINES:
+        raise ValueError(
+            f'csv engine must be one of {", ".join(CSV_ENGINES)}.')
+    _compile_masks(pii_fields, masking)
+    yield from _obfuscate_csv_chunks(
+        _iter_chunks(stream, chunk_size),
+        pii_fields,
+        chunk_size,
+        engine,
+        header,
+        masking
+    )
+
+
+def _iter_chunks(stream, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Read binary stream chunk_size bytes at a time
+
+    :param: stream binary file like object with read(size)
+    :param: chunk_size (int) number of bytes read per chunk
+    :return: iterator of bytes chunks
+    """
+    while chunk := stream.read(chunk_size):
+        yield chunk
+
+
+def _iter_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    """
+    Decode utf-8 bytes chunks incrementally and yield lines
+    the same way iterating over StringIO would, line endings kept.
+
+    :param: chunks (Iterable[bytes]) utf-8 encoded text
+    :return: iterator of text lines
+    """
+    return _split_lines(codecs.iterdecode(chunks, 'utf-8'))
+
+
+def _split_lines(text: Iterable[str]) -> Iterator[str]:
+    """
+    Regroup text chunks in lines, line endings kept.
+
+    :param: text (Iterable[str]) chunks of text
+    :return: iterator of text lines
+    """
+    tail = ''
+    for chunk in text:
+        lines = (tail + chunk).split('\n')
+        tail = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    if tail:
+        yield tail
+
+
+def _iter_blocks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Regroup bytes chunks in blocks of whole lines, every block
+    ends with newline except the last one when data does not.
+
+    :param: chunks (Iterable[bytes]) of data
+    :return: iterator of line aligned bytes blocks
+    """
+    tail = b''
+    for chunk in chunks:
+        block = tail + chunk
+        cut = block.rfind(b'\n') + 1
+        if cut:
+            yield block[:cut]
+        tail = block[cut:]
+    if tail:
+        yield tail
+
+
+def _obfuscate_csv_chunks(
+    chunks: Iterable[bytes],
+    pii_fields: list,
+    chunk_size: int = CHUNK_SIZE,
+    engine: str = 'python',
+    header: list | None = None,
+    masking: dict | None = None
+) -> Iterator[bytes]:
+    """
+    Mask pii_fields in csv data given as utf-8 bytes chunks,
+    yield utf-8 encoded csv chunks with pii masked.
+
+    With 'bytes' engine line aligned blocks without quote characters
+    are masked on bytes, first block with quotes and the rest of data
+    are handed over to csv module.
+
+    :param: chunks (Iterable[bytes]) csv data
+    :param: pii_fields (list) of the names of the fields that to be obfuscated
+    :param: chunk_size (int) approximate size of yielded chunks
+    :param: engine (string) 'python', 'bytes' or 'arrow'
+    :param: header (list) csv header when chunks hold records only
+    :param: masking (dict) masking strategy, see compile_mask
+    :return: iterator of utf-8 encoded csv chunks with pii masked
+    """
+    if engine == 'arrow':
+        yield from _obfuscate_csv_arrow_chunks(
+            chunks, pii_fields, header, masking)
+        return
+
+    if engine == 'bytes':
+        if header is not None:
+            masks = _csv_column_masks(header, pii_fields, masking)
+        blocks = _iter_blocks(chunks)
+        for block in blocks:
+            if not _is_plain_csv(block, header is None):
+                chunks = chain([block], blocks)
+                break
+            if header is None:
+                line, _, block = block.partition(b'\n')
+                line = line.removesuffix(b'\r')
+                header = line.decode().split(',')
+                masks = _csv_column_masks(header, pii_fields, masking)
+                yield line + b'\r\n'
+            if masked := _mask_csv_block(block, masks, len(header)):
+                yield masked
+        else:
+            return
+
+    for chunk in _obfuscate_csv_lines(
+        _iter_lines(chunks),
+        pii_fields,
+        chunk_size,
+        header,
+        masking
+    ):
+        yield chunk.encode()
+
+
+def _obfuscate_csv_arrow_chunks(
+    chunks: Iterable[bytes],
+    pii_fields: list,
+    header: list | None = None,
+    masking: dict | None = None
+) -> Iterator[bytes]:
+    """
+    Mask pii_fields in csv data given as utf-8 bytes chunks with
+    pyarrow.csv streaming reader and writer, yield csv chunk per
+    record batch. Header is read first with csv module so that
+    every column is parsed as string, no type inference.
+    Null mask is written as empty quoted value, csv has no nulls.
+
+    :param: chunks (Iterable[bytes]) csv data
+    :param: pii_fields (list) of the names of the fields that to be obfuscated
+    :param: header (list) csv header when chunks hold records only,
+        header is not written
+    :param: masking (dict) masking strategy, see compile_mask
+    :return: iterator of utf-8 encoded csv chunks with pii masked
+    """
+    blocks = _iter_blocks(chunks)
+    include_header = header is None
+    if include_header:
+        first = next(blocks, b'')
+        header = next(csv.reader(_iter_lines([first])), None)
+        if header is None:
+            return
+        blocks = chain([first], blocks)
+
+    reader = pacsv.open_csv(
+        BufferedReader(_ChunkReader(blocks)),
+        read_options=pacsv.ReadOptions(
+            column_names=None if include_header else header),
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(
+            column_types={name: pa.string() for name in header},
+            strings_can_be_null=False,
+            quoted_strings_can_be_null=False
+        )
+    )
+    schema = reader.schema
+    masks = [
+        (i, _ConstantMask('') if mask.is_constant and mask.constant is None
+         else mask)
+        for i, mask in _csv_column_masks(schema.names, pii_fields, masking)
+    ]
+    for i, mask in masks:
+        schema = schema.set(
+            i, pa.field(schema.names[i], mask.arrow_type()))
+    masked_bufer = BytesIO()
+    with pacsv.CSVWriter(
+        masked_bufer,
+        schema,
+        write_options=pacsv.WriteOptions(include_header=include_header)
+    ) as writer:
+        for batch in reader:
+            columns = batch.columns
+            for i, mask in masks:
+                columns[i] = mask.array(columns[i])
+            writer.write_batch(
+                pa.RecordBatch.from_arrays(columns, schema=schema))
+            yield masked_bufer.getvalue()
+            masked_bufer.seek(0)
+            masked_bufer.truncate()
+    if masked_bufer.tell():
+        yield masked_bufer.getvalue()
+
+
+class _ChunkReader(RawIOBase):
+    """Read only binary file object over iterator of bytes chunks"""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._chunk = memoryview(b'')
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._chunk:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._chunk = memoryview(chunk)
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+
+
+def _is_plain_csv(block: bytes, has_header: bool = False) -> bool:
+    """
+    Check if block of csv data can be masked on bytes,
+    block must have no quote characters and no carriage return
+    other than in line endings, header line must not be blank.
+
+    :param: block (bytes) line aligned csv data
+    :param: has_header (bool) block starts with csv header
+    :return: (bool)
+    """
+    if has_header and block[:1] in (b'\n', b'\r'):
+        return False
+    return b'"' not in block and \
+        block.count(b'\r') == block.count(b'\r\n')
+
+
+def _mask_csv_block(block: bytes, masks: list[tuple], width: int) -> bytes:
+    """
+    Mask values in line aligned block of csv data without quoting,
+    rows are normalised as per _mask_csv_rows.
+
+    :param: block (bytes) of csv data lines without quote characters
+    :param: masks (list[tuple]) of column index and its compiled mask,
+        see _csv_column_masks
+    :param: width (int) number of columns in header
+    :raise: ValueError when row has more values than header
+    :return: (bytes) masked csv lines ending with \r\n,
+        empty row of one column is written as "" like csv module does
+    """
+    constants = [(i, m.constant_bytes) for i, m in masks if m.is_constant]
+    functions = [(i, m.value_bytes) for i, m in masks if not m.is_constant]
+    masked = []
+    for line in block.split(b'\n'):
+        if not (line := line.removesuffix(b'\r')):
+            continue
+        values = line.split(b',')
+        if len(values) != width:
+            if len(values) > width:
+                raise ValueError(
+                    'dict contains fields not in fieldnames: None')
+            values += [b''] * (width - len(values))
+        for i, constant in constants:
+            values[i] = constant
+        for i, mask in functions:
+            values[i] = mask(values[i])
+        masked.append(b','.join(values) or b'""')
+    masked.append(b'')
+    return b'\r\n'.join(masked) if len(masked) > 1 else b''
+
+
+def _obfuscate_csv_lines(
+    lines: Iterable[str],
+    pii_fields: list,
+    chunk_size: int = CHUNK_SIZE,
+    header: list | None = None,
+    masking: dict | None = None
+) -> Iterator[str]:
+    """
+    Mask pii_fields in csv lines, yield csv text chunks of
+    about chunk_size characters.
+    Column indices of pii_fields are resolved once from the header,
+    rows are plain lists and masked by index.
+
+    :param: lines (Iterable[str]) csv data split in lines
+    :param: pii_fields (list) of the names of the fields that to be obfuscated
+    :param: chunk_size (int) approximate size of yielded chunks
+    :param: header (list) csv header already read and written out,
+        when given lines hold csv records only
+    :param: masking (dict) masking strategy, see compile_mask
+    :return: iterator of csv text chunks with pii masked
+    """
+    reader = csv.reader(lines)
+    masked_bufer = StringIO()
+    writer = csv.writer(masked_bufer)
+    if header is None:
+        header = next(reader, None)
+        if header is None:
+            return
+        writer.writerow(header)
+
+    for row in _mask_csv_rows(
+        reader,
+        _csv_column_masks(header, pii_fields, masking),
+        len(header)
+    ):
+        writer.writerow(row)
+        if masked_bufer.tell() >= chunk_size:
+            yield masked_bufer.getvalue()
+            masked_bufer.seek(0)
+            masked_bufer.truncate()
+    if masked_bufer.tell():
+        yield masked_bufer.getvalue()
+
+
+def _csv_column_masks(
+    header: list,
+    pii_fields: list | dict,
+    masking: dict | None = None
+) -> list[tuple]:
+    """
+    Resolve column indices of pii_fields in csv header with their masks
+
+    :param: header (list) of csv column names
+    :param: pii_fields (list or dict) fields to be obfuscated,
+        see _compile_masks
+    :param: masking (dict) masking strategy, see compile_mask
+    :return: (list[tuple]) of column index and its compiled mask
+    """
+    masks = _compile_masks(pii_fields, masking)
+    return [
+        (i, masks[header[i]])
+        for i in _csv_mask_indices(header, pii_fields)
+    ]
+
+
+def _csv_mask_indices(header: list, pii_fields: list) -> list[int]:
+    """
+    Resolve column indices of pii_fields in csv header, see _mask_plan
+
+    :param: header (list) of csv column names
+    :param: pii_fields (list) of the names of the fields that to be obfuscated
+    :return: (list[int]) indices of the columns to be masked
+    """
+    return list(_mask_plan(tuple(header), tuple(pii_fields))[0])
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def _mask_plan(columns: tuple, pii_fields: tuple) -> tuple[tuple, tuple]:
+    """
+    Compile masking plan of columns (csv header, first json record keys
+    or parquet schema names) for pii_fields.
+    Plans are cached by columns and pii_fields with LRU eviction,
+    files that share a layout reuse the plan without planning it again.
+    When detect pii_fild that is not present in columns
+    function will log with warning level once per plan,
+    and disregard that pii_fild.
+
+    :param: columns (tuple) of column names
+    :param: pii_fields (tuple) of the names of the fields to be obfuscated
+    :return: tuple(indices of the columns to be masked in columns order,
+        pii_fields to be masked in pii_fields order)
+    """
+    logger = logging.getLogger(__name__)
+    logger.setLevel('WARNING')
+    names = set(columns)
+    for field in pii_fields:
+        if field not in names:
+            logger.warning(
+                f'WARNING pii_field:\'{field}\' not in data...skipping...'
+            )
+    pii = set(pii_fields)
+    return (
+        tuple(i for i, name in enumerate(columns) if name in pii),
+        tuple(field for field in pii_fields if field in names)
+    )
+
+
+def _mask_csv_rows(
+    rows: Iterable[list],
+    masks: list[tuple],
+    width: int
+) -> Iterator[list]:
+    """
+    Mask values of masked columns in each csv row
+    Rows are normalised as csv.DictReader and csv.DictWriter would do:
+    blank rows are skipped, short rows are padded with empty values,
+    rows longer than the header raise ValueError.
+
+    :param: rows (Iterable[list]) csv rows as lists of values
+    :param: masks (list[tuple]) of column index and its compiled mask,
+        see _csv_column_masks
+    :param: width (int) number of columns in header
+    :raise: ValueError when row has more values than header
+    :return: iterator of masked rows
+    """
+    constants = [(i, m.constant) for i, m in masks if m.is_constant]
+    functions = [(i, m.value) for i, m in masks if not m.is_constant]
+    for row in rows:
+        if len(row) != width:
+            if not row:
+                continue
+            if len(row) > width:
+                raise ValueError(
+                    'dict contains fields not in fieldnames: None')
+            row += [''] * (width - len(row))
+        for i, constant in constants:
+            row[i] = constant
+        for i, mask in functions:
+            row[i] = mask(row[i])
+        yield row
+
+
+def obfuscate_json(
+    data: bytes,
+    pii_fields: list,
+    backend: str = 'auto',
+    masking: dict | None = None
+) -> str:
+    """
+    Pure function that mask pii_fields in data
+    Behaviour:
+        :Will return empty serilized list if data is empty or wrong format
+            expect bytes data in format [{data1}, {data2} ...]
+            or newline delimited json records {data1}\\n{data2}\\n...
+        :When detect pii_fild that is not present in fieldnames
+            function will log with warning level,and disregard that pii_fild.
+
+    :param: data (bytes) representation of json data
+    :param: pii_fields (list) of the names of the fields that to be obfuscated
+    :param: backend (str) json backend, see obfuscate_json_stream
+    :param: masking (dict) masking strategy, see compile_mask
+    :return: parsed object with pii masked
+    """
+    if isinstance(data, str):
+        data = data.encode()
+    try:
+        return b''.join(_obfuscate_json_chunks(
+            [data], pii_fields, backend=backend, masking=masking)).decode()
+    except json.JSONDecodeError:
+        return json.dumps([])
+
+
+def obfuscate_json_stream(
+    stream,
+    pii_fields: list,
+    chunk_size: int = CHUNK_SIZE,
+    backend: str = 'auto',
+    masking: dict | None = None
+) -> Iterator[bytes]:
+    """
+    Generator that mask pii_fields in json data read from a binary stream
+    Records are parsed, masked and serialized one at a time, so memory
+    does not grow with data size.
+    Behaviour:
+        :Json array [{data1}, {data2} ...] is written as json array
+        :Newline delimited json {data1}\\n{data2}\\n... is written
+            as newline delimited json, one record per line
+        :Output is identical to obfuscate_json for the same data
+        :Yield empty serilized list if data is empty or wrong format,
+            raise json.JSONDecodeError if wrong format is detected after
+            masked data was yielded
+
+    Backends:
+        'auto' (default) 'orjson' when orjson is installed,
+            'json' otherwise.
+        'json' standard library json module, output is byte exact
+            json.dumps output and does not depend on what is installed.
+        'orjson' parse newline delimited json and serialize with orjson,
+            output is compact json (no spaces, utf-8 instead of \\u
+            escapes) semantically equivalent to 'json'. Records orjson
+            can not represent (integers out of 64 bit range, NaN,
+            Infinity) are handled by the json module.
+            Json arrays are always parsed by the json module scanner,
+            orjson has no incremental parser, only their serialization
+            uses orjson.
+
+    :param: stream binary file like object with read(size),
+        e.g. botocore StreamingBody
+    :param: pii_fields (list) of the names of the fields that to be obfuscated
+    :param: chunk_size (int) number of bytes read per chunk and
+        approximate size of yielded chunks
+    :param: backend (str) one of JSON_BACKENDS
+    :param: masking (dict) masking strategy, see compile_mask
+    :raise: ValueError when backend is unknown or not installed
+        or masking is not supported
+    :return: iterator of utf-8 encoded json chunks with pii masked
+    """
+    yield from _obfuscate_json_chunks(
+        _iter_chunks(stream, chunk_size),
+        pii_fields,
+        chunk_size,
+        backend,
+        masking
+    )
+
+
+def _obfuscate_json_chunks(
+    chunks: Iterable[bytes],
+    pii_fields: list,
+    chunk_size: int = CHUNK_SIZE,
+    backend: str = 'auto',
+    masking: dict | None = None
+) -> Iterator[bytes]:
+    """
+    Mask pii_fields in json array or newline delimited json records
+    given as utf-8 bytes chunks, yield utf-8 encoded json chunks.
+
+    :param: chunks (Iterable[bytes]) json data
+    :param: pii_fields (list) of the names of the fields that to be obfuscated
+    :param: chunk_size (int) approximate size of yielded chunks
+    :param: backend (str) one of JSON_BACKENDS
+    :param: masking (dict) masking strategy, see compile_mask
+    :raise: json.JSONDecodeError when data is wrong format
+        and masked data was already yielded
+    :return: iterator of utf-8 encoded json chunks with pii masked
+    """
+    loads, dumps, comma = _json_backend(backend)
+    tree = _json_mask_tree(_compile_masks(pii_fields, masking))
+    roots = {path: _split_path(path)[0] for path in pii_fields}
+    text = codecs.iterdecode(chunks, 'utf-8-sig')
+    for head in text:
+        if head := head.lstrip():
+            break
+    else:
+        yield json.dumps([]).encode()
+        return
+
+    text = chain([head], text)
+    if head[0] == '[':
+        records = _iter_json_array(text)
+        start, separator, end = b'[', comma, b']'
+    else:
+        records = (loads(line) for line in _split_lines(text)
+                   if not line.isspace())
+        start, separator, end = b'', b'\n', b'\n'
+
+    masked, size, emitted = [start], 0, False
+    batch, missing = [], None
+    try:
+        for record in records:
+            if missing is None:
+                missing = set(roots)
+            if missing and isinstance(record, dict):
+                missing = {path for path in missing
+                           if path not in record
+                           and roots[path] not in record}
+            _mask_json_value(record, tree)
+            batch.append(record)
+            if len(batch) < JSON_BATCH_RECORDS:
+                continue
+            if len(masked) > 1 or emitted:
+                masked.append(separator)
+            masked.append(dumps(batch, separator))
+            size += len(masked[-1])
+            batch = []
+            if size >= chunk_size:
+                yield b''.join(masked)
+                masked, size, emitted = [], 0, True
+    except json.JSONDecodeError:
+        if emitted:
+            raise
+        yield json.dumps([]).encode()
+        return
+    if missing is not None:
+        _mask_plan(
+            tuple(path for path in roots if path not in missing),
+            tuple(roots)
+        )
+    if batch:
+        if len(masked) > 1 or emitted:
+            masked.append(separator)
+        masked.append(dumps(batch, separator))
+    masked.append(end)
+    yield b''.join(masked)
+
+
+def _split_path(path: str) -> list[str]:
+    """
+    Split dotted or JSONPath style path of nested field in keys,
+    '$.customer.addresses[*].street' and 'customer.addresses.street'
+    are ['customer', 'addresses', 'street'], lists are traversed
+    element by element.
+
+    :param: path (str) of the field
+    :return: (list[str]) keys from the top level
+    """
+    return path.removeprefix('$.').replace('[*]', '').split('.')
+
+
+def _json_mask_tree(masks: dict) -> tuple:
+    """
+    Compile masks of pii paths in traversal tree of json records,
+    paths are parsed once per file, not per record.
+    Field masked as a whole is not traversed for its children.
+    Dotted path is also matched as top level key, e.g. 'user.name'
+    masks {"user.name": ...} as well as {"user": {"name": ...}}.
+
+    :param: masks (dict) mapping pii path to compiled mask
+    :return: (tuple) tree node, see _mask_json_value
+    """
+    tree = {}
+    for path, mask in masks.items():
+        *parents, leaf = _split_path(path)
+        node = tree
+        for key in parents:
+            node = node.setdefault(key, {})
+            if not isinstance(node, dict):
+                break
+        else:
+            node[leaf] = mask
+        if parents and not isinstance(tree.get(path), dict):
+            tree[path] = mask
+
+    def compile_node(node: dict) -> tuple:
+        return (
+            [(key, mask.constant) for key, mask in node.items()
+             if not isinstance(mask, dict) and mask.is_constant],
+            [(key, mask.value) for key, mask in node.items()
+             if not isinstance(mask, dict) and not mask.is_constant],
+            [(key, compile_node(child)) for key, child in node.items()
+             if isinstance(child, dict)]
+        )
+    return compile_node(tree)
+
+
+def _mask_json_value(value, node: tuple) -> None:
+    """
+    Mask json value in place with traversal tree node, fields missing
+    from value are skipped, list values are masked element by element.
+
+    :param: value parsed json value, e.g. record
+    :param: node (tuple) of lists of (key, constant) masked with
+        constant, (key, mask function) and (key, child node)
+    """
+    if isinstance(value, list):
+        for item in value:
+            _mask_json_value(item, node)
+        return
+    if not isinstance(value, dict):
+        return
+    constants, functions, children = node
+    for key, constant in constants:
+        if key in value:
+            value[key] = constant
+    for key, mask in functions:
+        if key in value:
+            value[key] = mask(value[key])
+    for key, child in children:
+        if key in value:
+            _mask_json_value(value[key], child)
+
+
+def _json_backend(backend: str) -> tuple:
+    """
+    Select functions of json backend.
+
+    :param: backend (str) one of JSON_BACKENDS
+    :raise: ValueError when backend is unknown or not installed
+    :return: tuple(loads, dumps, separator) function parsing one json
+        record, function serializing list of records joined with
+        separator, separator of json array items
+    """
+    if backend not in JSON_BACKENDS:
+        raise ValueError('json backend must be one of json, orjson, auto.')
+    if backend == 'orjson' and orjson is None:
+        raise ValueError('json backend orjson is not installed.')
+    if backend == 'json' or orjson is None:
+        return json.loads, _dump_json_records, b', '
+    return _orjson_loads, _orjson_dump_records, b','
+
+
+def _dump_json_records(records: list, separator: bytes) -> bytes:
+    """
+    Serialize records, json.dumps of the list is sliced when separator
+    is the one json.dumps put between list items, so records are
+    encoded in one call.
+
+    :param: records (list) of json records
+    :param: separator (bytes) between serialized records
+    :return: (bytes) serialized records joined with separator
+    """
+    if separator == b', ':
+        return json.dumps(records)[1:-1].encode()
+    return separator.decode().join(map(json.dumps, records)).encode()
+
+
+def _orjson_loads(data: str) -> object:
+    """
+    Parse json record with orjson, fall back to json module
+    for records orjson would parse differently or reject:
+    long numbers (orjson turn integers out of 64 bit range into float),
+    NaN, Infinity and lone surrogates.
+
+    :param: data (str) json record
+    :raise: json.JSONDecodeError when data is wrong format
+    :return: parsed json record
+    """
+    if JSON_LONG_NUMBER.search(data) is None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data, parse_constant=_JSONConstant)
+
+
+def _orjson_dump_records(records: list, separator: bytes) -> bytes:
+    """
+    Serialize records with orjson, json module is used for
+    records orjson can not serialize (integers out of 64 bit range
+    and NaN, Infinity parsed as _JSONConstant) and records holding
+    numbers out of float range, e.g. 1e400, orjson writes as null.
+
+    :param: records (list) of json records
+    :param: separator (bytes) between serialized records
+    :return: (bytes) serialized records joined with separator
+    """
+    try:
+        if separator == b',':
+            data = orjson.dumps(records)[1:-1]
+        else:
+            data = separator.join(map(orjson.dumps, records))
+    except TypeError:
+        return _dump_json_records(records, separator)
+    if b'null' in data and _has_infinite(records):
+        return _dump_json_records(records, separator)
+    return data
+
+
+def _has_infinite(value: object) -> bool:
+    """
+    Check parsed json value for infinite floats
+
+    :param: value (object) parsed json value
+    :return: (bool) True when value holds infinite float
+    """
+    if isinstance(value, float):
+        return math.isinf(value)
+    if isinstance(value, dict):
+        value = value.values()
+    elif not isinstance(value, list):
+        return False
+    return any(map(_has_infinite, value))
+
+
+class _JSONConstant(float):
+    """
+    NaN, Infinity and -Infinity parsed by json module,
+    orjson refuses float subclass so records holding them
+    are serialized by json module as the input wrote them.
+    """
+    pass
+
+
+def _iter_json_array(text: Iterable[str]) -> Iterator[object]:
+    """
+    Incremental parser of json array, yield elements of the array
+    one at a time as soon as text holding them is read.
+    Element that is not complete in text read so far is scanned again
+    only after text following its start has doubled, so elements
+    larger than chunks are parsed in linear time.
+
+    :param: text (Iterable[str]) chunks of json array text
+    :raise: json.JSONDecodeError when text is not json array
+    :return: iterator of parsed array elements
+    """
+    scan_once = json.JSONDecoder(parse_constant=_JSONConstant).scan_once
+    whitespace = json.decoder.WHITESPACE
+    buffer, position, expect = '', 0, '['
+    pending, pending_size, retry_size = [], 0, 0
+    for chunk in chain(text, [None]):
+        if chunk is not None:
+            pending.append(chunk)
+            pending_size += len(chunk)
+            if len(buffer) - position + pending_size < retry_size:
+                continue
+        buffer, position = buffer[position:] + ''.join(pending), 0
+        pending, pending_size, retry_size = [], 0, 0
+        length = len(buffer)
+        while True:
+            position = whitespace.match(buffer, position).end()
+            if position == length:
+                break
+            if expect == 'end':
+                raise json.JSONDecodeError('Extra data', buffer, position)
+            char = buffer[position]
+            if expect == '[':
+                if char != '[':
+                    raise json.JSONDecodeError(
+                        'Expecting \'[\' delimiter', buffer, position)
+                position += 1
+                expect = 'value or ]'
+                continue
+            if char == ']' and expect == 'value or ]':
+                position += 1
+                expect = 'end'
+                continue
+            while True:  # elements separated by commas within buffer
+                try:
+                    element, end = scan_once(buffer, position)
+                except (StopIteration, json.JSONDecodeError) as error:
+                    if chunk is not None:
+                        retry_size = 2 * (length - position)
+                        break
+                    if isinstance(error, StopIteration):
+                        raise json.JSONDecodeError(
+                            'Expecting value', buffer, error.value) from None
+                    raise
+                # element is complete only when followed by delimiter,
+                # e.g. number '1.' may continue with '5' in next chunk
+                match = JSON_DELIMITER.match(buffer, end)
+                if not match:
+                    if chunk is not None:
+                        retry_size = 2 * (length - position)
+                        break
+                    raise json.JSONDecodeError(
+                        'Expecting \',\' delimiter',
+                        buffer, whitespace.match(buffer, end).end())
+                yield element
+                position = match.end()
+                if match.group(1) == ']':
+                    expect = 'end'
+                    break
+                expect = 'value'
+                if position == length:
+                    break
+            if retry_size:
+                break
+    if expect != 'end':
+        raise json.JSONDecodeError('Unterminated array', buffer, position)
+
+
+def obfuscate_parquet(
+    data: bytes,
+    pii_fields: list,
+    masking: dict | None = None,
+    **kwargs
+) -> bytes:
+    """
+    Pure function that mask pii_fields in parquet data,
+    function “delete” columns from a Parquet file by
+    reading the data into memory, filter out the PII columns,
+    and create a new Parquet file, while keeping column order.
+
+    Default Behaviour:
+        :PyArrow Parquete engine write parquet file with settings
+        of the input file: compression codec, dictionary encoding,
+        column encoding and statistics per column, format version,
+        key-value metadata and one row group per row group of the input.
+        Use kwargs of pyarrow.parquet.ParquetWriter to override
+        default behaviour.
+
+        :When detect pii_fild that is not present in table function
+        will log with warning level,and disregard that pii_fild.
+
+    :param: data (bytes) parquet data
+    :param: pii_fields (list) of the names of the fields to be obfuscated
+    :param: masking (dict) masking strategy, see compile_mask
+    :return: parquet data with pii masked
+    """
+    return b''.join(
+        obfuscate_parquet_stream(data, pii_fields, masking, **kwargs))
+
+
+def obfuscate_parquet_stream(
+    source,
+    pii_fields: list,
+    masking: dict | None = None,
+    **kwargs
+) -> Iterator[bytes]:
+    """
+    Generator that mask pii_fields in parquet data row group by row group
+    Each row group of the source is read, masked and written through
+    pyarrow.parquet.ParquetWriter as one row group of the output, bytes
+    written so far are yielded after every row group, so memory stays
+    at about one row group whatever the size of the file.
+
+    Default Behaviour:
+        :Same as obfuscate_parquet, kwargs are passed to ParquetWriter,
+        row_group_size kwarg limits number of rows per output row group.
+
+    :param: source (bytes) parquet data, seekable binary file object
+        or pyarrow.parquet.ParquetFile, e.g. open_parquet
+    :param: pii_fields (list) of the names of the fields to be obfuscated
+    :param: masking (dict) masking strategy, see compile_mask,
+        masked columns are read only when mask is not constant
+    :return: iterator of parquet data chunks with pii masked
+    """
+    masks = _compile_masks(pii_fields, masking)
+    row_group_size = kwargs.pop('row_group_size', None)
+    if isinstance(source, bytes):
+        source = pa.BufferReader(source)
+    if isinstance(source, pq.ParquetFile):
+        parquet_file = source
+    else:
+        parquet_file = pq.ParquetFile(source)
+    masks = _parquet_nested_masks(parquet_file.schema_arrow, masks)
+    schema, fields = _parquet_mask_schema(
+        parquet_file.schema_arrow,
+        tuple((field, mask.arrow_type()) for field, mask in masks.items())
+    )
+    masks = {field: masks[field] for field in fields}
+
+    options = _parquet_write_options(parquet_file.metadata, fields)
+    if 'use_dictionary' in kwargs:
+        options.pop('column_encoding', None)
+    options.update(kwargs)
+
+    sink = _ChunkWriter()
+    with pq.ParquetWriter(sink, schema, **options) as writer:
+        for i in range(parquet_file.num_row_groups):
+            table = _read_masked_row_group(parquet_file, i, schema, masks)
+            writer.write_table(
+                table,
+                row_group_size=row_group_size or max(table.num_rows, 1)
+            )
+            yield sink.drain()
+    yield sink.drain()
+
+
+def _parquet_mask_fields(column_names: list, pii_fields: list) -> list:
+    """
+    Select pii_fields present in parquet columns, see _mask_plan
+
+    :param: column_names (list) of parquet columns
+    :param: pii_fields (list) of the names of the fields to be obfuscated
+    :return: (list) pii_fields to be masked
+    """
+    return list(_mask_plan(tuple(column_names), tuple(pii_fields))[1])
+
+
+def _parquet_nested_masks(schema: pa.Schema, masks: dict) -> dict:
+    """
+    Group masks of nested pii paths, e.g. 'customer.email' or
+    '$.customer.addresses[*].street', by their top level struct or list
+    column, see _split_path. Values of list columns are masked
+    element by element. Nested paths of column masked as a whole
+    are dropped, paths not found in schema are kept as they are,
+    to be logged as missing fields.
+
+    :param: schema (pyarrow.Schema) of parquet file
+    :param: masks (dict) mapping pii path to compiled mask
+    :return: (dict) mapping column names and missing paths to masks
+    """
+    nested, columns = {}, {}
+    for field, mask in masks.items():
+        root, *path = _split_path(field)
+        if field in schema.names:
+            root, path = field, []
+        elif root not in schema.names:
+            columns[field] = mask
+            continue
+        data_type = schema.field(root).type
+        if path and _has_nested_path(data_type, path) or not path and (
+            not mask.is_constant and (pa.types.is_list(data_type)
+                                      or pa.types.is_large_list(data_type))
+        ):
+            nested.setdefault(root, []).append((path, mask))
+        elif path:
+            columns[field] = mask
+        else:
+            columns[root] = mask
+    for root, paths in nested.items():
+        if root not in columns:
+            columns[root] = _NestedMask(schema.field(root).type, paths)
+    return columns
+
+
+def _has_nested_path(data_type: pa.DataType, path: list) -> bool:
+    """
+    :param: data_type (pyarrow.DataType) of struct or list column
+    :param: path (list) of struct field names, lists are traversed
+    :return: (bool) True when path is in data_type
+    """
+    for key in path:
+        while pa.types.is_list(data_type) or pa.types.is_large_list(
+                data_type):
+            data_type = data_type.value_type
+        if not pa.types.is_struct(data_type) or (
+                data_type.get_field_index(key) < 0):
+            return False
+        data_type = data_type.field(key).type
+    return True
+
+
+def _mask_nested(array, path: list, mask):
+    """
+    Mask nested field of struct or list array with arrow compute,
+    arrays are rebuilt around masked values, their nulls and offsets
+    are kept. Masked values are plain strings.
+
+    :param: array (pyarrow.Array or pyarrow.ChunkedArray)
+    :param: path (list) of struct field names, lists are traversed
+    :param: mask compiled mask, see compile_mask
+    :return: masked array
+    """
+    if isinstance(array, pa.ChunkedArray):
+        if not array.num_chunks:
+            return pa.chunked_array([], _mask_nested(
+                pa.array([], array.type), path, mask).type)
+        return pa.chunked_array(
+            [_mask_nested(chunk, path, mask) for chunk in array.chunks])
+    data_type = array.type
+    if pa.types.is_list(data_type) or pa.types.is_large_list(data_type):
+        values = _mask_nested(array.values, path, mask)
+        list_type = pa.list_ if pa.types.is_list(data_type) else (
+            pa.large_list)
+        return type(array).from_arrays(
+            array.offsets,
+            values,
+            type=list_type(data_type.value_field.with_type(values.type)),
+            mask=array.is_null()
+        )
+    if path:
+        index = data_type.get_field_index(path[0])
+        fields = list(data_type)
+        children = [array.field(j) for j in range(data_type.num_fields)]
+        children[index] = _mask_nested(children[index], path[1:], mask)
+        fields[index] = fields[index].with_type(children[index].type)
+        return pa.StructArray.from_arrays(
+            children, fields=fields, mask=array.is_null())
+    if mask.is_constant:
+        array = mask.constant_array(len(array))
+    else:
+        array = mask.array(array)
+    if pa.types.is_dictionary(array.type):
+        return array.dictionary_decode()
+    return array
+
+
+class _NestedMask:
+    """
+    Masks of nested fields of one struct or list column, see _mask_nested
+    """
+
+    is_constant = False
+    constant = None
+
+    def __init__(self, data_type: pa.DataType, paths: list):
+        self._paths = paths
+        self._type = self.array(pa.array([], data_type)).type
+
+    def arrow_type(self) -> pa.DataType:
+        return self._type
+
+    def array(self, array):
+        for path, mask in self._paths:
+            array = _mask_nested(array, path, mask)
+        return array
+
+
+def _parquet_mask_schema(
+    schema: pa.Schema,
+    mask_types: tuple
+) -> tuple[pa.Schema, tuple]:
+    """
+    Compile masking plan of parquet schema, output schema with pii_fields
+    columns replaced by columns of their mask type, dictionary mask types
+    are replaced by their value type so masked columns keep logical type
+    string for readers, see _compile_mask_schema.
+    Schema metadata (e.g. pandas metadata) is not hashable and differs
+    between files of same layout, it is left out of the cache key
+    and put back on the output schema.
+
+    :param: schema (pyarrow.Schema) of parquet file
+    :param: mask_types (tuple) of pairs of pii field name
+        and pyarrow.DataType of its masked column
+    :return: tuple(output schema, pii_fields to be masked)
+    """
+    key = schema.remove_metadata().serialize().to_pybytes()
+    output, fields = _compile_mask_schema(key, mask_types)
+    if schema.metadata:
+        output = output.with_metadata(schema.metadata)
+    return output, fields
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def _compile_mask_schema(
+    schema: bytes,
+    mask_types: tuple
+) -> tuple[pa.Schema, tuple]:
+    """
+    Cached by serialized schema and mask types with LRU eviction,
+    field metadata is part of the key, see _mask_plan
+
+    :param: schema (bytes) arrow IPC serialized schema with no metadata
+    :param: mask_types (tuple) of pairs of pii field name
+        and pyarrow.DataType of its masked column
+    :return: tuple(output schema, pii_fields to be masked)
+    """
+    schema = pa.ipc.read_schema(pa.py_buffer(schema))
+    types = dict(mask_types)
+    fields = _mask_plan(tuple(schema.names), tuple(types))[1]
+    for field in fields:
+        data_type = types[field]
+        if pa.types.is_dictionary(data_type):
+            data_type = data_type.value_type
+        schema = schema.set(
+            schema.get_field_index(field),
+            pa.field(field, data_type)
+        )
+    return schema, fields
+
+
+def _parquet_write_options(
+    metadata: pq.FileMetaData,
+    fields: list
+) -> dict:
+    """
+    ParquetWriter kwargs that reproduce settings of the parquet file,
+    read from column chunks of the first row group: compression codec,
+    dictionary encoding, column encoding, statistics and format version.
+    Masked fields are always dictionary encoded.
+    Column encoding of nested fields of masked struct or list columns
+    is not kept, their masked values may change type.
+    Page size and data page version are not stored in file metadata,
+    pyarrow defaults are used for them.
+
+    :param: metadata (pyarrow.parquet.FileMetaData) of input file
+    :param: fields (list) of the column names to be masked
+    :return: (dict) kwargs for pyarrow.parquet.ParquetWriter
+    """
+    options = {}
+    if metadata.format_version in PARQUET_VERSIONS:
+        options['version'] = metadata.format_version
+    if not metadata.num_row_groups:
+        return options
+
+    compression, use_dictionary = {}, list(fields)
+    column_encoding, write_statistics = {}, []
+    row_group = metadata.row_group(0)
+    for j in range(row_group.num_columns):
+        column = row_group.column(j)
+        path = column.path_in_schema
+        if column.compression in PARQUET_CODECS:
+            compression[path] = PARQUET_CODECS[column.compression]
+        if column.is_stats_set:
+            write_statistics.append(path)
+        if path in fields:
+            continue
+        if DICTIONARY_ENCODINGS.intersection(column.encodings):
+            use_dictionary.append(path)
+        elif path.split('.', 1)[0] not in fields and (
+            encoding := COLUMN_ENCODINGS.intersection(column.encodings)
+        ):
+            column_encoding[path] = encoding.pop()
+    options.update(
+        compression=compression,
+        use_dictionary=use_dictionary,
+        write_statistics=write_statistics
+    )
+    if column_encoding:
+        options['column_encoding'] = column_encoding
+    return options
+
+
+def _read_masked_row_group(
+    parquet_file: pq.ParquetFile,
+    i: int,
+    schema: pa.Schema,
+    masks: dict
+) -> pa.Table:
+    """
+    Read row group of parquet file with pii columns masked
+    Columns with constant mask are not read nor decoded, they are
+    built from the row count in the row group metadata, other masked
+    columns are masked with arrow compute on whole column.
+    Dictionary masked columns are cast to string of the schema, writer
+    still store them dictionary encoded.
+
+    :param: parquet_file (pyarrow.parquet.ParquetFile)
+    :param: i (int) row group index
+    :param: schema (pyarrow.Schema) of the masked table
+    :param: masks (dict) mapping column names to be masked
+        to their compiled mask
+    :return: (pyarrow.Table) masked row group
+    """
+    num_rows = parquet_file.metadata.row_group(i).num_rows
+    columns = iter(parquet_file.read_row_group(
+        i,
+        columns=[name for name in schema.names
+                 if name not in masks or not masks[name].is_constant]
+    ).columns)
+    arrays = []
+    for field in schema:
+        if field.name not in masks:
+            arrays.append(next(columns))
+            continue
+        if masks[field.name].is_constant:
+            array = masks[field.name].constant_array(num_rows)
+        else:
+            array = masks[field.name].array(next(columns))
+        arrays.append(array.cast(field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def _mask_array(length: int, value: str = '***') -> pa.DictionaryArray:
+    """
+    Constant value array built as dictionary array with one
+    dictionary entry and zeroed int8 indices, no python objects
+    per row, cast to string before parquet columns are written.
+
+    :param: length (int) number of rows
+    :param: value (str) masked value
+    :return: (pyarrow.DictionaryArray) of value
+    """
+    return pa.DictionaryArray.from_arrays(
+        pa.repeat(pa.scalar(0, pa.int8()), length),
+        pa.array([value], pa.string())
+    )
+
+
+@cache
+def _mask_type() -> pa.DataType:
+    """
+    :return: (pyarrow.DataType) type of masked parquet columns,
+        int8 indexed dictionary of strings, see _mask_array
+    """
+    return pa.dictionary(pa.int8(), pa.string())
+
+
+class _ChunkWriter(RawIOBase):
+    """
+    Write only binary file object that keep written bytes until drained,
+    tell() report total number of bytes written, as writers expect.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        """
+        :return: (bytes) written since last drain
+        """
+        chunk = b''.join(self._chunks)
+        self._chunks.clear()
+        return chunk
+
+
+def detect_pii(
+    data,
+    data_type: str,
+    sample_rows: int = DETECT_SAMPLE_ROWS,
+    threshold: float = DETECT_THRESHOLD
+) -> dict:
+    """
+    Detect pii fields from content of the first sample_rows rows.
+    Text columns of the sample are matched against PII_PATTERNS
+    (emails, phone numbers, UK NI numbers, IBANs) with arrow
+    regex kernels on whole columns, first with one combined pattern,
+    then pattern by pattern only for columns it matches.
+    Values are matched whole, after trimming whitespace, empty
+    values are not counted. Nested json and parquet fields are
+    reported by path, e.g. 'customer.email', see _split_path.
+    Only first rows are read, cost does not depend on size of file.
+    IBAN checksums are not verified.
+
+    :param: data (bytes) csv, json or parquet data, parquet may also be
+        seekable binary file object or pyarrow.parquet.ParquetFile,
+        json data may be truncated, e.g. by ranged GET, it is
+        sampled up to its last complete record, data compressed with
+        gzip, bz2 or zstd is decompressed up to DETECT_SAMPLE_BYTES
+    :param: data_type (str) csv, json or parquet
+    :param: sample_rows (int) number of rows sampled
+    :param: threshold (float) minimal share of values of the field
+        matching pattern for field to be reported
+    :raise: UnsupportedData when data_type is not csv, json or parquet
+    :return: (dict) mapping detected field to dict with "pii" name of
+        the best matching pattern and its "hit_rate", e.g.
+        {"email_address": {"pii": "email", "hit_rate": 0.98}}
+    """
+    if isinstance(data, bytes) and (
+        compression := get_compression('', data[:MAGIC_LENGTH])
+    ):
+        if data_type == 'parquet':
+            with _decompressed_file(BytesIO(data), compression) as file:
+                return detect_pii(file, data_type, sample_rows, threshold)
+        data = _decompress_sample(data, compression)
+    if data_type == 'csv':
+        columns = _sample_csv_columns(data, sample_rows)
+    elif data_type == 'json':
+        columns = _sample_json_columns(data, sample_rows)
+    elif data_type == 'parquet':
+        columns = _sample_parquet_columns(data, sample_rows)
+    else:
+        raise UnsupportedData(
+            'Function supports only csv, json and parquet file format.')
+
+    detected = {}
+    for field, array in columns:
+        rates = _pii_hit_rates(array, threshold)
+        if rates:
+            pii = max(rates, key=rates.get)
+            detected[field] = {'pii': pii, 'hit_rate': rates[pii]}
+    return detected
+
+
+def _pii_hit_rates(array: pa.Array, threshold: float) -> dict:
+    """
+    :param: array (pyarrow.Array) of strings
+    :param: threshold (float) minimal hit rate reported
+    :return: (dict) mapping pattern names of PII_PATTERNS to share
+        of non empty values matching them, at least threshold
+    """
+    array = pc.utf8_trim_whitespace(array)
+    array = array.filter(pc.not_equal(array, ''))
+    if not len(array):
+        return {}
+    patterns = _pii_patterns()
+    if pc.sum(pc.match_substring_regex(
+            array, patterns['*'])).as_py() < threshold * len(array):
+        return {}
+    rates = {
+        pii: pc.sum(pc.match_substring_regex(
+            array, patterns[pii])).as_py() / len(array)
+        for pii in PII_PATTERNS
+    }
+    return {pii: rate for pii, rate in rates.items() if rate >= threshold}
+
+
+@cache
+def _pii_patterns() -> dict:
+    """
+    :return: (dict) PII_PATTERNS anchored to match whole value,
+        with their alternation under '*' key
+    """
+    patterns = {pii: f'^(?:{pattern})$'
+                for pii, pattern in PII_PATTERNS.items()}
+    patterns['*'] = '^(?:{})$'.format(
+        '|'.join(f'(?:{pattern})' for pattern in PII_PATTERNS.values()))
+    return patterns
+
+
+def _sample_csv_columns(data: bytes, sample_rows: int) -> list[tuple]:
+    """
+    Read first sample_rows rows of csv data with pyarrow.csv,
+    every column as strings
+
+    :param: data (bytes) csv data
+    :param: sample_rows (int) number of rows sampled
+    :return: (list) of pairs of column name and pyarrow.Array
+    """
+    if isinstance(data, str):
+        data = data.encode()
+    if not data.strip():
+        return []
+    names = pacsv.open_csv(pa.BufferReader(data)).schema.names
+    reader = pacsv.open_csv(
+        pa.BufferReader(data),
+        convert_options=pacsv.ConvertOptions(
+            column_types=dict.fromkeys(names, pa.string()))
+    )
+    batches, rows = [], 0
+    try:
+        while rows < sample_rows:
+            batches.append(reader.read_next_batch())
+            rows += batches[-1].num_rows
+    except (StopIteration, pa.ArrowInvalid):
+        pass
+    if not batches:
+        return []
+    table = pa.Table.from_batches(batches).slice(0, sample_rows)
+    return [(name, table[name].combine_chunks()) for name in names]
+
+
+def _sample_json_columns(data: bytes, sample_rows: int) -> list[tuple]:
+    """
+    Parse first sample_rows records of json array or newline delimited
+    json data, string values are collected by their path, list
+    elements under path of the list
+
+    :param: data (bytes) json data
+    :param: sample_rows (int) number of records sampled
+    :return: (list) of pairs of field path and pyarrow.Array
+    """
+    text = data.decode('utf-8-sig', errors='ignore').lstrip()
+    if text.startswith('['):
+        records = _iter_json_array([text])
+    else:
+        records = (json.loads(line) for line in text.splitlines()
+                   if line and not line.isspace())
+    columns = {}
+
+    def collect(path: str, value) -> None:
+        if isinstance(value, dict):
+            for key, item in value.items():
+                collect(f'{path}.{key}' if path else key, item)
+        elif isinstance(value, list):
+            for item in value:
+                collect(path, item)
+        elif isinstance(value, str):
+            columns.setdefault(path, []).append(value)
+
+    try:
+        for _, record in zip(range(sample_rows), records):
+            if isinstance(record, dict):
+                collect('', record)
+    except json.JSONDecodeError:
+        pass
+    return [(path, pa.array(values, pa.string()))
+            for path, values in columns.items()]
+
+
+def _sample_parquet_columns(source, sample_rows: int) -> list[tuple]:
+    """
+    Read first sample_rows rows of text, struct and list columns of
+    parquet data, struct fields are reported by path, list values
+    under path of the list
+
+    :param: source (bytes) parquet data, seekable binary file object
+        or pyarrow.parquet.ParquetFile, e.g. open_parquet
+    :param: sample_rows (int) number of rows sampled
+    :return: (list) of pairs of field path and pyarrow.Array
+    """
+    if isinstance(source, bytes):
+        source = pa.BufferReader(source)
+    if not isinstance(source, pq.ParquetFile):
+        source = pq.ParquetFile(source)
+    names = [field.name for field in source.schema_arrow
+             if not pa.types.is_primitive(field.type)]
+    batch = next(source.iter_batches(sample_rows, columns=names), None)
+    if batch is None:
+        return []
+
+    def text_columns(path: str, array: pa.Array) -> Iterator[tuple]:
+        data_type = array.type
+        if pa.types.is_dictionary(data_type):
+            yield from text_columns(path, array.dictionary_decode())
+        elif pa.types.is_string(data_type) or pa.types.is_large_string(
+                data_type):
+            yield path, array
+        elif pa.types.is_struct(data_type):
+            for field, child in zip(data_type, array.flatten()):
+                yield from text_columns(f'{path}.{field.name}', child)
+        elif pa.types.is_list(data_type) or pa.types.is_large_list(
+                data_type):
+            yield from text_columns(path, array.flatten())
+
+    return [column for name in names
+            for column in text_columns(name, batch.column(name))]
 
 
 def setup_logger():
@@ -1,15 +1,28 @@
 from src.gdpr_obfuscator import get_bucket_and_key, \
         get_data_type, UnsupportedData, gdpr_obfuscator, \
         get_data, obfuscate_csv, obfuscate_json, \
-        obfuscate_parquet, setup_logger
+        obfuscate_parquet, setup_logger, gdpr_obfuscator_stream, \
+        get_stream, obfuscate_csv_stream, obfuscate_csv_bytes, \
+        obfuscate_csv_arrow, obfuscate_parquet_stream, obfuscate_json_stream, \
+        orjson, gdpr_obfuscator_batch, get_files, upload_stream, \
+        get_csv_header, get_parquet_metadata, probe_parquet, open_parquet, \
+        async_gdpr_obfuscator, async_gdpr_obfuscator_batch, Obfuscator, \
+        compile_mask, detect_pii, get_compression
+import src.gdpr_obfuscator as gdpr_module
 
 from io import StringIO, BytesIO
 from botocore.exceptions import ClientError
 from moto import mock_aws
 import pytest
+import asyncio
 import boto3
+import bz2
 import csv
+import gzip
+import hmac
 import json
+import os
+import subprocess
 import sys
 import time
 import logging
@@ -22,6 +35,16 @@ import pyarrow.parquet as pq
 ####################################################################
 
 
+@pytest.fixture(autouse=True)
+def mask_plan_cache():
+    """
+    Fixture to start every test with empty masking plan cache,
+    so tests do not share plans (and their warnings)
+    """
+    gdpr_module._mask_plan.cache_clear()
+    gdpr_module._compile_mask_schema.cache_clear()
+
+
 @pytest.fixture
 def csv_data() -> tuple[str, str]:
     """
@@ -76,7 +99,8 @@ def parquet_data() -> tuple[bytes, bytes]:
     """
     :return: (tuple[bytes, bytes]) parquet_data structured for
         boto3 put_object(),and expected_parquet_data for assertion
-        after masking pii fields ['id', 'name', 'post_code', 'some_column']
+        after masking pii fields ['id', 'name', 'post_code', 'some_column'],
+        masked columns are '***' strings
     """
     size = 100000
     pydict = {
@@ -91,14 +115,15 @@ def parquet_data() -> tuple[bytes, bytes]:
     table = pa.Table.from_pydict(pydict)
     pq.write_table(table, parquet_buffer := BytesIO())
 
+    masked = pa.array(['***' for _ in range(size)])
     expected_pydict = {
-        'id': pa.array(['***' for _ in range(size)]),
-        'name': pa.array(['***' for _ in range(size)]),
+        'id': masked,
+        'name': masked,
         'surname': pa.array(['test_surname' + str(i) for i in range(size)]),
         'country': pa.array(['test_country' + str(i) for i in range(size)]),
         'address': pa.array(['test_address' + str(i) for i in range(size)]),
-        'post_code': pa.array(['***' for _ in range(size)]),
-        'some_column': pa.array(['***' for _ in range(size)]),
+        'post_code': masked,
+        'some_column': masked,
     }
     expected_table = pa.Table.from_pydict(expected_pydict)
     pq.write_table(expected_table, expected_parquet_buffer := BytesIO())
@@ -133,6 +158,30 @@ def csv_json_parquet(
 #                 *FIXTURE END*
 # #####################################################################################
 
+@pytest.mark.describe('gdpr_obfuscator module')
+@pytest.mark.it('Import boto3 and pyarrow only when they are used')
+def test_module_import_heavy_dependencies_lazily():
+    script = (
+        'import sys\n'
+        'import src.gdpr_obfuscator as gdpr\n'
+        'heavy = ("boto3", "botocore", "pyarrow")\n'
+        'print(*[m for m in heavy if m in sys.modules])\n'
+        'gdpr.obfuscate_csv("name,id\\n1,2\\n", ["name"])\n'
+        'gdpr.obfuscate_json(b\'[{"name": 1}]\', ["name"])\n'
+        'print(*[m for m in heavy if m in sys.modules])\n'
+        'gdpr.obfuscate_csv_arrow(b"name,id\\n1,2\\n", ["name"])\n'
+        'print(*[m for m in heavy if m in sys.modules])\n'
+    )
+
+    output = subprocess.run(
+        [sys.executable, '-c', script],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        capture_output=True, check=True, text=True
+    ).stdout
+
+    assert output.splitlines() == ['', '', 'pyarrow']
+
+
 @pytest.mark.describe('get_bucket_and_key()')
 @pytest.mark.it('Extract correct bucket and key from S3 data location')
 def test_extract_correct_bucket_and_key_from_S3_location():
@@ -162,6 +211,32 @@ def test_raise_UnsuporetedData():
         excinfo.value)
 
 
+@pytest.mark.describe('get_data_type()')
+@pytest.mark.it('Skip compression extension of the key')
+def test_data_type_of_compressed_key():
+    assert get_data_type('folder/file.csv.gz') == 'csv'
+    assert get_data_type('folder/file.json.zst') == 'json'
+    assert get_data_type('folder/file.parquet.bz2') == 'parquet'
+    with pytest.raises(UnsupportedData) as excinfo:
+        get_data_type('folder/file.txt.gz')
+    assert "Function supports only csv, json, parquet types." in str(
+        excinfo.value)
+
+
+@pytest.mark.describe('get_compression()')
+@pytest.mark.it('Find codec by key extension or magic bytes')
+def test_get_compression():
+    assert get_compression('file.csv.gz') == 'gzip'
+    assert get_compression('file.json.zst') == 'zstd'
+    assert get_compression('file.csv.bz2') == 'bz2'
+    assert get_compression('file.csv', gzip.compress(b'a')[:10]) == 'gzip'
+    assert get_compression('file.csv', bz2.compress(b'a')[:10]) == 'bz2'
+    assert get_compression('file.csv', bz2.compress(b'')[:10]) == 'bz2'
+    assert get_compression('file.csv', b'\x28\xb5\x2f\xfd\x00') == 'zstd'
+    assert get_compression('file.csv', b'BZh,name\n1,') is None
+    assert get_compression('gz') is None
+
+
 @pytest.mark.describe('get_data()')
 @pytest.mark.it('Return correct data')
 @mock_aws
@@ -292,12 +367,182 @@ def test_Function_logs_when_detect_pii_that_is_not_in_data_csv(
     assert 'pii_field:\'wrong_column_name\' not in data' in caplog.text
 
 
+@pytest.mark.describe('obfuscate_csv()')
+@pytest.mark.it('Function pad short rows and skip blank rows')
+def test_Function_pad_short_rows_and_skip_blank_rows():
+    csv_data = 'id,name,email\r\n1,a\r\n\r\n2\r\n3,c,d\r\n'
+    masked_csv = obfuscate_csv(csv_data, ['name'])
+
+    assert masked_csv == 'id,name,email\r\n1,***,\r\n2,***,\r\n3,***,d\r\n'
+
+
+@pytest.mark.describe('obfuscate_csv()')
+@pytest.mark.it('Function raise ValueError when row is longer than header')
+def test_Function_raise_ValueError_when_row_longer_than_header():
+    with pytest.raises(ValueError) as excinfo:
+        obfuscate_csv('id,name\r\n1,a,extra\r\n', ['name'])
+    assert 'dict contains fields not in fieldnames' in str(excinfo.value)
+
+
+@pytest.mark.describe('obfuscate_csv()')
+@pytest.mark.it('Function logs missing pii_field once, not for every row')
+def test_Function_logs_missing_pii_field_once(caplog):
+    csv_data = 'id,name\r\n' + '1,a\r\n' * 100
+    obfuscate_csv(csv_data, ['name', 'wrong_column_name'])
+    assert caplog.text.count('wrong_column_name') == 1
+
+
+@pytest.mark.describe('obfuscate_csv()')
+@pytest.mark.it('Reuse cached masking plan for files with same layout')
+def test_Function_reuse_masking_plan_of_same_layout(caplog, parquet_data):
+    csv_data = 'id,name\r\n1,a\r\n'
+    pii_fields = ['name', 'wrong_column_name']
+    for _ in range(3):
+        assert obfuscate_csv(csv_data, pii_fields) == 'id,name\r\n1,***\r\n'
+        obfuscate_json(b'[{"id": 1, "name": "a"}]', pii_fields)
+    obfuscate_csv('name,id\r\n1,a\r\n', pii_fields)
+    for _ in range(2):
+        obfuscate_parquet(parquet_data[0], ['name', 'wrong_column_name'])
+
+    assert caplog.text.count('wrong_column_name') == 4
+    assert gdpr_module._mask_plan.cache_info().hits >= 4
+    assert gdpr_module._compile_mask_schema.cache_info().hits == 1
+
+
+@pytest.mark.describe('obfuscate_csv_stream()')
+@pytest.mark.it('Output is identical to obfuscate_csv for any chunk size')
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 64, 1024 * 1024])
+def test_csv_stream_output_identical_to_obfuscate_csv(chunk_size):
+    headers = ['id', 'name', 'city', 'note']
+    data = [['1', 'Željko Đurić', 'Niš', 'multi\nline'],
+            ['2', 'Zoë', 'Kraków', 'comma, quote "x"']]
+    writer = csv.writer(csv_buffer := StringIO())
+    writer.writerow(headers)
+    writer.writerows(data)
+    csv_data = csv_buffer.getvalue()
+    pii_fields = ['name', 'note']
+
+    chunks = list(obfuscate_csv_stream(
+        BytesIO(csv_data.encode()),
+        pii_fields,
+        chunk_size
+    ))
+
+    assert b''.join(chunks).decode() == obfuscate_csv(csv_data, pii_fields)
+
+
+@pytest.mark.describe('obfuscate_csv_stream()')
+@pytest.mark.it('Yield chunks bounded by chunk size')
+def test_csv_stream_yield_bounded_chunks():
+    writer = csv.writer(csv_buffer := StringIO())
+    writer.writerow(['id', 'name'])
+    writer.writerows([[str(i), 'name' + str(i)] for i in range(10000)])
+    chunk_size = 1024
+
+    chunks = list(obfuscate_csv_stream(
+        BytesIO(csv_buffer.getvalue().encode()),
+        ['name'],
+        chunk_size
+    ))
+
+    assert len(chunks) > 1
+    assert max(len(chunk) for chunk in chunks) < 2 * chunk_size
+
+
+@pytest.mark.describe('obfuscate_csv_stream()')
+@pytest.mark.it('Yield nothing when stream is empty')
+def test_csv_stream_yield_nothing_when_stream_is_empty():
+    assert list(obfuscate_csv_stream(BytesIO(b''), ['name'])) == []
+
+
+@pytest.mark.describe('obfuscate_csv_bytes()')
+@pytest.mark.it('Function mask correct fields')
+def test_Function_mask_correct_fields_csv_bytes(csv_data):
+    csv_data, expected_csv_data = csv_data
+    masked_csv = obfuscate_csv_bytes(csv_data.encode(), ['name', 'country'])
+
+    assert masked_csv == expected_csv_data.encode()
+
+
+@pytest.mark.describe('obfuscate_csv_bytes()')
+@pytest.mark.it('Output is identical to obfuscate_csv with or without quotes')
+@pytest.mark.parametrize('csv_data', [
+    'id,name,email\n1,a,b\n\n2\n3,c,d',
+    'id,name,email\r\n1,"a,b",c\r\n2,"x\r\ny",z\r\n',
+    'id,name\n1,a\n2,"b"\n',
+    'name\n\na\n',
+    ''
+])
+def test_csv_bytes_output_identical_to_obfuscate_csv(csv_data):
+    pii_fields = ['name']
+    assert obfuscate_csv_bytes(csv_data.encode(), pii_fields) == \
+        obfuscate_csv(csv_data, pii_fields).encode()
+
+
+@pytest.mark.describe('obfuscate_csv_arrow()')
+@pytest.mark.it('Output parse to the same rows as obfuscate_csv')
+def test_csv_arrow_output_parse_to_same_rows_as_obfuscate_csv():
+    csv_data = 'id,name,code\r\n1,"a,b",007\r\n\r\n2,"multi\nline",\r\n'
+    pii_fields = ['name', 'wrong_column_name']
+    masked_csv = obfuscate_csv_arrow(csv_data.encode(), pii_fields)
+
+    assert list(csv.reader(StringIO(masked_csv.decode()))) == \
+        list(csv.reader(StringIO(obfuscate_csv(csv_data, pii_fields))))
+
+
+@pytest.mark.describe('obfuscate_csv_arrow()')
+@pytest.mark.it('Return empty bytes when no data is passed')
+def test_csv_arrow_return_empty_bytes_when_no_data_is_passed():
+    assert obfuscate_csv_arrow(b'', ['name']) == b''
+
+
+@pytest.mark.describe('obfuscate_csv_stream()')
+@pytest.mark.it('Arrow engine mask correct fields in stream')
+def test_csv_stream_arrow_engine_mask_correct_fields(csv_data):
+    csv_data, expected_csv_data = csv_data
+    masked_csv = b''.join(obfuscate_csv_stream(
+        BytesIO(csv_data.encode()),
+        ['name', 'country'],
+        chunk_size=8,
+        engine='arrow'
+    ))
+
+    assert list(csv.reader(StringIO(masked_csv.decode()))) == \
+        list(csv.reader(StringIO(expected_csv_data)))
+
+
+@pytest.mark.describe('obfuscate_csv_stream()')
+@pytest.mark.it('Bytes engine hand over to csv module when quotes appear')
+def test_csv_stream_bytes_engine_hand_over_when_quotes_appear():
+    rows = [f'{i},name{i},ž{i}' for i in range(200)]
+    rows[150] = '150,"quoted, name",ž150'
+    csv_data = 'id,name,city\n' + '\n'.join(rows) + '\n'
+
+    masked_csv = b''.join(obfuscate_csv_stream(
+        BytesIO(csv_data.encode()),
+        ['name'],
+        chunk_size=64,
+        engine='bytes'
+    ))
+
+    assert masked_csv.decode() == obfuscate_csv(csv_data, ['name'])
+
+
+@pytest.mark.describe('obfuscate_csv_stream()')
+@pytest.mark.it('Raise ValueError for unsupported engine')
+def test_csv_stream_raise_ValueError_for_unsupported_engine():
+    with pytest.raises(ValueError) as excinfo:
+        list(obfuscate_csv_stream(BytesIO(b'id\n1\n'), ['id'], engine='x'))
+    assert 'csv engine must be one of python, bytes, arrow' in str(
+        excinfo.value)
+
+
 @pytest.mark.describe('obfuscate_json()')
 @pytest.mark.it('Function mask correct fields')
 def test_Function_mask_correct_fields_json(json_data):
     json_data, expected_json_data = json_data
     pii_fields = ['name', 'country']
-    masked_data = obfuscate_json(json_data, pii_fields).encode()
+    masked_data = obfuscate_json(json_data, pii_fields, 'json').encode()
     assert expected_json_data == masked_data
 
 
@@ -322,7 +567,7 @@ def test_Is_pure_function():
 def test_Function_skip_pii_that_is_not_in_data_json(json_data):
     json_data, expected_json_data = json_data
     pii_fields = ['name', 'country', 'wrong_column_name']
-    masked_data = obfuscate_json(json_data, pii_fields).encode()
+    masked_data = obfuscate_json(json_data, pii_fields, 'json').encode()
     assert masked_data == expected_json_data
 
 
@@ -339,154 +584,1121 @@ def test_Function_logs_when_detect_pii_that_is_not_in_data_json(
     assert 'pii_field:\'wrong_column_name\' not in data' in caplog.text
 
 
+@pytest.mark.describe('obfuscate_json()')
+@pytest.mark.it('Function mask newline delimited json records')
+def test_Function_mask_newline_delimited_json_records():
+    ndjson = '{"id": 1, "name": "a"}\n\n{"id": 2, "name": "b"}\n'
+    masked_data = obfuscate_json(ndjson.encode(), ['name'], 'json')
+    assert masked_data == \
+        '{"id": 1, "name": "***"}\n{"id": 2, "name": "***"}\n'
+
+
+@pytest.mark.describe('obfuscate_json_stream()')
+@pytest.mark.it('Output is identical to obfuscate_json for any chunk size')
+@pytest.mark.parametrize('chunk_size', [1, 5, 64, 1024 * 1024])
+def test_json_stream_output_identical_to_obfuscate_json(chunk_size):
+    records = [{'id': i, 'name': f'imě "{i}"', 'score': i / 3,
+                'tags': ['a', {'b': None}]} for i in range(2500)]
+    json_data = json.dumps(records, indent=2).encode()
+    pii_fields = ['name', 'wrong_column_name']
+
+    chunks = list(obfuscate_json_stream(
+        BytesIO(json_data),
+        pii_fields,
+        chunk_size
+    ))
+
+    assert b''.join(chunks).decode() == obfuscate_json(json_data, pii_fields)
+    assert json.loads(b''.join(chunks)) == \
+        [{**record, 'name': '***'} for record in records]
+
+
+@pytest.mark.describe('obfuscate_json_stream()')
+@pytest.mark.it('Scan element larger than chunks in linear time')
+def test_json_stream_scan_large_element_in_linear_time(monkeypatch):
+    scanned = []
+
+    class SpyDecoder(json.JSONDecoder):
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            scan_once = self.scan_once
+
+            def spy_scan_once(text, position):
+                scanned.append(len(text) - position)
+                return scan_once(text, position)
+            self.scan_once = spy_scan_once
+    monkeypatch.setattr(gdpr_module.json, 'JSONDecoder', SpyDecoder)
+    data = json.dumps([
+        {'name': 'a', 'items': [{'id': i, 'v': 'x' * 20} for i in range(5000)]}
+    ]).encode()
+
+    masked = b''.join(obfuscate_json_stream(BytesIO(data), ['name'], 64))
+
+    assert json.loads(masked) == json.loads(obfuscate_json(data, ['name']))
+    assert sum(scanned) < 4 * len(data)
+
+
+@pytest.mark.describe('obfuscate_json_stream()')
+@pytest.mark.it('Parse numbers split across chunks')
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 4, 5])
+def test_json_stream_parse_numbers_split_across_chunks(chunk_size):
+    json_data = b'[1.5, -2.5, 1e+20, {"a": 1, "b": 12.25}]'
+    masked = b''.join(
+        obfuscate_json_stream(BytesIO(json_data), ['a'], chunk_size))
+    assert json.loads(masked) == [1.5, -2.5, 1e+20, {'a': '***', 'b': 12.25}]
+
+
+@pytest.mark.describe('obfuscate_json_stream()')
+@pytest.mark.it('Yield chunks while reading newline delimited json')
+def test_json_stream_yield_chunks_of_newline_delimited_json():
+    ndjson = ''.join(json.dumps({'id': i, 'name': str(i)}) + '\n'
+                     for i in range(5000))
+    stream = BytesIO(ndjson.encode())
+    chunks = obfuscate_json_stream(stream, ['name'], 1024)
+
+    first = next(chunks)
+    assert stream.tell() < len(ndjson)
+    masked = (first + b''.join(chunks)).decode().splitlines()
+    assert len(masked) == 5000
+    assert json.loads(masked[-1]) == {'id': 4999, 'name': '***'}
+
+
+@pytest.mark.describe('obfuscate_json_stream()')
+@pytest.mark.it('Yield empty serilized list when data is wrong format')
+@pytest.mark.parametrize(
+    'json_data', [b'', b'  \n', b'nope', b'[{"a": 1},', b'[{"a": 1},]'])
+def test_json_stream_yield_empty_list_when_data_is_wrong_format(json_data):
+    chunks = list(obfuscate_json_stream(BytesIO(json_data), ['a']))
+    assert chunks == [b'[]']
+
+
+@pytest.mark.describe('obfuscate_json_stream()')
+@pytest.mark.it('Raise JSONDecodeError when data is truncated after output')
+def test_json_stream_raise_when_data_truncated_after_output():
+    json_data = json.dumps([{'id': i} for i in range(5000)])[:-10]
+    with pytest.raises(json.JSONDecodeError):
+        list(obfuscate_json_stream(BytesIO(json_data.encode()), ['id'], 64))
+
+
+@pytest.mark.describe('obfuscate_json()')
+@pytest.mark.it('orjson backend output is semantically equal to json backend')
+@pytest.mark.skipif(orjson is None, reason='orjson is not installed')
+@pytest.mark.parametrize('ndjson', [False, True])
+def test_json_orjson_backend_semantically_equal_to_json_backend(ndjson):
+    records = [{'id': i, 'name': f'imě "{i}"', 'score': i / 3,
+                'tags': ['a', {'b': None}]} for i in range(3500)]
+    records[10]['big'] = 2 ** 70
+    records[2000]['nan'] = float('nan')
+    records[1500]['huge'] = [1e300, 'HUGE']
+    if ndjson:
+        json_data = ''.join(json.dumps(r) + '\n' for r in records)
+    else:
+        json_data = json.dumps(records)
+    json_data = json_data.replace('"HUGE"', '-1E+400')
+    pii_fields = ['name']
+
+    masked = obfuscate_json(json_data.encode(), pii_fields, 'orjson')
+
+    expected = obfuscate_json(json_data.encode(), pii_fields, 'json')
+    assert masked != expected
+    if ndjson:
+        masked, expected = masked.splitlines(), expected.splitlines()
+        assert repr(list(map(json.loads, masked))) == \
+            repr(list(map(json.loads, expected)))
+    else:
+        assert repr(json.loads(masked)) == repr(json.loads(expected))
+
+
+@pytest.mark.describe('obfuscate_json_stream()')
+@pytest.mark.it('Raise ValueError for unsupported json backend')
+def test_json_stream_raise_ValueError_for_unsupported_backend():
+    with pytest.raises(ValueError):
+        list(obfuscate_json_stream(BytesIO(b'[]'), ['a'], backend='ujson'))
+
+
+@pytest.mark.describe('obfuscate_json()')
+@pytest.mark.it('Use orjson by default when installed, json module otherwise')
+def test_json_default_backend_is_auto(monkeypatch):
+    data = b'{"id": 1, "name": "a"}\n'
+
+    masked = obfuscate_json(data, ['name'])
+    expected = obfuscate_json(data, ['name'], 'orjson' if orjson else 'json')
+    monkeypatch.setattr(gdpr_module, 'orjson', None)
+
+    assert masked == expected
+    assert obfuscate_json(data, ['name']) == '{"id": 1, "name": "***"}\n'
+
+
 ########################################################################
-# gdpr_obsfucator() tests
+# compile_mask() tests
 #######################################################################
+@pytest.mark.describe('compile_mask()')
+@pytest.mark.it('Raise ValueError for unknown strategy or hmac without key')
+def test_compile_mask_raise_ValueError():
+    with pytest.raises(ValueError):
+        compile_mask({'strategy': 'rot13'})
+    with pytest.raises(ValueError):
+        compile_mask({'strategy': 'hmac'})
+    with pytest.raises(ValueError):
+        obfuscate_csv('a\n1\n', ['a'], {'strategy': 'hmac', 'key': ''})
+
+
+@pytest.mark.describe('compile_mask()')
+@pytest.mark.it('Hmac mask give same pseudonym in csv, json and parquet')
+def test_hmac_mask_same_pseudonym_in_every_format():
+    masking = {'strategy': 'hmac', 'key': 'secret', 'length': 12}
+
+    def pseudonym(value):
+        return hmac.new(b'secret', value.encode(), 'sha256').hexdigest()[:12]
+    csv_data = 'id,email\n1,a@b.com\n2,c@d.com\n3,a@b.com\n'
+    expected_csv = 'id,email\r\n' + ''.join(
+        f'{pseudonym(i)},{pseudonym(email)}\r\n'
+        for i, email in [('1', 'a@b.com'), ('2', 'c@d.com'), ('3', 'a@b.com')])
+    table = pa.table({'id': [1, 2, None], 'email': ['a@b.com', None, 'x']})
+    parquet_buffer = BytesIO()
+    pq.write_table(table, parquet_buffer)
+
+    masked_csv = obfuscate_csv(csv_data, ['id', 'email'], masking)
+    masked_bytes = obfuscate_csv_bytes(
+        csv_data.encode(), ['id', 'email'], masking)
+    masked_arrow = obfuscate_csv_arrow(
+        csv_data.encode(), ['id', 'email'], masking)
+    masked_json = obfuscate_json(
+        b'[{"id": 1, "email": "a@b.com"}, {"id": 2, "email": null}, {}]',
+        ['id', 'email'], masking=masking)
+    masked_parquet = pq.read_table(BytesIO(obfuscate_parquet(
+        parquet_buffer.getvalue(), ['id', 'email'], masking)))
+
+    assert masked_csv == expected_csv
+    assert masked_bytes.decode() == expected_csv
+    assert list(csv.reader(StringIO(masked_arrow.decode()))) == \
+        list(csv.reader(StringIO(expected_csv)))
+    assert json.loads(masked_json) == [
+        {'id': pseudonym('1'), 'email': pseudonym('a@b.com')},
+        {'id': pseudonym('2'), 'email': None},
+        {}
+    ]
+    assert masked_parquet.to_pydict() == {
+        'id': [pseudonym('1'), pseudonym('2'), None],
+        'email': [pseudonym('a@b.com'), None, pseudonym('x')]
+    }
+
+
+@pytest.mark.describe('compile_mask()')
+@pytest.mark.it('Hmac mask bypass memo for distinct values, keep pseudonyms')
+def test_hmac_mask_bypass_memo_for_distinct_values(monkeypatch):
+    monkeypatch.setattr(gdpr_module, 'HMAC_CACHE_SIZE', 4)
+    monkeypatch.setattr(gdpr_module, 'HMAC_BYPASS_WINDOWS', 2)
+    key = 'long key ' * 10
+    mask = compile_mask({'strategy': 'hmac', 'key': key})
+
+    def pseudonym(value):
+        digest = hmac.new(key.encode(), value.encode(), 'sha256')
+        return digest.hexdigest()[:16]
+    distinct = [f'user{i}@email.com' for i in range(12)]
+
+    masked = [mask.value(value) for value in distinct[:8]]
+    assert not hasattr(mask.mask, 'cache_info')
+    masked += [mask.value(value) for value in distinct[8:]]
+    assert masked == [pseudonym(value) for value in distinct]
+    assert [mask.value('a') for _ in range(10)] == [pseudonym('a')] * 10
+    assert mask.mask.cache_info().hits == 9
+    assert mask.array(pa.array(distinct + [None])).to_pylist() == \
+        [pseudonym(value) for value in distinct] + [None]
+
+
+@pytest.mark.describe('compile_mask()')
+@pytest.mark.it('Mask every field with its own strategy in every format')
+def test_per_field_strategies_in_every_format():
+    pii_fields = {
+        'name': 'mask',
+        'phone': {'strategy': 'keep_last', 'length': 4},
+        'email': 'email_domain',
+        'ssn': 'null',
+        'card': {'strategy': 'fixed', 'length': 5},
+        'id': None
+    }
+    masking = {'strategy': 'hmac', 'key': 'secret', 'length': 8}
+    pseudonym = [
+        hmac.new(b'secret', i.encode(), 'sha256').hexdigest()[:8]
+        for i in ['1', '2']
+    ]
+    expected = [
+        [pseudonym[0], '***', '******6789', '***@x.com', '', '*****'],
+        [pseudonym[1], '***', '12', '***', '', '*****']
+    ]
+    csv_data = 'id,name,phone,email,ssn,card\n' \
+        '1,Al,0123456789,a.b@x.com,123,4111\n2,Bo,12,no_email,,\n'
+    table = pa.table({
+        'id': [1, 2],
+        'name': ['Al', 'Bo'],
+        'phone': ['0123456789', None],
+        'email': ['a.b@x.com', 'no_email'],
+        'ssn': ['123', None],
+        'card': ['4111', '']
+    })
+    parquet_buffer = BytesIO()
+    pq.write_table(table, parquet_buffer)
+
+    masked_csv = [
+        obfuscate_csv(csv_data, pii_fields, masking).encode(),
+        obfuscate_csv_bytes(csv_data.encode(), pii_fields, masking),
+        obfuscate_csv_arrow(csv_data.encode(), pii_fields, masking)
+    ]
+    masked_json = obfuscate_json(
+        json.dumps(table.to_pylist()).encode(),
+        pii_fields, masking=masking)
+    masked_parquet = pq.read_table(BytesIO(obfuscate_parquet(
+        parquet_buffer.getvalue(), pii_fields, masking)))
+
+    for masked in masked_csv:
+        assert list(csv.reader(StringIO(masked.decode())))[1:] == expected
+    expected[1][2] = None
+    expected[0][4] = expected[1][4] = None
+    assert [list(record.values()) for record in json.loads(masked_json)] \
+        == expected
+    assert [list(record.values()) for record in masked_parquet.to_pylist()] \
+        == expected
+
+
+@pytest.mark.describe('compile_mask()')
+@pytest.mark.it('Keep rows of one column masked with null in every engine')
+def test_null_strategy_keep_rows_of_one_column():
+    csv_data = 'a\nx\ny\n'
+
+    masked = [
+        obfuscate_csv(csv_data, {'a': 'null'}).encode(),
+        obfuscate_csv_bytes(csv_data.encode(), {'a': 'null'}),
+        obfuscate_csv_arrow(csv_data.encode(), {'a': 'null'})
+    ]
+
+    assert masked[0] == masked[1] == b'a\r\n""\r\n""\r\n'
+    for data in masked:
+        assert list(csv.reader(StringIO(data.decode()))) \
+            == [['a'], [''], ['']]
+
+
 @pytest.mark.describe('gdpr_obfuscator()')
-@pytest.mark.it('Return data with correct pii_fields masked parquet data')
+@pytest.mark.it('Mask fields with strategies of pii_fields map')
 @mock_aws
-def test_Return_data_with_correct_pii_fields_masked_parquet_data(parquet_data):
-    parquet_data, expected_parquet_data = parquet_data
-
+def test_gdpr_obfuscator_use_pii_fields_strategy_map():
     client = boto3.client('s3', region_name="us-east-1")
     client.create_bucket(Bucket='test_bucket')
     client.put_object(
-        Body=parquet_data,
+        Body='name,phone\nAl,0123456789\n',
         Bucket='test_bucket',
-        Key='some_folder/file.parquet')
+        Key='a.csv'
+    )
+    request = {
+        'file_to_obfuscate': 's3://test_bucket/a.csv',
+        'pii_fields': {'phone': {'strategy': 'keep_last', 'length': 2}},
+        'csv_engine': 'bytes'
+    }
 
-    pii_fields = ['id', 'name', 'post_code', 'some_column']
-    s3_file = 's3://test_bucket/some_folder/file.parquet'
-    masked_parquet = gdpr_obfuscator(json.dumps(
-        {
-            'file_to_obfuscate': s3_file,
-            'pii_fields': pii_fields
-        }
-    ))
-    assert masked_parquet == expected_parquet_data
+    masked = gdpr_obfuscator(json.dumps(request))
+
+    assert masked == b'name,phone\r\nAl,********89\r\n'
 
 
 @pytest.mark.describe('gdpr_obfuscator()')
-@pytest.mark.it('Return data with correct pii_fields masked csv data')
+@pytest.mark.it('Mask fields with masking strategy of the request')
 @mock_aws
-def test_Return_data_with_correct_pii_fields_masked_csv_data(csv_data):
-    csv_data_s3, expected_csv_data = csv_data
+def test_gdpr_obfuscator_use_masking_strategy(csv_data):
+    csv_data, _ = csv_data
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(Body=csv_data, Bucket='test_bucket', Key='a.csv')
+    request = {
+        'file_to_obfuscate': 's3://test_bucket/a.csv',
+        'pii_fields': ['name'],
+        'masking': {'strategy': 'hmac', 'key': 'secret'}
+    }
+
+    masked = gdpr_obfuscator(json.dumps(request))
+
+    assert masked.decode() == obfuscate_csv(
+        csv_data, ['name'], request['masking'])
+    assert b'test_name1' not in masked and b'***' not in masked
+
+
+@pytest.mark.describe('obfuscate_json()')
+@pytest.mark.it('Mask nested paths in every record and list element')
+def test_json_mask_nested_paths(caplog):
+    records = [
+        {'id': 1},
+        {'id': 2, 'customer': {
+            'email': 'a@x.com',
+            'addresses': [{'street': '1 Road', 'city': 'L'}, {'city': 'M'}]
+        }, 'tags': ['a@b.com', None]}
+    ]
+    pii_fields = {
+        'customer.email': 'email_domain',
+        '$.customer.addresses[*].street': None,
+        'tags': {'strategy': 'keep_last', 'length': 2},
+        'missing.path': None
+    }
+
+    masked = json.loads(obfuscate_json(json.dumps(records).encode(),
+                                       pii_fields))
+
+    assert masked == [
+        {'id': 1},
+        {'id': 2, 'customer': {
+            'email': '***@x.com',
+            'addresses': [{'street': '***', 'city': 'L'}, {'city': 'M'}]
+        }, 'tags': ['*****om', None]}
+    ]
+    assert "'missing.path' not in data" in caplog.text
+
+
+@pytest.mark.describe('obfuscate_json()')
+@pytest.mark.it('Mask top level keys holding dots')
+def test_json_mask_dotted_top_level_key(caplog):
+    data = b'[{"user.name": "bob", "id": 1}, {"user": {"name": "al"}}]'
+
+    masked = json.loads(obfuscate_json(data, ['user.name']))
+
+    assert masked == [{'user.name': '***', 'id': 1},
+                      {'user': {'name': '***'}}]
+    assert 'not in data' not in caplog.text
+
+
+@pytest.mark.describe('obfuscate_parquet()')
+@pytest.mark.it('Mask nested fields of struct and list columns')
+def test_parquet_mask_nested_fields():
+    table = pa.table({
+        'id': [1, 2, 3],
+        'customer': [
+            {'email': 'a@x.com', 'addresses': [
+                {'street': '1 Road', 'city': 'L'},
+                {'street': None, 'city': 'M'}
+            ]},
+            None,
+            {'email': None, 'addresses': None}
+        ],
+        'tags': [['a@b.com'], [], None]
+    })
+    parquet_buffer = BytesIO()
+    pq.write_table(table, parquet_buffer, row_group_size=2)
+    pii_fields = {
+        'customer.email': 'email_domain',
+        '$.customer.addresses[*].street': 'null',
+        'tags': {'strategy': 'keep_last', 'length': 2}
+    }
+
+    masked = pq.read_table(BytesIO(obfuscate_parquet(
+        parquet_buffer.getvalue(), pii_fields)))
+
+    assert masked.schema.field('customer').type \
+        == table.schema.field('customer').type
+    assert masked.to_pylist() == [
+        {'id': 1, 'customer': {'email': '***@x.com', 'addresses': [
+            {'street': None, 'city': 'L'},
+            {'street': None, 'city': 'M'}
+        ]}, 'tags': ['*****om']},
+        {'id': 2, 'customer': None, 'tags': []},
+        {'id': 3, 'customer': {'email': None, 'addresses': None},
+         'tags': None}
+    ]
+
 
+@pytest.mark.describe('gdpr_obfuscator()')
+@pytest.mark.it('Mask nested field of parquet struct column')
+@mock_aws
+def test_gdpr_obfuscator_mask_nested_parquet_field():
     client = boto3.client('s3', region_name="us-east-1")
     client.create_bucket(Bucket='test_bucket')
+    parquet_buffer = BytesIO()
+    pq.write_table(
+        pa.table({'customer': [{'name': 'Al', 'city': 'L'}]}),
+        parquet_buffer
+    )
     client.put_object(
-        Body=csv_data_s3,
+        Body=parquet_buffer.getvalue(),
         Bucket='test_bucket',
-        Key='some_folder/file.csv')
+        Key='a.parquet'
+    )
 
-    s3_file = 's3://test_bucket/some_folder/file.csv'
-    pii_fields = ['name', 'country']
-    d = {}
-    d['file_to_obfuscate'], d['pii_fields'] = s3_file, pii_fields
-    json_str = json.dumps(d)
-    masked_csv = gdpr_obfuscator(json_str).decode()
+    masked = gdpr_obfuscator(json.dumps({
+        'file_to_obfuscate': 's3://test_bucket/a.parquet',
+        'pii_fields': ['customer.name']
+    }))
+
+    assert pq.read_table(BytesIO(masked)).to_pylist() \
+        == [{'customer': {'name': '***', 'city': 'L'}}]
+
+
+@pytest.mark.describe('detect_pii()')
+@pytest.mark.it('Suggest pii fields with hit rates in every format')
+def test_detect_pii_in_every_format():
+    records = [
+        {'id': str(i),
+         'email': f'user{i}@mail.co.uk',
+         'phone': '+44 7700 900123' if i % 2 else '07700900123',
+         'ni': 'AB 12 34 56 C',
+         'iban': 'GB82 WEST 1234 5698 7654 32',
+         'note': f'user{i}@mail.com' if i < 4 else 'no email',
+         'date': '2024-03-31'}
+        for i in range(10)
+    ]
+    writer = csv.DictWriter(csv_buffer := StringIO(), records[0].keys())
+    writer.writeheader()
+    writer.writerows(records)
+    parquet_buffer = BytesIO()
+    pq.write_table(pa.Table.from_pylist(records), parquet_buffer)
+    expected = {
+        'email': {'pii': 'email', 'hit_rate': 1.0},
+        'phone': {'pii': 'phone', 'hit_rate': 1.0},
+        'ni': {'pii': 'uk_ni_number', 'hit_rate': 1.0},
+        'iban': {'pii': 'iban', 'hit_rate': 1.0}
+    }
+
+    assert detect_pii(csv_buffer.getvalue().encode(), 'csv') == expected
+    assert detect_pii(json.dumps(records).encode(), 'json') == expected
+    assert detect_pii(parquet_buffer.getvalue(), 'parquet') == expected
+    assert detect_pii(json.dumps(records).encode(), 'json', 4)['note'] \
+        == {'pii': 'email', 'hit_rate': 1.0}
+    assert detect_pii(json.dumps(records).encode(), 'json',
+                      threshold=0.4)['note'] \
+        == {'pii': 'email', 'hit_rate': 0.4}
+    assert detect_pii(b'', 'csv') == detect_pii(b'', 'json') == {}
+
+
+@pytest.mark.describe('detect_pii()')
+@pytest.mark.it('Do not report padded ids, dates and numbers as phones')
+def test_detect_pii_ignore_padded_ids_and_dates():
+    records = [
+        {'id': f'{i:010d}',
+         'account': f'00{i:08d}',
+         'number': f'{1234567890 + i}',
+         'date': f'2024-03-{i + 10}',
+         'uk_date': f'{i + 10}/03/2024',
+         'us_date': f'03-{i + 10}-2024',
+         'phone': f'+44 7700 9001{i:02d}'}
+        for i in range(10)
+    ]
+
+    assert detect_pii(json.dumps(records).encode(), 'json') \
+        == {'phone': {'pii': 'phone', 'hit_rate': 1.0}}
+
+
+@pytest.mark.describe('detect_pii()')
+@pytest.mark.it('Report nested fields by path, sample truncated json')
+def test_detect_pii_nested_fields():
+    records = [{'customer': {'addresses': [{'tel': '020 7946 0958'}],
+                             'email': 'a@b.com'}, 'id': 1}] * 3
+    data = json.dumps(records).encode()
+    parquet_buffer = BytesIO()
+    pq.write_table(pa.Table.from_pylist(records), parquet_buffer)
+    expected = {
+        'customer.addresses.tel': {'pii': 'phone', 'hit_rate': 1.0},
+        'customer.email': {'pii': 'email', 'hit_rate': 1.0}
+    }
+
+    assert detect_pii(data[:len(data) // 2], 'json') == expected
+    assert detect_pii(parquet_buffer.getvalue(), 'parquet') == expected
 
-    assert expected_csv_data == masked_csv
+
+@pytest.mark.describe('detect_pii()')
+@pytest.mark.it('Decompress bounded sample of compressed data')
+@pytest.mark.parametrize('codec', ['gzip', 'bz2', 'zstd'])
+def test_detect_pii_bounded_sample_of_compressed_data(codec, monkeypatch):
+    compress = {
+        'gzip': gzip.compress,
+        'bz2': lambda data: bz2.compress(data, 1),
+        'zstd': lambda data: pytest.importorskip(
+            'zstandard').ZstdCompressor().compress(data)
+    }[codec]
+    monkeypatch.setattr(gdpr_module, 'DETECT_SAMPLE_BYTES', 64 * 1024)
+    csv_data = b'id,email\n' + b''.join(
+        b'%d,user%d@mail.com\n' % (i, i) for i in range(100000))
+    parquet_buffer = BytesIO()
+    pq.write_table(pa.table({'email': ['a@b.com'] * 10}), parquet_buffer)
+
+    sample = gdpr_module._decompress_sample(compress(csv_data), codec)
+
+    assert 0 < len(sample) <= 64 * 1024
+    assert csv_data.startswith(sample) and sample.endswith(b'\n')
+    assert detect_pii(compress(csv_data), 'csv') \
+        == {'email': {'pii': 'email', 'hit_rate': 1.0}}
+    assert detect_pii(compress(parquet_buffer.getvalue()), 'parquet') \
+        == {'email': {'pii': 'email', 'hit_rate': 1.0}}
 
 
 @pytest.mark.describe('gdpr_obfuscator()')
-@pytest.mark.it('Return data with correct pii_fields masked json data')
+@pytest.mark.it('Mask fields detected as pii with detect_pii key')
 @mock_aws
-def test_Return_data_with_correct_pii_fields_masked_json_data(json_data):
-    json_data_s3, expected_output = json_data
-
+def test_gdpr_obfuscator_mask_detected_pii(caplog):
     client = boto3.client('s3', region_name="us-east-1")
     client.create_bucket(Bucket='test_bucket')
     client.put_object(
-        Body=json_data_s3,
+        Body='id,name,contact\n1,Al,al@mail.com\n2,Bo,bo@mail.com\n',
         Bucket='test_bucket',
-        Key='some_folder/file.json')
+        Key='a.csv'
+    )
+    client.put_object(Body='', Bucket='test_bucket', Key='empty.csv')
+    request = {
+        'file_to_obfuscate': 's3://test_bucket/a.csv',
+        'pii_fields': ['name'],
+        'detect_pii': True
+    }
 
-    s3_file = 's3://test_bucket/some_folder/file.json'
-    pii_fields = ['name', 'country']
-    json_str = json.dumps({
-        'file_to_obfuscate': s3_file,
-        'pii_fields': pii_fields
-    })
-    masked_json = gdpr_obfuscator(json_str)
+    masked = gdpr_obfuscator(json.dumps(request))
+    request['file_to_obfuscate'] = 's3://test_bucket/empty.csv'
 
-    assert masked_json == expected_output
+    assert masked == b'id,name,contact\r\n1,***,***\r\n2,***,***\r\n'
+    assert "pii_field:'contact' detected as email" in caplog.text
+    assert gdpr_obfuscator(json.dumps(request)) == b''
 
 
 @pytest.mark.describe('gdpr_obfuscator()')
-@pytest.mark.it('Return bytestream representation of data parquet data')
+@pytest.mark.it('Mask compressed files and compress them with same codec')
 @mock_aws
-def test_Return_bytestream_representation_of_data_parquet_data(parquet_data):
+def test_gdpr_obfuscator_compressed_files(csv_data, parquet_data):
+    csv_data, expected_csv = csv_data
     parquet_data, _ = parquet_data
-
+    json_data = b'[{"id": 1, "name": "a"}]\n'
     client = boto3.client('s3', region_name="us-east-1")
     client.create_bucket(Bucket='test_bucket')
-    client.put_object(
-        Body=parquet_data,
-        Bucket='test_bucket',
-        Key='some_folder/file.parquet')
-    pii_fields = ['id', 'name', 'post_code', 'some_column']
-    s3_file = 's3://test_bucket/some_folder/file.parquet'
-    masked_parquet = gdpr_obfuscator(json.dumps(
-        {
-            'file_to_obfuscate': s3_file,
-            'pii_fields': pii_fields
-        }
-    ))
-    assert isinstance(masked_parquet, bytes)
+    files = {
+        'a.csv.gz': (gzip, csv_data.encode()),
+        'a.csv.bz2': (bz2, csv_data.encode()),
+        'compressed.csv': (gzip, csv_data.encode()),
+        'a.json.gz': (gzip, json_data),
+        'a.parquet.gz': (gzip, parquet_data)
+    }
+    for key, (codec, data) in files.items():
+        client.put_object(
+            Body=codec.compress(data), Bucket='test_bucket', Key=key)
+
+    masked = {
+        key: codec.decompress(gdpr_obfuscator(json.dumps({
+            'file_to_obfuscate': f's3://test_bucket/{key}',
+            'pii_fields': ['name'],
+            'json_backend': 'json'
+        })))
+        for key, (codec, _) in files.items()
+    }
+
+    assert masked['a.csv.gz'].decode() == obfuscate_csv(csv_data, ['name'])
+    assert masked['a.csv.bz2'] == masked['compressed.csv'] \
+        == masked['a.csv.gz']
+    assert masked['a.json.gz'] == b'[{"id": 1, "name": "***"}]'
+    assert masked['a.parquet.gz'] == obfuscate_parquet(
+        parquet_data, ['name'])
 
 
 @pytest.mark.describe('gdpr_obfuscator()')
-@pytest.mark.it('Return bytestream representation of data csv data')
+@pytest.mark.it('Detect pii in compressed parquet spooled to temporary file')
 @mock_aws
-def test_Return_bytestream_representation_of_data_csv_data(csv_data):
-    csv_data_s3, _ = csv_data
-
+def test_gdpr_obfuscator_detect_pii_in_compressed_parquet(monkeypatch):
+    table = pa.table({'id': range(10), 'contact': ['a@b.com'] * 10})
+    pq.write_table(table, parquet_buffer := BytesIO())
     client = boto3.client('s3', region_name="us-east-1")
     client.create_bucket(Bucket='test_bucket')
     client.put_object(
-        Body=csv_data_s3,
+        Body=gzip.compress(parquet_buffer.getvalue()),
         Bucket='test_bucket',
-        Key='some_folder/file.csv')
+        Key='a.parquet.gz'
+    )
 
-    s3_file = 's3://test_bucket/some_folder/file.csv'
-    pii_fields = ['name', 'country']
-    d = {}
-    d['file_to_obfuscate'], d['pii_fields'] = s3_file, pii_fields
-    json_str = json.dumps(d)
-    masked_csv = gdpr_obfuscator(json_str)
+    def fail(*args, **kwargs):
+        raise AssertionError('object was read in memory')
+    monkeypatch.setattr(gdpr_module, 'get_data', fail)
 
-    assert isinstance(masked_csv, bytes)
+    masked = gdpr_obfuscator(json.dumps({
+        'file_to_obfuscate': 's3://test_bucket/a.parquet.gz',
+        'pii_fields': [],
+        'detect_pii': True
+    }))
+
+    assert gzip.decompress(masked) == obfuscate_parquet(
+        parquet_buffer.getvalue(), ['contact'])
 
 
 @pytest.mark.describe('gdpr_obfuscator()')
-@pytest.mark.it('Return bytestream representation of data json data')
+@pytest.mark.it('Mask compressed csv with no extension in one stream')
 @mock_aws
-def test_Return_bytestream_representation_of_data_json_data(json_data):
-    json_data_s3, _ = json_data
-
+def test_gdpr_obfuscator_compressed_csv_without_extension_in_ranges():
+    csv_data = 'id,name\n' + ''.join(f'{i},name{i}\n' for i in range(500))
     client = boto3.client('s3', region_name="us-east-1")
     client.create_bucket(Bucket='test_bucket')
     client.put_object(
-        Body=json_data_s3,
+        Body=gzip.compress(csv_data.encode()),
         Bucket='test_bucket',
-        Key='some_folder/file.json')
+        Key='file.csv'
+    )
 
-    s3_file = 's3://test_bucket/some_folder/file.json'
-    pii_fields = ['name', 'country']
-    d = {}
-    d['file_to_obfuscate'], d['pii_fields'] = s3_file, pii_fields
-    masked_csv = gdpr_obfuscator(json.dumps(d))
+    masked = gdpr_obfuscator(json.dumps({
+        'file_to_obfuscate': 's3://test_bucket/file.csv',
+        'pii_fields': ['name'],
+        'processes': 2,
+        'range_size': 100
+    }))
 
-    assert isinstance(masked_csv, bytes)
+    assert gzip.decompress(masked).decode() == obfuscate_csv(
+        csv_data, ['name'])
 
 
 @pytest.mark.describe('gdpr_obfuscator()')
-@pytest.mark.it('Function output is compatible with the boto3 S3 Put Object')
+@pytest.mark.it('Mask compressed parquet with no extension in one stream')
+@pytest.mark.parametrize('output_file', [None, 's3://test_bucket/b.parquet'])
 @mock_aws
-def test_Function_outputis_compatible_with_the_boto3_S3_Put_Object(
-    csv_json_parquet
-):
+def test_gdpr_obfuscator_compressed_parquet_without_extension(output_file):
+    table = pa.table({'id': range(10), 'contact': ['a@b.com'] * 10})
+    pq.write_table(table, parquet_buffer := BytesIO())
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(
+        Body=gzip.compress(parquet_buffer.getvalue()),
+        Bucket='test_bucket',
+        Key='a.parquet'
+    )
+    output = {'output_file': output_file} if output_file else {}
+
+    masked = gdpr_obfuscator(json.dumps({
+        'file_to_obfuscate': 's3://test_bucket/a.parquet',
+        'pii_fields': ['id'],
+        'detect_pii': True,
+        **output
+    }))
+    if output_file:
+        masked = client.get_object(
+            Bucket='test_bucket', Key='b.parquet')['Body'].read()
+
+    assert gzip.decompress(masked) == obfuscate_parquet(
+        parquet_buffer.getvalue(), ['id', 'contact'])
+
+
+@pytest.mark.describe('gdpr_obfuscator_stream()')
+@pytest.mark.it('Decompress and compress compressed file chunk by chunk')
+@mock_aws
+def test_gdpr_obfuscator_stream_compressed_file():
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    writer = csv.writer(csv_buffer := StringIO())
+    writer.writerow(['id', 'name'])
+    writer.writerows([[i, f'name{i}'] for i in range(100000)])
+    csv_data = csv_buffer.getvalue()
+    client.put_object(
+        Body=gzip.compress(csv_data.encode()),
+        Bucket='test_bucket',
+        Key='a.csv.gz'
+    )
+
+    chunks = list(gdpr_obfuscator_stream(json.dumps({
+        'file_to_obfuscate': 's3://test_bucket/a.csv.gz',
+        'pii_fields': ['name']
+    }), chunk_size=64 * 1024))
+
+    assert len(chunks) > 1
+    assert gzip.decompress(b''.join(chunks)).decode() \
+        == obfuscate_csv(csv_data, ['name'])
+    assert get_csv_header(client, 'test_bucket', 'a.csv.gz') == ['id', 'name']
+
+
+@pytest.mark.describe('get_csv_header()')
+@pytest.mark.it('Close s3 body of compressed object after reading header')
+@mock_aws
+def test_get_csv_header_close_compressed_body(monkeypatch):
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(
+        Body=gzip.compress(b'id,name\r\n' + b'1,a\r\n' * 100000),
+        Bucket='test_bucket',
+        Key='a.csv.gz'
+    )
+    closed = []
+    get_stream = gdpr_module.get_stream
+
+    def spy_get_stream(*args):
+        body = get_stream(*args)
+        close = body.close
+        body.close = lambda: closed.append(close())
+        return body
+    monkeypatch.setattr(gdpr_module, 'get_stream', spy_get_stream)
+
+    assert get_csv_header(client, 'test_bucket', 'a.csv.gz') == ['id', 'name']
+    assert len(closed) == 1
+
+
+@pytest.mark.describe('gdpr_obfuscator()')
+@pytest.mark.it('Mask zstd compressed file and compress it with zstd')
+@mock_aws
+def test_gdpr_obfuscator_zstd_compressed_file(csv_data):
+    zstandard = pytest.importorskip('zstandard')
+    csv_data, _ = csv_data
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(
+        Body=zstandard.ZstdCompressor().compress(csv_data.encode()),
+        Bucket='test_bucket',
+        Key='a.csv.zst'
+    )
+
+    masked = gdpr_obfuscator(json.dumps({
+        'file_to_obfuscate': 's3://test_bucket/a.csv.zst',
+        'pii_fields': ['name']
+    }))
+
+    assert zstandard.ZstdDecompressor().stream_reader(
+        BytesIO(masked)).read().decode() == obfuscate_csv(csv_data, ['name'])
+    assert get_csv_header(client, 'test_bucket', 'a.csv.zst') \
+        == next(csv.reader(StringIO(csv_data)))
+
+
+########################################################################
+# gdpr_obsfucator() tests
+#######################################################################
+@pytest.mark.describe('gdpr_obfuscator()')
+@pytest.mark.it('Return data with correct pii_fields masked parquet data')
+@mock_aws
+def test_Return_data_with_correct_pii_fields_masked_parquet_data(parquet_data):
+    parquet_data, expected_parquet_data = parquet_data
+
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(
+        Body=parquet_data,
+        Bucket='test_bucket',
+        Key='some_folder/file.parquet')
+
+    pii_fields = ['id', 'name', 'post_code', 'some_column']
+    s3_file = 's3://test_bucket/some_folder/file.parquet'
+    masked_parquet = gdpr_obfuscator(json.dumps(
+        {
+            'file_to_obfuscate': s3_file,
+            'pii_fields': pii_fields
+        }
+    ))
+    assert masked_parquet == expected_parquet_data
+
+
+@pytest.mark.describe('gdpr_obfuscator()')
+@pytest.mark.it('Return data with correct pii_fields masked csv data')
+@mock_aws
+def test_Return_data_with_correct_pii_fields_masked_csv_data(csv_data):
+    csv_data_s3, expected_csv_data = csv_data
+
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(
+        Body=csv_data_s3,
+        Bucket='test_bucket',
+        Key='some_folder/file.csv')
+
+    s3_file = 's3://test_bucket/some_folder/file.csv'
+    pii_fields = ['name', 'country']
+    d = {}
+    d['file_to_obfuscate'], d['pii_fields'] = s3_file, pii_fields
+    json_str = json.dumps(d)
+    masked_csv = gdpr_obfuscator(json_str).decode()
+
+    assert expected_csv_data == masked_csv
+
+
+@pytest.mark.describe('gdpr_obfuscator()')
+@pytest.mark.it('Return data with correct pii_fields masked json data')
+@mock_aws
+def test_Return_data_with_correct_pii_fields_masked_json_data(json_data):
+    json_data_s3, expected_output = json_data
+
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(
+        Body=json_data_s3,
+        Bucket='test_bucket',
+        Key='some_folder/file.json')
+
+    s3_file = 's3://test_bucket/some_folder/file.json'
+    pii_fields = ['name', 'country']
+    json_str = json.dumps({
+        'file_to_obfuscate': s3_file,
+        'pii_fields': pii_fields,
+        'json_backend': 'json'
+    })
+    masked_json = gdpr_obfuscator(json_str)
+
+    assert masked_json == expected_output
+
+
+@pytest.mark.describe('gdpr_obfuscator()')
+@pytest.mark.it('Return bytestream representation of data parquet data')
+@mock_aws
+def test_Return_bytestream_representation_of_data_parquet_data(parquet_data):
+    parquet_data, _ = parquet_data
+
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(
+        Body=parquet_data,
+        Bucket='test_bucket',
+        Key='some_folder/file.parquet')
+    pii_fields = ['id', 'name', 'post_code', 'some_column']
+    s3_file = 's3://test_bucket/some_folder/file.parquet'
+    masked_parquet = gdpr_obfuscator(json.dumps(
+        {
+            'file_to_obfuscate': s3_file,
+            'pii_fields': pii_fields
+        }
+    ))
+    assert isinstance(masked_parquet, bytes)
+
+
+@pytest.mark.describe('gdpr_obfuscator()')
+@pytest.mark.it('Return bytestream representation of data csv data')
+@mock_aws
+def test_Return_bytestream_representation_of_data_csv_data(csv_data):
+    csv_data_s3, _ = csv_data
+
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(
+        Body=csv_data_s3,
+        Bucket='test_bucket',
+        Key='some_folder/file.csv')
+
+    s3_file = 's3://test_bucket/some_folder/file.csv'
+    pii_fields = ['name', 'country']
+    d = {}
+    d['file_to_obfuscate'], d['pii_fields'] = s3_file, pii_fields
+    json_str = json.dumps(d)
+    masked_csv = gdpr_obfuscator(json_str)
+
+    assert isinstance(masked_csv, bytes)
+
+
+@pytest.mark.describe('gdpr_obfuscator()')
+@pytest.mark.it('Return bytestream representation of data json data')
+@mock_aws
+def test_Return_bytestream_representation_of_data_json_data(json_data):
+    json_data_s3, _ = json_data
+
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(
+        Body=json_data_s3,
+        Bucket='test_bucket',
+        Key='some_folder/file.json')
+
+    s3_file = 's3://test_bucket/some_folder/file.json'
+    pii_fields = ['name', 'country']
+    d = {}
+    d['file_to_obfuscate'], d['pii_fields'] = s3_file, pii_fields
+    masked_csv = gdpr_obfuscator(json.dumps(d))
+
+    assert isinstance(masked_csv, bytes)
+
+
+@pytest.mark.describe('gdpr_obfuscator_stream()')
+@pytest.mark.it('Yield masked csv data in chunks from s3 stream')
+@mock_aws
+def test_gdpr_obfuscator_stream_yield_masked_csv_in_chunks(csv_data):
+    csv_data_s3, expected_csv_data = csv_data
+
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(
+        Body=csv_data_s3,
+        Bucket='test_bucket',
+        Key='some_folder/file.csv')
+
+    json_str = json.dumps({
+        'file_to_obfuscate': 's3://test_bucket/some_folder/file.csv',
+        'pii_fields': ['name', 'country']
+    })
+    chunks = list(gdpr_obfuscator_stream(json_str, chunk_size=16))
+
+    assert len(chunks) > 1
+    assert b''.join(chunks).decode() == expected_csv_data
+
+
+@pytest.mark.describe('gdpr_obfuscator()')
+@pytest.mark.it('Mask csv data with bytes csv_engine')
+@mock_aws
+def test_gdpr_obfuscator_mask_csv_with_bytes_engine(csv_data):
+    csv_data_s3, expected_csv_data = csv_data
+
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(
+        Body=csv_data_s3,
+        Bucket='test_bucket',
+        Key='some_folder/file.csv')
+
+    masked_csv = gdpr_obfuscator(json.dumps({
+        'file_to_obfuscate': 's3://test_bucket/some_folder/file.csv',
+        'pii_fields': ['name', 'country'],
+        'csv_engine': 'bytes'
+    }))
+
+    assert masked_csv.decode() == expected_csv_data
+
+
+@pytest.mark.describe('gdpr_obfuscator()')
+@pytest.mark.it('Mask json data with json_backend')
+@pytest.mark.parametrize('json_backend', ['json', 'auto'])
+@mock_aws
+def test_gdpr_obfuscator_mask_json_with_json_backend(json_data, json_backend):
+    json_data_s3, expected_json_data = json_data
+
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(
+        Body=json_data_s3,
+        Bucket='test_bucket',
+        Key='some_folder/file.json')
+
+    masked_json = gdpr_obfuscator(json.dumps({
+        'file_to_obfuscate': 's3://test_bucket/some_folder/file.json',
+        'pii_fields': ['name', 'country'],
+        'json_backend': json_backend
+    }))
+
+    assert json.loads(masked_json) == json.loads(expected_json_data)
+
+
+@pytest.mark.describe('gdpr_obfuscator()')
+@pytest.mark.it('Mask csv byte ranges in parallel processes')
+@pytest.mark.parametrize('newlines_in_values', [False, True])
+@mock_aws
+def test_gdpr_obfuscator_mask_csv_ranges_in_processes(
+    newlines_in_values,
+    monkeypatch
+):
+    csv_buffer = StringIO()
+    writer = csv.writer(csv_buffer)
+    writer.writerow(['id', 'name', 'note', 'email'])
+    for i in range(500):
+        note = f'multi\nline "{i}"' if newlines_in_values and i % 3 else i
+        writer.writerow([i, f'name{i}', note, f'email{i}@email.com'])
+    csv_data = csv_buffer.getvalue()
+
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(Body=csv_data, Bucket='test_bucket', Key='file.csv')
+    record_ends = []
+
+    def spy_find_record_end(*args, **kwargs):
+        record_ends.append(find_record_end(*args, **kwargs))
+        return record_ends[-1]
+    find_record_end = gdpr_module._find_record_end
+    monkeypatch.setattr(
+        gdpr_module, '_find_record_end', spy_find_record_end)
+
+    masked_csv = gdpr_obfuscator(json.dumps({
+        'file_to_obfuscate': 's3://test_bucket/file.csv',
+        'pii_fields': ['name', 'email'],
+        'processes': 2,
+        'range_size': 1000,
+        'newlines_in_values': newlines_in_values
+    }))
+
+    assert masked_csv.decode() == obfuscate_csv(csv_data, ['name', 'email'])
+    assert len(set(record_ends)) > 10
+
+
+@pytest.mark.describe('gdpr_obfuscator()')
+@pytest.mark.it('Align csv ranges by quotes by default, fail when misaligned')
+@mock_aws
+def test_gdpr_obfuscator_csv_ranges_quoted_newlines():
+    writer = csv.writer(csv_buffer := StringIO())
+    writer.writerow(['id', 'name', 'note'])
+    writer.writerows([[i, f'name{i}', f'line one\nline two {i}']
+                      for i in range(200)])
+    csv_data = csv_buffer.getvalue()
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(Body=csv_data, Bucket='test_bucket', Key='file.csv')
+    request = {
+        'file_to_obfuscate': 's3://test_bucket/file.csv',
+        'pii_fields': ['name'],
+        'processes': 2,
+        'range_size': 500
+    }
+
+    masked_csv = gdpr_obfuscator(json.dumps(request))
+    request['newlines_in_values'] = False
+
+    assert masked_csv.decode() == obfuscate_csv(csv_data, ['name'])
+    with pytest.raises(ValueError) as excinfo:
+        gdpr_obfuscator(json.dumps(request))
+    assert 'splits quoted value' in str(excinfo.value)
+
+
+@pytest.mark.describe('gdpr_obfuscator()')
+@pytest.mark.it('Mask csv ranges into output larger than the range')
+@mock_aws
+def test_gdpr_obfuscator_csv_ranges_output_larger_than_range():
+    csv_data = 'id,name\n' + ''.join(f'{i},n\n' for i in range(2000))
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(Body=csv_data, Bucket='test_bucket', Key='file.csv')
+    masking = {'strategy': 'hmac', 'key': 'secret'}
+
+    masked_csv = gdpr_obfuscator(json.dumps({
+        'file_to_obfuscate': 's3://test_bucket/file.csv',
+        'pii_fields': ['name'],
+        'masking': masking,
+        'processes': 2,
+        'range_size': 1000
+    }))
+
+    assert len(masked_csv) > 3 * len(csv_data)
+    assert masked_csv.decode() == obfuscate_csv(csv_data, ['name'], masking)
+
+
+@pytest.mark.describe('gdpr_obfuscator_stream()')
+@pytest.mark.it('Yield masked parquet data row group by row group')
+@mock_aws
+def test_gdpr_obfuscator_stream_yield_parquet_by_row_group(parquet_data):
+    parquet_data, _ = parquet_data
+    table = pq.read_table(BytesIO(parquet_data))
+    pq.write_table(table, parquet_buffer := BytesIO(), row_group_size=25000)
+
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(
+        Body=parquet_buffer.getvalue(),
+        Bucket='test_bucket',
+        Key='some_folder/file.parquet')
+
+    chunks = list(gdpr_obfuscator_stream(json.dumps({
+        'file_to_obfuscate': 's3://test_bucket/some_folder/file.parquet',
+        'pii_fields': ['name']
+    })))
+    masked_table = pq.read_table(BytesIO(b''.join(chunks)))
+
+    assert len(chunks) > 4
+    assert masked_table.column('name').unique().to_pylist() == ['***']
+    assert masked_table.drop_columns('name') == table.drop_columns('name')
+
+
+@pytest.mark.describe('get_stream()')
+@pytest.mark.it('Return readable stream of s3 object')
+@mock_aws
+def test_get_stream_return_readable_stream(csv_data):
+    csv_data_s3, _ = csv_data
+
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(
+        Body=csv_data_s3,
+        Bucket='test_bucket',
+        Key='file.csv')
+
+    stream = get_stream(client, 'test_bucket', 'file.csv')
+
+    assert stream.read(2) == csv_data_s3[:2].encode()
+    assert stream.read() == csv_data_s3[2:].encode()
+
+
+@pytest.mark.describe('gdpr_obfuscator()')
+@pytest.mark.it('Function output is compatible with the boto3 S3 Put Object')
+@mock_aws
+def test_Function_outputis_compatible_with_the_boto3_S3_Put_Object(
+    csv_json_parquet
+):
     client = boto3.client('s3', region_name="us-east-1")
     client.create_bucket(Bucket='test_bucket')
     for key in csv_json_parquet.keys():
@@ -550,6 +1762,602 @@ def test_Function_process_1MB_data_in_less_than_1min():
     assert time.time() - start_time < 60
 
 
+########################################################################
+# gdpr_obfuscator_batch() tests
+#######################################################################
+@pytest.mark.describe('gdpr_obfuscator_batch()')
+@pytest.mark.it('Upload masked objects of files list to output_prefix')
+@mock_aws
+def test_batch_upload_masked_files_to_output_prefix(csv_data, json_data):
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.create_bucket(Bucket='masked_bucket')
+    client.put_object(
+        Body=csv_data[0], Bucket='test_bucket', Key='some_folder/file.csv')
+    client.put_object(
+        Body=json_data[0], Bucket='test_bucket', Key='some_folder/file.json')
+    files = [
+        's3://test_bucket/some_folder/file.csv',
+        's3://test_bucket/some_folder/file.json'
+    ]
+
+    results = gdpr_obfuscator_batch(json.dumps({
+        'files_to_obfuscate': files,
+        'pii_fields': ['name', 'country'],
+        'output_prefix': 's3://masked_bucket/masked'
+    }), max_workers=2)
+
+    assert [r['file_to_obfuscate'] for r in results] == files
+    assert [r['output_file'] for r in results] == [
+        's3://masked_bucket/masked/some_folder/file.csv',
+        's3://masked_bucket/masked/some_folder/file.json'
+    ]
+    assert all(r['error'] is None and r['data'] is None for r in results)
+    masked_csv = client.get_object(
+        Bucket='masked_bucket', Key='masked/some_folder/file.csv')
+    assert masked_csv['Body'].read().decode() == csv_data[1]
+    masked_json = client.get_object(
+        Bucket='masked_bucket', Key='masked/some_folder/file.json')
+    assert json.loads(masked_json['Body'].read()) == json.loads(json_data[1])
+
+
+@pytest.mark.describe('gdpr_obfuscator_batch()')
+@pytest.mark.it('Return masked data of every object under prefix')
+@mock_aws
+def test_batch_return_masked_data_of_objects_under_prefix(csv_data):
+    csv_data, expected_csv_data = csv_data
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    for key in ['new_data/b.csv', 'new_data/a.csv', 'old_data/c.csv']:
+        client.put_object(Body=csv_data, Bucket='test_bucket', Key=key)
+
+    results = gdpr_obfuscator_batch(json.dumps({
+        'prefix_to_obfuscate': 's3://test_bucket/new_data/',
+        'pii_fields': ['name', 'country']
+    }))
+
+    assert [r['file_to_obfuscate'] for r in results] == \
+        ['s3://test_bucket/new_data/a.csv', 's3://test_bucket/new_data/b.csv']
+    for result in results:
+        assert result['error'] is None
+        assert result['output_file'] is None
+        assert result['data'].decode() == expected_csv_data
+
+
+@pytest.mark.describe('gdpr_obfuscator_batch()')
+@pytest.mark.it('Return error of failed object and process the rest')
+@mock_aws
+def test_batch_return_errors_per_object(csv_data, caplog):
+    csv_data, expected_csv_data = csv_data
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(Body=csv_data, Bucket='test_bucket', Key='a.csv')
+    client.put_object(Body=csv_data, Bucket='test_bucket', Key='a.txt')
+
+    results = gdpr_obfuscator_batch(json.dumps({
+        'files_to_obfuscate': [
+            's3://test_bucket/a.txt',
+            's3://test_bucket/missing.csv',
+            's3://test_bucket/a.csv'
+        ],
+        'pii_fields': ['name', 'country']
+    }))
+
+    assert isinstance(results[0]['error'], UnsupportedData)
+    assert isinstance(results[1]['error'], ClientError)
+    assert results[2]['error'] is None
+    assert results[2]['data'].decode() == expected_csv_data
+    assert 's3://test_bucket/missing.csv' in caplog.text
+
+
+@pytest.mark.describe('gdpr_obfuscator_batch()')
+@pytest.mark.it('Refuse to overwrite file_to_obfuscate with masked data')
+@mock_aws
+def test_batch_refuse_to_overwrite_input(csv_data):
+    csv_data, _ = csv_data
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(Body=csv_data, Bucket='test_bucket', Key='a.csv')
+
+    results = gdpr_obfuscator_batch(json.dumps({
+        'files_to_obfuscate': ['s3://test_bucket/a.csv'],
+        'pii_fields': ['name', 'country'],
+        'output_prefix': 's3://test_bucket/'
+    }))
+
+    assert isinstance(results[0]['error'], ValueError)
+    assert results[0]['output_file'] is None
+    assert client.get_object(Bucket='test_bucket', Key='a.csv')[
+        'Body'].read().decode() == csv_data
+
+
+@pytest.mark.describe('gdpr_obfuscator_batch()')
+@pytest.mark.it('Share one client with connection pool of max_workers')
+@mock_aws
+def test_batch_share_one_connection_pooled_client(csv_data, monkeypatch):
+    csv_data, _ = csv_data
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    files = []
+    for i in range(10):
+        client.put_object(Body=csv_data, Bucket='test_bucket', Key=f'{i}.csv')
+        files.append(f's3://test_bucket/{i}.csv')
+    clients = []
+
+    def spy_client(*args, **kwargs):
+        clients.append(boto3.session.Session().client(*args, **kwargs))
+        return clients[-1]
+    monkeypatch.setattr(boto3, 'client', spy_client)
+
+    results = gdpr_obfuscator_batch(json.dumps({
+        'files_to_obfuscate': files,
+        'pii_fields': ['name']
+    }), max_workers=4)
+
+    assert len(clients) == 1
+    assert clients[0].meta.config.max_pool_connections == 4
+    assert all(r['error'] is None for r in results)
+
+
+@pytest.mark.describe('gdpr_obfuscator_batch()')
+@pytest.mark.it('Mask objects in worker processes through shared memory')
+@mock_aws
+def test_batch_mask_in_processes(csv_data, json_data, parquet_data):
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(Body=csv_data[0], Bucket='test_bucket', Key='a.csv')
+    client.put_object(Body=json_data[0], Bucket='test_bucket', Key='a.json')
+    client.put_object(Body=b'', Bucket='test_bucket', Key='empty.csv')
+    client.put_object(
+        Body=parquet_data[0], Bucket='test_bucket', Key='a.parquet')
+    shared_memory = set(os.listdir('/dev/shm'))
+
+    results = gdpr_obfuscator_batch(json.dumps({
+        'files_to_obfuscate': [
+            's3://test_bucket/a.csv',
+            's3://test_bucket/a.json',
+            's3://test_bucket/empty.csv',
+            's3://test_bucket/a.txt'
+        ],
+        'pii_fields': ['name', 'country']
+    }), processes=2)
+    parquet_results = gdpr_obfuscator_batch(json.dumps({
+        'files_to_obfuscate': ['s3://test_bucket/a.parquet'],
+        'pii_fields': ['id', 'name', 'post_code', 'some_column']
+    }), processes=2)
+
+    assert results[0]['data'].decode() == csv_data[1]
+    assert json.loads(results[1]['data']) == json.loads(json_data[1])
+    assert results[2]['data'] == b''
+    assert isinstance(results[3]['error'], UnsupportedData)
+    assert parquet_results[0]['data'] == parquet_data[1]
+    assert set(os.listdir('/dev/shm')) == shared_memory
+
+
+@pytest.mark.describe('Obfuscator')
+@pytest.mark.it('Create one client and reuse it across calls')
+@mock_aws
+def test_obfuscator_reuse_client_across_calls(csv_data, monkeypatch):
+    csv_data, expected_csv_data = csv_data
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(Body=csv_data, Bucket='test_bucket', Key='a.csv')
+    clients = []
+
+    def spy_client(*args, **kwargs):
+        clients.append(boto3.session.Session().client(*args, **kwargs))
+        return clients[-1]
+    monkeypatch.setattr(boto3, 'client', spy_client)
+
+    obfuscator = Obfuscator(pii_fields=['name', 'country'], max_workers=4)
+    results = [
+        obfuscator.obfuscate('s3://test_bucket/a.csv') for _ in range(3)]
+    results.append(b''.join(obfuscator.stream('s3://test_bucket/a.csv')))
+
+    assert len(clients) == 1
+    assert clients[0].meta.config.max_pool_connections == 4
+    assert all(result.decode() == expected_csv_data for result in results)
+
+
+@pytest.mark.describe('Obfuscator')
+@pytest.mark.it('Override default options with call arguments')
+@mock_aws
+def test_obfuscator_override_default_options(csv_data):
+    csv_data, expected_csv_data = csv_data
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(Body=csv_data, Bucket='test_bucket', Key='a.csv')
+    obfuscator = Obfuscator(pii_fields=['email_address'], client=client)
+
+    result = obfuscator.obfuscate(
+        's3://test_bucket/a.csv', pii_fields=['name', 'country'])
+    uploaded = obfuscator.obfuscate(
+        's3://test_bucket/a.csv',
+        pii_fields=['name', 'country'],
+        output_file='s3://test_bucket/masked/a.csv'
+    )
+    results = obfuscator.batch(
+        ['s3://test_bucket/a.csv'], pii_fields=['name', 'country'])
+
+    assert result.decode() == expected_csv_data
+    assert uploaded == b''
+    assert client.get_object(Bucket='test_bucket', Key='masked/a.csv')[
+        'Body'].read().decode() == expected_csv_data
+    assert results[0]['data'].decode() == expected_csv_data
+    assert obfuscator.options == {'pii_fields': ['email_address']}
+
+
+@pytest.mark.describe('Obfuscator')
+@pytest.mark.it('Return masked data when output_file is None')
+@mock_aws
+def test_obfuscator_return_masked_data_when_output_file_is_None(csv_data):
+    csv_data, expected_csv_data = csv_data
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(Body=csv_data, Bucket='test_bucket', Key='a.csv')
+    obfuscator = Obfuscator(
+        pii_fields=['name', 'country'],
+        client=client,
+        output_file='s3://test_bucket/masked/a.csv'
+    )
+
+    result = obfuscator.obfuscate('s3://test_bucket/a.csv', output_file=None)
+    default = Obfuscator(['name', 'country'], client=client, output_file=None)
+
+    assert result.decode() == expected_csv_data
+    assert default.obfuscate('s3://test_bucket/a.csv') == result
+    assert 'Contents' not in client.list_objects_v2(
+        Bucket='test_bucket', Prefix='masked/')
+
+
+@pytest.mark.describe('async_gdpr_obfuscator()')
+@pytest.mark.it('Return same masked data as gdpr_obfuscator')
+@mock_aws
+def test_async_gdpr_obfuscator_return_masked_data(csv_json_parquet):
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    for data_type, (data, _) in csv_json_parquet.items():
+        client.put_object(
+            Body=data, Bucket='test_bucket', Key=f'file.{data_type}')
+    pii_fields = ['name', 'country', 'id', 'post_code']
+
+    for data_type in csv_json_parquet:
+        request = json.dumps({
+            'file_to_obfuscate': f's3://test_bucket/file.{data_type}',
+            'pii_fields': pii_fields
+        })
+        result = asyncio.run(async_gdpr_obfuscator(request))
+
+        assert result == gdpr_obfuscator(request)
+
+
+@pytest.mark.describe('async_gdpr_obfuscator()')
+@pytest.mark.it('Upload masked data to output_file and return empty bytes')
+@mock_aws
+def test_async_gdpr_obfuscator_upload_to_output_file(csv_data):
+    csv_data, expected_csv_data = csv_data
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(Body=csv_data, Bucket='test_bucket', Key='a.csv')
+
+    result = asyncio.run(async_gdpr_obfuscator(json.dumps({
+        'file_to_obfuscate': 's3://test_bucket/a.csv',
+        'pii_fields': ['name', 'country'],
+        'output_file': 's3://test_bucket/masked/a.csv'
+    }), client=client))
+
+    assert result == b''
+    assert client.get_object(Bucket='test_bucket', Key='masked/a.csv')[
+        'Body'].read().decode() == expected_csv_data
+
+
+@pytest.mark.describe('async_gdpr_obfuscator_batch()')
+@pytest.mark.it('Limit objects in flight to max_concurrency')
+@mock_aws
+def test_async_batch_limit_objects_in_flight(csv_data, monkeypatch):
+    csv_data, expected_csv_data = csv_data
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.create_bucket(Bucket='masked_bucket')
+    files = []
+    for i in range(8):
+        client.put_object(Body=csv_data, Bucket='test_bucket', Key=f'{i}.csv')
+        files.append(f's3://test_bucket/{i}.csv')
+    in_flight, peak = [], []
+    get_data = gdpr_module.get_data
+
+    def spy_get_data(*args):
+        in_flight.append(None)
+        peak.append(len(in_flight))
+        time.sleep(0.05)
+        try:
+            return get_data(*args)
+        finally:
+            in_flight.pop()
+    monkeypatch.setattr(gdpr_module, 'get_data', spy_get_data)
+
+    results = asyncio.run(async_gdpr_obfuscator_batch(json.dumps({
+        'files_to_obfuscate': files + ['s3://test_bucket/missing.csv'],
+        'pii_fields': ['name', 'country'],
+        'output_prefix': 's3://masked_bucket/'
+    }), max_concurrency=3))
+
+    assert 1 < max(peak) <= 3
+    assert [r['output_file'] for r in results[:-1]] == \
+        [f's3://masked_bucket/{i}.csv' for i in range(8)]
+    assert isinstance(results[-1]['error'], ClientError)
+    assert client.get_object(Bucket='masked_bucket', Key='7.csv')[
+        'Body'].read().decode() == expected_csv_data
+
+
+@pytest.mark.describe('gdpr_obfuscator()')
+@pytest.mark.it('Upload masked data to output_file and return empty bytes')
+@mock_aws
+def test_gdpr_obfuscator_upload_to_output_file(csv_data):
+    csv_data, expected_csv_data = csv_data
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(Body=csv_data, Bucket='test_bucket', Key='file.csv')
+
+    result = gdpr_obfuscator(json.dumps({
+        'file_to_obfuscate': 's3://test_bucket/file.csv',
+        'pii_fields': ['name', 'country'],
+        'output_file': 's3://test_bucket/masked/file.csv'
+    }))
+
+    assert result == b''
+    masked = client.get_object(Bucket='test_bucket', Key='masked/file.csv')
+    assert masked['Body'].read().decode() == expected_csv_data
+    with pytest.raises(ValueError):
+        gdpr_obfuscator(json.dumps({
+            'file_to_obfuscate': 's3://test_bucket/file.csv',
+            'pii_fields': ['name', 'country'],
+            'output_file': 's3://test_bucket/file.csv'
+        }))
+
+
+@pytest.mark.describe('upload_stream()')
+@pytest.mark.it('Upload chunks in multipart upload parts')
+@mock_aws
+def test_upload_stream_upload_parts():
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    chunks = [bytes([i]) * 1024 * 1024 for i in range(12)]
+
+    upload_stream(client, iter(chunks), 'test_bucket', 'file.csv',
+                  part_size=5 * 1024 * 1024)
+
+    response = client.get_object(Bucket='test_bucket', Key='file.csv')
+    assert response['Body'].read() == b''.join(chunks)
+    assert response['ETag'].endswith('-3"')
+
+
+@pytest.mark.describe('upload_stream()')
+@pytest.mark.it('Grow part size to fit upload in MAX_PARTS parts')
+@mock_aws
+def test_upload_stream_grow_part_size(monkeypatch):
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    chunks = [bytes([i]) * 5 * 1024 * 1024 for i in range(10)]
+    monkeypatch.setattr(gdpr_module, 'MAX_PARTS', 4)
+
+    upload_stream(client, iter(chunks), 'test_bucket', 'file.csv',
+                  part_size=5 * 1024 * 1024)
+
+    response = client.get_object(Bucket='test_bucket', Key='file.csv')
+    assert response['Body'].read() == b''.join(chunks)
+    assert response['ETag'].endswith('-3"')
+    assert [gdpr_module._part_size(5, number) for number in range(1, 5)] \
+        == [5, 20, 160, 640]
+
+
+@pytest.mark.describe('upload_stream()')
+@pytest.mark.it('Abort multipart upload when producing data fails')
+@mock_aws
+def test_upload_stream_abort_upload_on_failure():
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+
+    def chunks():
+        for _ in range(7):
+            yield b'x' * 1024 * 1024
+        raise ValueError('masking failed')
+
+    with pytest.raises(ValueError):
+        upload_stream(client, chunks(), 'test_bucket', 'file.csv',
+                      part_size=5 * 1024 * 1024)
+
+    uploads = client.list_multipart_uploads(Bucket='test_bucket')
+    assert uploads.get('Uploads', []) == []
+    assert 'Contents' not in client.list_objects_v2(Bucket='test_bucket')
+
+
+@pytest.mark.describe('gdpr_obfuscator()')
+@pytest.mark.it('Return file unchanged without parsing when it has no pii')
+@pytest.mark.parametrize('data_type', ['csv', 'parquet'])
+@mock_aws
+def test_gdpr_obfuscator_return_file_without_pii_unchanged(
+    data_type,
+    csv_json_parquet,
+    monkeypatch,
+    caplog
+):
+    data = csv_json_parquet[data_type][0]
+    data = data.replace('\r\n', '\n') if data_type == 'csv' else data
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(Body=data, Bucket='test_bucket', Key=f'a.{data_type}')
+
+    def fail(*args, **kwargs):
+        raise AssertionError('object was parsed')
+    monkeypatch.setattr(gdpr_module, '_obfuscate_stream', fail)
+    monkeypatch.setattr(gdpr_module, 'upload_stream', fail)
+
+    masked = gdpr_obfuscator(json.dumps({
+        'file_to_obfuscate': f's3://test_bucket/a.{data_type}',
+        'pii_fields': ['wrong_column_name']
+    }))
+    gdpr_obfuscator(json.dumps({
+        'file_to_obfuscate': f's3://test_bucket/a.{data_type}',
+        'pii_fields': ['wrong_column_name'],
+        'output_file': f's3://test_bucket/copy/a.{data_type}'
+    }))
+
+    data = data.encode() if data_type == 'csv' else data
+    assert masked == data
+    copy = client.get_object(Bucket='test_bucket', Key=f'copy/a.{data_type}')
+    assert copy['Body'].read() == data
+    assert "pii_field:'wrong_column_name' not in data" in caplog.text
+
+
+@pytest.mark.describe('get_csv_header()')
+@pytest.mark.it('Read csv header with quoted newline from one ranged GET')
+@mock_aws
+def test_get_csv_header_read_header_only(monkeypatch):
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    header = 'id,"multi\nline",name\n'
+    client.put_object(
+        Body=header + '1,a,b\n' * 100000, Bucket='test_bucket', Key='a.csv')
+    client.put_object(Body=b'', Bucket='test_bucket', Key='empty.csv')
+
+    long_header = ','.join(f'column_{i}' for i in range(10000))
+    client.put_object(
+        Body=long_header + '\n1\n', Bucket='test_bucket', Key='long.csv')
+    requests = []
+    client.meta.events.register(
+        'before-call.s3',
+        lambda model, **kwargs: requests.append(model.name)
+    )
+
+    assert get_csv_header(client, 'test_bucket', 'a.csv') == \
+        ['id', 'multi\nline', 'name']
+    assert requests == ['GetObject']
+    assert get_csv_header(client, 'test_bucket', 'empty.csv') is None
+    assert get_csv_header(client, 'test_bucket', 'long.csv') == \
+        long_header.split(',')
+    assert 'HeadObject' not in requests
+
+
+@pytest.mark.describe('get_parquet_metadata()')
+@pytest.mark.it('Read parquet metadata from object footer')
+@pytest.mark.parametrize('window', [16, 64 * 1024])
+@mock_aws
+def test_get_parquet_metadata_read_footer(window, parquet_data, monkeypatch):
+    monkeypatch.setattr(gdpr_module, 'PARQUET_FOOTER_WINDOW', window)
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(
+        Body=parquet_data[0], Bucket='test_bucket', Key='a.parquet')
+
+    metadata = get_parquet_metadata(client, 'test_bucket', 'a.parquet')
+
+    expected = pq.read_metadata(BytesIO(parquet_data[0]))
+    assert metadata.equals(expected)
+
+
+@pytest.mark.describe('probe_parquet()')
+@pytest.mark.it('Describe columns, row groups and column chunks from footer')
+@mock_aws
+def test_probe_parquet_describe_row_groups_and_column_chunks():
+    table = pa.table({'id': range(100), 'name': [str(i) for i in range(100)]})
+    pq.write_table(table, parquet_buffer := BytesIO(), row_group_size=40)
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(
+        Body=parquet_buffer.getvalue(), Bucket='test_bucket', Key='a.parquet')
+
+    probe = probe_parquet(client, 'test_bucket', 'a.parquet')
+
+    assert probe['columns'] == ['id', 'name']
+    assert probe['num_rows'] == 100
+    assert [r['num_rows'] for r in probe['row_groups']] == [40, 40, 20]
+    chunk = probe['row_groups'][1]['columns']['name']
+    data = parquet_buffer.getvalue()[chunk['offset']:][:chunk['size']]
+    assert len(data) == chunk['size']
+
+
+@pytest.mark.describe('gdpr_obfuscator()')
+@pytest.mark.it('Download only parquet column chunks that are not masked')
+@mock_aws
+def test_gdpr_obfuscator_download_only_unmasked_parquet_columns(monkeypatch):
+    table = pa.table({
+        f'column_{i}': [f'value_{r}_{i}' for r in range(20000)]
+        for i in range(20)
+    })
+    pq.write_table(table, parquet_buffer := BytesIO(), row_group_size=5000)
+    parquet_data = parquet_buffer.getvalue()
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(Body=parquet_data, Bucket='test_bucket', Key='a.parquet')
+    downloaded = []
+
+    def spy_get_object(*args, **kwargs):
+        response = get_object(*args, **kwargs)
+        downloaded.append(response['ContentLength'])
+        return response
+    get_object = gdpr_module.get_object
+    monkeypatch.setattr(gdpr_module, 'get_object', spy_get_object)
+
+    pii_fields = [f'column_{i}' for i in range(18)]
+    masked = gdpr_obfuscator(json.dumps({
+        'file_to_obfuscate': 's3://test_bucket/a.parquet',
+        'pii_fields': pii_fields
+    }))
+
+    assert masked == obfuscate_parquet(parquet_data, pii_fields)
+    assert sum(downloaded) < len(parquet_data) / 4
+    assert open_parquet(client, 'test_bucket', 'a.parquet').read().equals(
+        table)
+
+
+@pytest.mark.describe('gdpr_obfuscator()')
+@pytest.mark.it('Read parquet footer once with no HeadObject')
+@pytest.mark.parametrize('output_file', [None, 's3://test_bucket/b.parquet'])
+@mock_aws
+def test_gdpr_obfuscator_read_parquet_footer_once(output_file, monkeypatch):
+    table = pa.table({
+        'id': range(1000),
+        'email': [f'user{i}@example.com' for i in range(1000)]
+    })
+    pq.write_table(table, parquet_buffer := BytesIO())
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    client.put_object(
+        Body=parquet_buffer.getvalue(), Bucket='test_bucket', Key='a.parquet')
+    ranges, requests = [], []
+    client.meta.events.register(
+        'before-call.s3',
+        lambda model, **kwargs: requests.append(model.name)
+    )
+
+    def spy_get_object(*args, **kwargs):
+        ranges.append(kwargs.get('Range'))
+        return get_object(*args, **kwargs)
+    get_object = gdpr_module.get_object
+    monkeypatch.setattr(gdpr_module, 'get_object', spy_get_object)
+    output = {'output_file': output_file} if output_file else {}
+
+    Obfuscator(['id'], client=client, detect_pii=True).obfuscate(
+        's3://test_bucket/a.parquet', **output)
+
+    assert ranges.count(f'bytes=-{gdpr_module.PARQUET_FOOTER_WINDOW}') == 1
+    assert 'HeadObject' not in requests
+
+
+@pytest.mark.describe('get_files()')
+@pytest.mark.it('List S3 locations of objects under prefix')
+@mock_aws
+def test_get_files_list_objects_under_prefix():
+    client = boto3.client('s3', region_name="us-east-1")
+    client.create_bucket(Bucket='test_bucket')
+    for key in ['data/', 'data/a.csv', 'data/x/b.json', 'other/c.csv']:
+        client.put_object(Body=b'', Bucket='test_bucket', Key=key)
+
+    assert get_files(client, 's3://test_bucket/data') == \
+        ['s3://test_bucket/data/a.csv', 's3://test_bucket/data/x/b.json']
+
+
 ##############################################################################
 # obsfuscate_parquet() tests
 ##############################################################################
@@ -644,6 +2452,185 @@ def test_Function_applies_correct_compression_algorithms(parquet_data):
     metadata_dict = metadata.to_dict()
     compression = metadata_dict['row_groups'][0]['columns'][0]['compression']
     assert compression == 'GZIP'
+
+
+@pytest.mark.describe('obfuscate_parquet()')
+@pytest.mark.it('Write masked columns as constant dictionary encoded column')
+def test_Function_write_masked_columns_dictionary_encoded(parquet_data):
+    parquet_data, _ = parquet_data
+    masked_pqfile = obfuscate_parquet(parquet_data, ['name'])
+    metadata = pq.read_metadata(BytesIO(masked_pqfile))
+    name = metadata.row_group(0).column(1)
+    masked_table = pq.read_table(BytesIO(masked_pqfile))
+
+    assert name.path_in_schema == 'name'
+    assert 'RLE_DICTIONARY' in name.encodings
+    assert name.total_compressed_size < 1024
+    assert masked_table.column('name').type == pa.string()
+    assert set(masked_table.column('name').to_pylist()) == {'***'}
+
+
+@pytest.mark.describe('obfuscate_parquet()')
+@pytest.mark.it('Read only columns that are not masked')
+def test_Function_read_only_columns_that_are_not_masked(
+    parquet_data,
+    monkeypatch
+):
+    parquet_data, _ = parquet_data
+    read_columns = []
+    read_row_group = pq.ParquetFile.read_row_group
+
+    def spy_read_row_group(self, i, columns=None, **kwargs):
+        read_columns.append(columns)
+        return read_row_group(self, i, columns=columns, **kwargs)
+
+    monkeypatch.setattr(pq.ParquetFile, 'read_row_group', spy_read_row_group)
+    obfuscate_parquet(parquet_data, ['id', 'name', 'post_code'])
+
+    assert read_columns == [['surname', 'country', 'address', 'some_column']]
+
+
+@pytest.mark.describe('obfuscate_parquet()')
+@pytest.mark.it('Mask every column without decoding any')
+def test_Function_mask_every_column_without_decoding_any(parquet_data):
+    parquet_data, _ = parquet_data
+    column_names = pq.read_schema(BytesIO(parquet_data)).names
+    masked_table = pq.read_table(BytesIO(
+        obfuscate_parquet(parquet_data, column_names)))
+
+    assert masked_table.num_rows == 100000
+    assert masked_table.column_names == column_names
+    assert all(column.unique().to_pylist() == ['***']
+               for column in masked_table.columns)
+
+
+@pytest.mark.describe('obfuscate_parquet_stream()')
+@pytest.mark.it('Keep row group layout of the input')
+def test_parquet_stream_keep_row_group_layout(parquet_data):
+    parquet_data, _ = parquet_data
+    table = pq.read_table(BytesIO(parquet_data))
+    pq.write_table(table, parquet_buffer := BytesIO(), row_group_size=30000)
+
+    chunks = list(obfuscate_parquet_stream(
+        BytesIO(parquet_buffer.getvalue()),
+        ['name', 'post_code']
+    ))
+    metadata = pq.read_metadata(BytesIO(b''.join(chunks)))
+
+    assert len(chunks) > 4
+    assert metadata.num_row_groups == 4
+    assert [metadata.row_group(i).num_rows for i in range(4)] == \
+        [30000, 30000, 30000, 10000]
+
+
+@pytest.mark.describe('obfuscate_parquet_stream()')
+@pytest.mark.it('Output is identical to obfuscate_parquet')
+def test_parquet_stream_output_identical_to_obfuscate_parquet(parquet_data):
+    parquet_data, expected_parquet_data = parquet_data
+    pii_fields = ['id', 'name', 'post_code', 'some_column']
+    masked_parquet = b''.join(obfuscate_parquet_stream(
+        parquet_data,
+        pii_fields
+    ))
+
+    assert masked_parquet == expected_parquet_data
+    assert masked_parquet == obfuscate_parquet(parquet_data, pii_fields)
+
+
+@pytest.mark.describe('obfuscate_parquet_stream()')
+@pytest.mark.it('Limit rows per row group with row_group_size kwarg')
+def test_parquet_stream_limit_rows_with_row_group_size(parquet_data):
+    parquet_data, _ = parquet_data
+    masked_parquet = b''.join(obfuscate_parquet_stream(
+        parquet_data,
+        ['name'],
+        row_group_size=40000
+    ))
+    metadata = pq.read_metadata(BytesIO(masked_parquet))
+
+    assert metadata.num_row_groups == 3
+
+
+@pytest.mark.describe('obfuscate_parquet()')
+@pytest.mark.it('Preserve compression, encoding, statistics and metadata')
+def test_Function_preserve_input_parquet_settings():
+    size = 10000
+    table = pa.table({
+        'id': pa.array(np.arange(size)),
+        'name': pa.array(['name' + str(i) for i in range(size)]),
+        'score': pa.array(np.arange(size) / 7),
+        'email': pa.array(['email' + str(i) for i in range(size)])
+    }).replace_schema_metadata({'owner': 'data_team'})
+    pq.write_table(
+        table,
+        parquet_buffer := BytesIO(),
+        compression={'id': 'zstd', 'name': 'gzip',
+                     'score': 'none', 'email': 'brotli'},
+        use_dictionary=['name'],
+        column_encoding={'score': 'BYTE_STREAM_SPLIT'},
+        write_statistics=['id', 'email'],
+        row_group_size=3000
+    )
+
+    masked_pqfile = obfuscate_parquet(parquet_buffer.getvalue(), ['email'])
+    metadata = pq.read_metadata(BytesIO(masked_pqfile))
+    columns = {
+        metadata.row_group(0).column(j).path_in_schema:
+            metadata.row_group(0).column(j) for j in range(4)
+    }
+
+    assert metadata.num_row_groups == 4
+    assert metadata.metadata[b'owner'] == b'data_team'
+    assert {path: column.compression for path, column in columns.items()} \
+        == {'id': 'ZSTD', 'name': 'GZIP',
+            'score': 'UNCOMPRESSED', 'email': 'BROTLI'}
+    assert 'RLE_DICTIONARY' not in columns['id'].encodings
+    assert 'RLE_DICTIONARY' in columns['name'].encodings
+    assert 'RLE_DICTIONARY' in columns['email'].encodings
+    assert 'BYTE_STREAM_SPLIT' in columns['score'].encodings
+    assert [path for path, column in columns.items()
+            if column.is_stats_set] == ['id', 'email']
+
+
+@pytest.mark.describe('obfuscate_parquet()')
+@pytest.mark.it('Mask files with pandas schema metadata')
+def test_Function_mask_files_with_pandas_schema_metadata():
+    for stop in (2, 3):
+        table = pa.table({
+            'id': pa.array(range(stop)),
+            'email': pa.array(['a@b.c'] * stop)
+        }).replace_schema_metadata({'pandas': json.dumps({
+            'index_columns': [
+                {'kind': 'range', 'start': 0, 'stop': stop, 'step': 1}],
+            'columns': [{'name': 'id'}, {'name': 'email'}]
+        })})
+        pq.write_table(table, parquet_buffer := BytesIO())
+
+        masked_pqfile = obfuscate_parquet(
+            parquet_buffer.getvalue(), ['email'])
+        masked_table = pq.read_table(BytesIO(masked_pqfile))
+
+        assert masked_table.schema.metadata[b'pandas'] \
+            == table.schema.metadata[b'pandas']
+        assert masked_table.column('email').to_pylist() == ['***'] * stop
+    assert gdpr_module._compile_mask_schema.cache_info().hits == 1
+
+
+@pytest.mark.describe('obfuscate_parquet()')
+@pytest.mark.it('Kwargs override settings of the input')
+def test_Function_kwargs_override_input_settings(parquet_data):
+    parquet_data, _ = parquet_data
+    masked_pqfile = obfuscate_parquet(
+        parquet_data,
+        ['name'],
+        use_dictionary=False,
+        write_statistics=False
+    )
+    column = pq.read_metadata(BytesIO(masked_pqfile)).row_group(0).column(0)
+
+    assert 'RLE_DICTIONARY' not in column.encodings
+    assert not column.is_stats_set
+
 #############################################################################
 #   *END*  obsfuscate_parquet() tests
 #############################################################################